@@ -0,0 +1,160 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import search
+import pegSolitaireUtils
+import persistence
+
+
+# Each algorithm's name, columns in perf.tsv (nodes expanded, then time),
+# and search function. The A* columns for the abandoned heuristics run
+# UniformCostSearch with each of them.
+ALGORITHMS = [
+	("iddfs", "exIDDFS", "tIDDFS", lambda pegSol, prune: search.ItrDeepSearch(pegSol, prune)),
+	("one", "ex1", "t1", lambda pegSol, prune: search.aStarOne(pegSol, False, prune)),
+	("two", "ex2", "t2", lambda pegSol, prune: search.aStarTwo(pegSol, False, prune)),
+	("baseline", "exBase", "tBase",
+		lambda pegSol, prune: search.UniformCostSearch(pegSol, search.heuristicBaseline, False, prune)),
+	("manhattan", "exManDist", "tManDist",
+		lambda pegSol, prune: search.UniformCostSearch(pegSol, search.heuristicManhattan, False, prune)),
+	("difficulty1", "exDiff1", "tDiff1",
+		lambda pegSol, prune: search.UniformCostSearch(pegSol, search.heuristicDifficulty1, False, prune)),
+	("difficulty2", "exDiff2", "tDiff2",
+		lambda pegSol, prune: search.UniformCostSearch(pegSol, search.heuristicDifficulty2, False, prune)),
+]
+ALGORITHM_NAMES = [name for (name, _, _, _) in ALGORITHMS]
+
+# The columns of perf.tsv
+COLUMNS = (["board", "numPegs"] + [ex for (_, ex, _, _) in ALGORITHMS] +
+	[t for (_, _, t, _) in ALGORITHMS])
+
+
+def boardPaths(patterns):
+	"""
+	Return the board files matching a list of directories (meaning every .txt
+	file in them) and glob patterns, without duplicates.
+	"""
+	paths = []
+	for pattern in patterns:
+		if os.path.isdir(pattern):
+			pattern = os.path.join(pattern, "*.txt")
+		for path in sorted(glob.glob(pattern)):
+			if path not in paths:
+				paths.append(path)
+	return paths
+
+
+def pegCount(path):
+	"""Return the number of pegs on a board file, without validating it."""
+	with open(path, 'r') as fileHandle:
+		return fileHandle.readline().count('X')
+
+
+def initWorker():
+	"""
+	Prepare a worker process. The parent handles keyboard interrupts, and
+	anything printed by a search or by readGame goes to stderr so that it
+	cannot interrupt the rows on stdout.
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	sys.stdout = sys.stderr
+
+
+def solveBoard(task):
+	"""
+	Solve one board with each of the chosen algorithms, and return its row
+	of perf.tsv columns as a dict. Like perf.tsv, a search that runs out of
+	memory is recorded as "MemErr", and an invalid board is recorded as
+	"BadBoard". With a persistent store, whichever worker opens it first
+	writes to it while solving one board, and the others only read it.
+	"""
+	(path, pegs, algorithms, bitboard, prune, storePath) = task
+	row = {"board": os.path.splitext(os.path.basename(path))[0], "numPegs": pegs}
+	store = persistence.stateStore(storePath) if storePath else None
+	for (name, ex, t, solve) in ALGORITHMS:
+		if name not in algorithms:
+			continue
+		try:
+			tic = time.clock()
+			pegSol = pegSolitaireUtils.game(path, bitboard, False, store)
+			solve(pegSol, prune)
+			toc = time.clock()
+			row[ex] = pegSol.nodesExpanded
+			row[t] = round(toc - tic, 3)
+		except MemoryError:
+			row[ex] = row[t] = "MemErr"
+		except (SystemExit, ValueError):
+			# readGame.readGameState exits on an invalid board, and bitboards
+			# cannot search a board with walls inside the plus shape
+			row[ex] = row[t] = "BadBoard"
+			break
+	if store is not None:
+		store.close()
+	return row
+
+
+def formatRow(row):
+	"""Return a tab-separated line of perf.tsv columns, leaving missing ones empty."""
+	return '\t'.join(str(row.get(column, "")) for column in COLUMNS)
+
+
+def main(args):
+
+	algorithms = args.algorithms.split(',')
+	for name in algorithms:
+		if name not in ALGORITHM_NAMES:
+			sys.exit("Unknown algorithm: " + name)
+	paths = boardPaths(args.boards)
+	# Schedule the largest boards first, so one long board started last does
+	# not leave the other workers idle at the end
+	tasks = sorted(((path, pegCount(path), algorithms, args.bitboard, args.prune, args.store)
+		for path in paths), key=lambda task: -task[1])
+	if args.store:
+		# Create the store once, before workers race to open it
+		persistence.stateStore(args.store, args.store_size << 20).close()
+
+	output = open(args.output, 'w') if args.output else sys.stdout
+	output.write('\t'.join(COLUMNS) + '\n')
+	output.flush()
+	pool = multiprocessing.Pool(args.workers, initWorker)
+	try:
+		# Rows are written as soon as each board finishes, in any order;
+		# chunksize=1 keeps the largest-first order of dispatch
+		for row in pool.imap_unordered(solveBoard, tasks, 1):
+			output.write(formatRow(row) + '\n')
+			output.flush()
+		pool.close()
+	except:
+		# Includes keyboard interrupts and a closed output pipe
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+		if output is not sys.stdout:
+			output.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Solve a batch of boards in parallel")
+	parser.add_argument("boards", nargs='+',
+		help="board files, directories of them, or glob patterns (e.g. 'boards/g*.txt')")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+		help="number of worker processes (default: one per CPU)")
+	parser.add_argument("--algorithms", default="iddfs,one,two",
+		help="comma-separated subset of: " + ','.join(ALGORITHM_NAMES))
+	parser.add_argument("--output", type=str,
+		help="write rows to this file instead of stdout")
+	parser.add_argument("--bitboard", action="store_true",
+		help="search with packed bitboard nodes")
+	parser.add_argument("--prune", action="store_true",
+		help="reject unsolvable nodes by pagoda functions and position class")
+	parser.add_argument("--store", type=str,
+		help="consult and add to a persistent store of solved states in this file")
+	parser.add_argument("--store-size", type=int, default=persistence.DEFAULT_SIZE >> 20,
+		help="size in MiB of a new store file")
+	args = parser.parse_args()
+	main(args)
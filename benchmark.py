@@ -0,0 +1,248 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import time
+import search
+import pegSolitaireUtils
+import batch
+import ordering
+
+
+# Each benchmark run solves one board with one algorithm in a fresh child
+# process, so that its peak RSS is its own and it can be killed at a timeout
+# (which lets gcentral IDDFS be included without hanging the whole suite).
+# Results are saved as JSON, tagged with a format version and the git commit
+# they were measured on, and optionally as a TSV with one row per run. A
+# saved result file can be used as the baseline for a later run, which then
+# reports every metric that grew by more than a threshold.
+
+FORMAT_VERSION = 1
+
+# The algorithms of batch.ALGORITHMS, plus the searches that it leaves out
+ALGORITHMS = [(name, solve) for (name, _, _, solve) in batch.ALGORITHMS] + [
+	("ida", lambda pegSol, prune: search.idaStar(pegSol, search.heuristicTwo, 1 << 20, prune)),
+	("bidirectional", lambda pegSol, prune: search.BidirectionalSearch(pegSol, None, prune)),
+]
+# The algorithms run unless others are chosen with --algorithms
+DEFAULT_ALGORITHMS = [name for (name, _) in ALGORITHMS]
+# IDDFS with each move ordering but the default, to compare the nodes each
+# expands
+ALGORITHMS += [("iddfs-" + name, lambda pegSol, prune, moveOrdering=moveOrdering:
+	search.ItrDeepSearch(pegSol, prune, False, moveOrdering()))
+	for (name, moveOrdering) in sorted(ordering.ORDERINGS.items()) if name != "rowmajor"]
+ALGORITHM_NAMES = [name for (name, _) in ALGORITHMS]
+
+# Statuses of a run
+SOLVED = "solved"
+IMPOSSIBLE = "impossible"
+TIMEOUT = "timeout"
+MEMERR = "memerr"
+BADBOARD = "badboard"
+CRASHED = "crashed"
+
+# The columns of a TSV result file
+COLUMNS = ["board", "numPegs", "algorithm", "status", "wall", "cpu",
+	"nodesExpanded", "nodesPerSecond", "peakRSS", "peakFrontier"]
+
+# The metrics that a baseline comparison checks, where higher is worse
+METRICS = ["wall", "cpu", "nodesExpanded", "peakRSS"]
+# Times are only compared if the baseline's is at least this many seconds,
+# since shorter ones are mostly noise
+MIN_TIME = 0.1
+
+
+def cpuTime():
+	"""Return the CPU time in seconds used by this process so far."""
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	return usage.ru_utime + usage.ru_stime
+
+
+def runSearch(connection, path, name, bitboard, prune):
+	"""
+	Solve a board with an algorithm in a child process, and send the result
+	back through a connection as a dict.
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	# Anything printed by a search or by readGame goes to stderr
+	sys.stdout = sys.stderr
+	solve = dict(ALGORITHMS)[name]
+	result = {}
+	try:
+		pegSol = pegSolitaireUtils.game(path, bitboard)
+		tic = time.time()
+		cpu = cpuTime()
+		solve(pegSol, prune)
+		wall = time.time() - tic
+		result["wall"] = round(wall, 3)
+		result["cpu"] = round(cpuTime() - cpu, 3)
+		result["status"] = IMPOSSIBLE if isinstance(pegSol.trace, str) else SOLVED
+		result["nodesExpanded"] = pegSol.nodesExpanded
+		result["nodesPerSecond"] = int(pegSol.nodesExpanded / wall) if wall else None
+		result["peakFrontier"] = pegSol.peakFrontier
+	except MemoryError:
+		result = {"status": MEMERR}
+	except (SystemExit, ValueError):
+		# readGame.readGameState exits on an invalid board, and a search that
+		# generates moves from bitboards cannot handle walls inside the plus
+		# shape
+		result = {"status": BADBOARD}
+	# ru_maxrss is in KiB on Linux
+	result["peakRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+	connection.send(result)
+	connection.close()
+
+
+def measure(path, name, timeout, bitboard=False, prune=False):
+	"""
+	Return the result of solving a board with an algorithm as a dict of the
+	COLUMNS, killing the search if it takes longer than timeout seconds.
+	"""
+	row = {"board": os.path.splitext(os.path.basename(path))[0],
+		"numPegs": batch.pegCount(path), "algorithm": name}
+	(receiver, sender) = multiprocessing.Pipe(False)
+	process = multiprocessing.Process(target=runSearch, args=(sender, path, name, bitboard, prune))
+	process.start()
+	sender.close()
+	try:
+		if receiver.poll(timeout):
+			row.update(receiver.recv())
+		else:
+			row["status"] = TIMEOUT
+			row["wall"] = timeout
+	except EOFError:
+		# The process died without sending a result, e.g. killed for memory
+		row["status"] = CRASHED
+	finally:
+		if process.is_alive():
+			process.terminate()
+		process.join()
+		receiver.close()
+	return row
+
+
+def gitCommit():
+	"""Return the current git commit of the repository, or None if unknown."""
+	try:
+		with open(os.devnull, 'w') as devnull:
+			return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+				cwd=os.path.dirname(os.path.abspath(__file__)), stderr=devnull).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def formatRow(row):
+	"""Return a tab-separated line of COLUMNS, leaving missing ones empty."""
+	return '\t'.join(str(row.get(column, "")) for column in COLUMNS)
+
+
+def compare(results, baseline, threshold):
+	"""
+	Return a list of messages for the runs in results that regressed from
+	baseline: a metric more than threshold (a fraction) above the baseline's,
+	or a run that no longer finishes.
+	"""
+	previous = dict(((row["board"], row["algorithm"]), row) for row in baseline["results"])
+	regressions = []
+	for row in results["results"]:
+		old = previous.get((row["board"], row["algorithm"]))
+		if old is None:
+			continue
+		label = "%s %s" % (row["board"], row["algorithm"])
+		if old["status"] in (SOLVED, IMPOSSIBLE) and row["status"] != old["status"]:
+			regressions.append("%s: %s, was %s" % (label, row["status"], old["status"]))
+			continue
+		for metric in METRICS:
+			before = old.get(metric)
+			after = row.get(metric)
+			if before is None or after is None:
+				continue
+			if metric in ("wall", "cpu") and before < MIN_TIME:
+				continue
+			if after > before * (1 + threshold):
+				regressions.append("%s: %s %s, was %s (%+.0f%%)" %
+					(label, metric, after, before, 100.0 * (after - before) / before if before else 100))
+	return regressions
+
+
+def main(args):
+
+	algorithms = args.algorithms.split(',')
+	for name in algorithms:
+		if name not in ALGORITHM_NAMES:
+			sys.exit("Unknown algorithm: " + name)
+	paths = batch.boardPaths(args.boards)
+	results = {
+		"version": FORMAT_VERSION,
+		"commit": gitCommit(),
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"machine": platform.node(),
+		"options": {"timeout": args.timeout, "bitboard": args.bitboard, "prune": args.prune},
+		"results": [],
+	}
+	tsv = open(args.tsv, 'w') if args.tsv else None
+	if tsv is not None:
+		tsv.write('\t'.join(COLUMNS) + '\n')
+	try:
+		# Runs are sequential, so that their times do not compete for CPUs
+		for path in paths:
+			for name in algorithms:
+				row = measure(path, name, args.timeout, args.bitboard, args.prune)
+				results["results"].append(row)
+				print formatRow(row)
+				sys.stdout.flush()
+				if tsv is not None:
+					tsv.write(formatRow(row) + '\n')
+					tsv.flush()
+	finally:
+		if tsv is not None:
+			tsv.close()
+	output = args.output
+	if output is None:
+		output = os.path.join("benchmarks", "%s-%s.json" %
+			(time.strftime("%Y%m%d-%H%M%S"), results["commit"] or "unknown"))
+	if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+		os.makedirs(os.path.dirname(output))
+	with open(output, 'w') as fileHandle:
+		json.dump(results, fileHandle, indent=1, sort_keys=True)
+	print >> sys.stderr, "Saved results to " + output
+	if args.baseline:
+		with open(args.baseline, 'r') as fileHandle:
+			baseline = json.load(fileHandle)
+		if baseline.get("version") != FORMAT_VERSION:
+			sys.exit("Unsupported baseline format: " + str(baseline.get("version")))
+		regressions = compare(results, baseline, args.threshold)
+		for message in regressions:
+			print >> sys.stderr, "Regression: " + message
+		if regressions:
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark the search algorithms")
+	parser.add_argument("boards", nargs='*', default=["boards"],
+		help="board files, directories of them, or glob patterns (default: boards)")
+	parser.add_argument("--algorithms", default=','.join(DEFAULT_ALGORITHMS),
+		help="comma-separated subset of: " + ','.join(ALGORITHM_NAMES))
+	parser.add_argument("--timeout", type=float, default=600,
+		help="seconds to allow each board and algorithm (default: 600)")
+	parser.add_argument("--output", type=str,
+		help="JSON file for the results (default: benchmarks/<time>-<commit>.json)")
+	parser.add_argument("--tsv", type=str,
+		help="also write the results to this TSV file")
+	parser.add_argument("--baseline", type=str,
+		help="JSON results to compare against; exits with status 1 on any regression")
+	parser.add_argument("--threshold", type=float, default=0.2,
+		help="fraction a metric may grow over the baseline before it is a regression")
+	parser.add_argument("--bitboard", action="store_true",
+		help="search with packed bitboard nodes")
+	parser.add_argument("--prune", action="store_true",
+		help="reject unsolvable nodes by pagoda functions and position class")
+	args = parser.parse_args()
+	main(args)
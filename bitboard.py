@@ -0,0 +1,225 @@
+# Precomputed tables for the bitboard representation used by bitNode.
+# Only 33 of the 49 positions on the plus-shaped board are holes, so a game
+# state fits in a 33-bit integer: bit k is set iff the k-th hole (in row-major
+# order) has a peg. Positions are still numbered 0 to 48 everywhere outside
+# this module, so the tables below translate between the two numberings.
+
+import operator
+
+
+# Positions that are never holes (the four 2x2 corners of the 7x7 grid)
+CORNERS = frozenset(r * 7 + c for r in (0, 1, 5, 6) for c in (0, 1, 5, 6))
+
+# HOLES[bit] is the position of a hole, and BITS[pos] is the bit of a
+# position (or -1 for corners)
+HOLES = [pos for pos in xrange(49) if pos not in CORNERS]
+BITS = [-1] * 49
+for _bit, _pos in enumerate(HOLES):
+	BITS[_pos] = _bit
+
+# MASKS[pos] is the single-bit mask of a position (or 0 for corners)
+MASKS = [1 << BITS[pos] if BITS[pos] != -1 else 0 for pos in xrange(49)]
+
+# The solved state has one peg in the central position, 24 or (3, 3)
+CENTER = MASKS[24]
+
+# The order that gameNode.validMoves tries directions in: south, east, north,
+# and west
+DIRECTIONS = (7, 1, -7, -1)
+
+
+def isHole(row, col):
+	"""Return whether a row and column are a hole on the board."""
+	return 0 <= row < 7 and 0 <= col < 7 and row * 7 + col not in CORNERS
+
+
+def _jumps():
+	"""
+	Return a list of every jump on the board, as tuples of
+	(oldPos, direction, fromMask, overMask, toMask), in the same order as
+	gameNode.validMoves would try them.
+	"""
+	jumps = []
+	for oldPos in HOLES:
+		row, col = divmod(oldPos, 7)
+		for direction in DIRECTIONS:
+			dr, dc = {7: (1, 0), 1: (0, 1), -7: (-1, 0), -1: (0, -1)}[direction]
+			if not isHole(row + dr, col + dc) or not isHole(row + 2*dr, col + 2*dc):
+				continue
+			midPos = oldPos + direction
+			newPos = midPos + direction
+			jumps.append((oldPos, direction, MASKS[oldPos], MASKS[midPos], MASKS[newPos]))
+	return jumps
+
+# JUMPS lists all 76 jumps, and JUMPS_FROM[bit] lists only those starting
+# from a given bit, so move generation only has to look at existing pegs
+JUMPS = _jumps()
+JUMPS_FROM = [[jump for jump in JUMPS if jump[2] == 1 << bit] for bit in xrange(len(HOLES))]
+# JUMP_INDEX[(oldPos, direction)] is the index of a jump in JUMPS
+JUMP_INDEX = dict(((jump[0], jump[1]), i) for i, jump in enumerate(JUMPS))
+# MOVES_FROM[bit] lists the same jumps as JUMPS_FROM[bit], as tuples of
+# (index, direction, overMask, toMask), for searches that only need indexes
+MOVES_FROM = [[(JUMP_INDEX[oldPos, direction], direction, overMask, toMask)
+	for (oldPos, direction, _, overMask, toMask) in jumps] for jumps in JUMPS_FROM]
+
+
+def _symmetries():
+	"""
+	Return the eight symmetries of the board as lists mapping each bit to its
+	image bit, in the same order that gameNode.symmetricState generates them:
+	r0, f0, r90, f90, r180, f180, r270, f270.
+	"""
+	transforms = [
+		lambda r, c: (r, c),         # r0: identity
+		lambda r, c: (6 - r, c),     # f0: reflect across the horizontal axis
+		lambda r, c: (c, 6 - r),     # r90: rotate 90 degrees clockwise
+		lambda r, c: (6 - c, 6 - r), # f90: reflect across the antidiagonal
+		lambda r, c: (6 - r, 6 - c), # r180: rotate 180 degrees
+		lambda r, c: (r, 6 - c),     # f180: reflect across the vertical axis
+		lambda r, c: (6 - c, r),     # r270: rotate 90 degrees counterclockwise
+		lambda r, c: (c, r),         # f270: reflect across the diagonal
+	]
+	symmetries = []
+	for transform in transforms:
+		images = []
+		for pos in HOLES:
+			row, col = transform(*divmod(pos, 7))
+			images.append(BITS[row * 7 + col])
+		symmetries.append(images)
+	return symmetries
+
+# SYMMETRIES[k][bit] is the image of a bit under the k-th symmetry
+SYMMETRIES = _symmetries()
+# Indexes into SYMMETRIES of the two reflections that validMoves uses to
+# prune redundant moves
+VFLIP = 1
+HFLIP = 5
+
+
+def pack(state):
+	"""Return the bitboard for a flat list of 49 positions."""
+	bits = 0
+	for pos in HOLES:
+		if state[pos] == 1:
+			bits |= MASKS[pos]
+	return bits
+
+
+def packWalls(state):
+	"""
+	Return the bitboard of the walls in a flat list of 49 positions: the holes
+	of the plus-shaped board that a board file marks as not on the board.
+	"""
+	bits = 0
+	for pos in HOLES:
+		if state[pos] == -1:
+			bits |= MASKS[pos]
+	return bits
+
+
+def unpack(bits, walls=0):
+	"""Return the flat list of 49 positions for a bitboard and its walls."""
+	state = [-1] * 49
+	for bit, pos in enumerate(HOLES):
+		if not (walls >> bit) & 1:
+			state[pos] = (bits >> bit) & 1
+	return state
+
+
+def transform(bits, images):
+	"""Return the image of a bitboard under one of the SYMMETRIES."""
+	image = 0
+	bit = 0
+	while bits:
+		if bits & 1:
+			image |= 1 << images[bit]
+		bits >>= 1
+		bit += 1
+	return image
+
+
+def popCount(bits):
+	"""Return the number of pegs on a bitboard."""
+	return bin(bits).count('1')
+
+
+def _symmetryTables():
+	"""
+	Return byte-wise lookup tables for the SYMMETRIES: SYMMETRY_TABLES[k][i][b]
+	is the image under the k-th symmetry of the i-th byte of a bitboard having
+	the value b.
+	"""
+	tables = []
+	for images in SYMMETRIES:
+		table = []
+		for shift in xrange(0, len(HOLES), 8):
+			size = 1 << min(8, len(HOLES) - shift)
+			table.append([transform(value << shift, images) for value in xrange(size)])
+		tables.append(table)
+	return tables
+
+SYMMETRY_TABLES = _symmetryTables()
+
+# JUMP_IMAGES[jump] is the images under all eight SYMMETRIES of the three bits
+# that a jump flips, so the symmetric images of a child can be updated from
+# those of its parent instead of being transformed from scratch
+JUMP_IMAGES = [tuple(transform(fromMask | overMask | toMask, images) for images in SYMMETRIES)
+	for (_, _, fromMask, overMask, toMask) in JUMPS]
+
+# JUMP_SYMMETRIES[k][jump] is the index of the image of a jump under the k-th
+# symmetry, and INVERSE_SYMMETRIES[k] is the index of the symmetry that undoes
+# the k-th one, so moves can be stored relative to a symmetric key
+_JUMP_BY_MASKS = dict(((fromMask, toMask), i) for (i, (_, _, fromMask, _, toMask)) in enumerate(JUMPS))
+JUMP_SYMMETRIES = [[_JUMP_BY_MASKS[transform(fromMask, images), transform(toMask, images)]
+	for (_, _, fromMask, _, toMask) in JUMPS] for images in SYMMETRIES]
+INVERSE_SYMMETRIES = [[k for k in xrange(len(SYMMETRIES))
+	if [SYMMETRIES[k][image] for image in images] == range(len(HOLES))][0] for images in SYMMETRIES]
+
+
+# Store SYMMETRY_TABLES locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def symmetricImages(bits, SYMMETRY_TABLES=SYMMETRY_TABLES):
+	"""
+	Return the list of a bitboard's images under all eight SYMMETRIES, looked
+	up one byte at a time.
+	"""
+	b0 = bits & 255
+	b1 = (bits >> 8) & 255
+	b2 = (bits >> 16) & 255
+	b3 = (bits >> 24) & 255
+	b4 = bits >> 32
+	return [t0[b0] | t1[b1] | t2[b2] | t3[b3] | t4[b4]
+		for (t0, t1, t2, t3, t4) in SYMMETRY_TABLES]
+
+
+# The wallSymmetries of each bitboard of walls seen so far
+_WALL_SYMMETRIES = {}
+
+
+def wallSymmetries(walls):
+	"""
+	Return a tuple of (keys, vflip, hflip) for a board with the given bitboard
+	of walls: keys lists the indexes of the SYMMETRIES that map the walls to
+	their least image, and vflip and hflip are whether the VFLIP and HFLIP
+	reflections map the walls to themselves. Two states of the board are
+	symmetric iff their least images under those symmetries are equal, so
+	that is their key. (The least image under all eight symmetries could be
+	shared with a state that is only symmetric on a board with other walls.)
+	"""
+	result = _WALL_SYMMETRIES.get(walls)
+	if result is None:
+		images = symmetricImages(walls)
+		least = min(images)
+		result = _WALL_SYMMETRIES[walls] = (
+			tuple(k for k in xrange(len(SYMMETRIES)) if images[k] == least),
+			images[VFLIP] == walls, images[HFLIP] == walls)
+	return result
+
+
+# Store JUMP_IMAGES, map, and xor locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def jumpImages(images, jump, JUMP_IMAGES=JUMP_IMAGES, map=map, xor=operator.xor):
+	"""
+	Return the symmetric images of the state after a jump, given the symmetric
+	images of the state before it. Only the three cells the jump touches change,
+	so each image is updated with a single XOR.
+	"""
+	return map(xor, images, JUMP_IMAGES[jump])
@@ -0,0 +1,97 @@
+import resource
+import time
+
+
+# A game's budget attribute is None unless it is given a searchBudget, which
+# limits the wall-clock time, nodes expanded, and memory of its searches, and
+# can cancel them from another thread or a signal handler. Searches offer it
+# each node they expand, so that it keeps the one with the fewest pegs, and
+# check it whenever nodesExpanded reaches its due count. Checking the clock
+# and memory is relatively slow, so that only happens every CHECK_INTERVAL
+# nodes (or sooner for a node budget or a cancellation). An exceeded limit
+# raises BudgetExceeded, which unwinds the search (however deeply it has
+# recursed) back to its public function, which then returns search.LIMITED.
+
+# Nodes to expand between checks of the clock and memory
+CHECK_INTERVAL = 1024
+
+# Reasons for exceeding a budget
+TIME = "time"
+NODES = "nodes"
+MEMORY = "memory"
+CANCELLED = "cancelled"
+
+
+class BudgetExceeded(Exception):
+	"""Raised by searchBudget.check when a search has to stop."""
+
+	def __init__(self, reason):
+		"""Initialize the exception with one of the reasons above."""
+		Exception.__init__(self, reason)
+		self.reason = reason
+
+
+def residentMemory():
+	"""Return the resident memory of this process in bytes."""
+	try:
+		with open("/proc/self/statm", 'r') as fileHandle:
+			return int(fileHandle.read().split()[1]) * resource.getpagesize()
+	except (IOError, IndexError, ValueError):
+		# Without /proc, the peak is the best available estimate
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class searchBudget(object):
+	"""
+	Limits on a search: a deadline as a time.time() value, a maximum number of
+	nodes expanded, and a ceiling on resident memory in bytes, any of which
+	may be None for no limit.
+	"""
+
+	def __init__(self, deadline=None, maxNodes=None, maxMemory=None):
+		"""Initialize a budget that has not been exceeded."""
+		self.deadline = deadline
+		self.maxNodes = maxNodes
+		self.maxMemory = maxMemory
+		self.cancelled = False
+		# The node with the fewest pegs offered so far
+		self.best = None
+		self.bestPegs = 1 << 30
+		self.due = 0
+		self.schedule(0)
+
+	def schedule(self, nodes):
+		"""Set the count of nodes expanded at which to check next."""
+		due = nodes + CHECK_INTERVAL
+		if self.maxNodes is not None and due > self.maxNodes:
+			due = self.maxNodes
+		self.due = due
+
+	def cancel(self):
+		"""
+		Make the search stop at its next check. This only sets attributes, so
+		it is safe to call from another thread or a signal handler.
+		"""
+		self.cancelled = True
+		self.due = 0
+
+	def offer(self, node):
+		"""Keep a node if it has fewer pegs than the best one so far."""
+		if node.pegCount < self.bestPegs:
+			self.best = node
+			self.bestPegs = node.pegCount
+
+	def check(self, nodes):
+		"""
+		Raise BudgetExceeded if a limit has been reached after the given count
+		of nodes expanded, or else schedule the next check.
+		"""
+		if self.cancelled:
+			raise BudgetExceeded(CANCELLED)
+		if self.maxNodes is not None and nodes >= self.maxNodes:
+			raise BudgetExceeded(NODES)
+		if self.deadline is not None and time.time() >= self.deadline:
+			raise BudgetExceeded(TIME)
+		if self.maxMemory is not None and residentMemory() >= self.maxMemory:
+			raise BudgetExceeded(MEMORY)
+		self.schedule(nodes)
@@ -0,0 +1,93 @@
+import collections
+import persistence
+
+
+# A long-lived process (such as a worker of the solver daemon) can keep what
+# its searches learn in memory, warm for the next board, with an lruStore in
+# place of a persistent stateStore. It has the same interface, so the searches
+# consult it the same way: solvable keys, with their best moves, let a search
+# follow a known solution instead of searching (a transposition cache), and
+# unsolvable keys let it skip a known dead end (a failed-state cache). Entries
+# are evicted in least recently used order once the store holds as many as
+# its memory cap allows, so the most useful positions (those shared by many
+# boards, near the solved state) stay in it.
+
+# The approximate memory of one entry, in bytes: its slot in the dict, its
+# link in the recency order, and its key (statuses and moves are shared), as
+# measured by the resident memory of a million random entries
+ENTRY_BYTES = 250
+
+# Each (status, move) entry, shared so that entries only cost their keys
+_ENTRIES = {}
+
+
+def _entry(status, move):
+	"""Return the shared (status, move) tuple."""
+	return _ENTRIES.setdefault((status, move), (status, move))
+
+
+class lruStore(object):
+	"""
+	An in-memory table from symmetric keys of game nodes to whether they are
+	solvable, and if so, the best next move, like a persistence.stateStore,
+	holding at most maxBytes worth of entries. It counts lookups and hits of
+	solvable and unsolvable keys separately.
+	"""
+
+	def __init__(self, maxBytes):
+		"""Initialize an empty store with a memory cap in bytes."""
+		self.entries = collections.OrderedDict()
+		self.maxEntries = max(1, maxBytes // ENTRY_BYTES)
+		self.lookups = 0
+		self.hits = 0
+		self.solvableHits = 0
+		self.unsolvableHits = 0
+		self.stores = 0
+		self.evicted = 0
+		# Counts entries that could not be stored, as for a stateStore
+		self.dropped = 0
+
+	def __len__(self):
+		"""Return the number of entries in the store."""
+		return len(self.entries)
+
+	def close(self):
+		"""Do nothing: an lruStore is kept for the life of its process."""
+		pass
+
+	def get(self, key):
+		"""See stateStore.get."""
+		self.lookups += 1
+		entries = self.entries
+		if key not in entries:
+			return None
+		# Move the entry to the most recently used end
+		entry = entries[key] = entries.pop(key)
+		self.hits += 1
+		if entry[0] == persistence.SOLVABLE:
+			self.solvableHits += 1
+		else:
+			self.unsolvableHits += 1
+		return entry
+
+	def put(self, key, status, move=persistence.NO_MOVE):
+		"""See stateStore.put."""
+		entries = self.entries
+		if key in entries:
+			return
+		entries[key] = _entry(status, move)
+		self.stores += 1
+		if len(entries) > self.maxEntries:
+			entries.popitem(last=False)
+			self.evicted += 1
+
+	def counters(self):
+		"""Return the store's counters as a dict, for metrics."""
+		return {"entries": len(self.entries), "lookups": self.lookups, "hits": self.hits,
+			"solvableHits": self.solvableHits, "unsolvableHits": self.unsolvableHits,
+			"stores": self.stores, "evicted": self.evicted}
+
+	# The lookups built on get and put are the same as a stateStore's
+	isUnsolvable = persistence.stateStore.isUnsolvable.im_func
+	bestMove = persistence.stateStore.bestMove.im_func
+	putSolution = persistence.stateStore.putSolution.im_func
@@ -0,0 +1,219 @@
+import json
+import os
+import struct
+import time
+
+
+# A checkpoint file lets a long UniformCostSearch or ItrDeepSearch be killed
+# and resumed. It is an append-only log of records after the MAGIC string;
+# each record is a type byte and a payload length, then the payload:
+# - JOURNAL: pairs of 64-bit integers added to the search's tables since the
+#   previous checkpoint (symmetric keys with their parents' keys for
+#   UniformCostSearch, or with their marks for StackDLS)
+# - SNAPSHOT: 64-bit integers describing the whole frontier (or DFS stack)
+# - COMMIT: JSON counters, which make the records before it valid
+# So each checkpoint only writes what changed since the last one, plus the
+# frontier, which is usually much smaller than the explored set. Records
+# after the last commit (from a process killed while writing) are ignored and
+# overwritten. The records before a commit are synced to disk before it is
+# written, so a commit never survives a crash that its records do not.
+# Every snapshot but the last is dead weight, so once they make up more of
+# the file than the rest, the next checkpoint rewrites the file to a new one
+# with only the journals and the new snapshot, and renames it over the old
+# one. A rewrite copies fewer bytes than the old snapshots it drops, which
+# were all written since the last rewrite, so rewrites at most double what
+# checkpoints write. Integers are packed little-endian, so a file can be
+# resumed on any machine.
+
+MAGIC = "PEGCKPT1"
+RECORD = struct.Struct("<cQ")
+
+JOURNAL = 'J'
+SNAPSHOT = 'S'
+COMMIT = 'C'
+
+# Nodes to expand between checks of the clock
+CHECK_INTERVAL = 4096
+
+# The parent key recorded for the root node, which has none
+NO_PARENT = -1
+
+# The size of a packed integer
+INT_SIZE = 8
+
+
+def packInts(ints):
+	"""Return the bytes of a list of integers, as signed 64-bit integers."""
+	return struct.pack("<%dq" % len(ints), *ints)
+
+
+def unpackInts(data):
+	"""Return the tuple of integers packed in some bytes by packInts."""
+	return struct.unpack("<%dq" % (len(data) // INT_SIZE), data)
+
+
+def syncFile(fileHandle):
+	"""Flush a file and wait until its contents are on disk."""
+	fileHandle.flush()
+	os.fsync(fileHandle.fileno())
+
+
+def writeRecord(fileHandle, kind, payload):
+	"""Write a record of the given kind and payload to a file."""
+	fileHandle.write(RECORD.pack(kind, len(payload)))
+	fileHandle.write(payload)
+
+
+class checkpointFile(object):
+	"""
+	A checkpoint file for one search, written at most every interval seconds.
+	Searches append to journal the pairs of integers to write with the next
+	checkpoint, and call save when isDue says to.
+	"""
+
+	def __init__(self, path, interval=60):
+		"""Open a checkpoint file, creating it if it does not exist."""
+		self.path = path
+		self.interval = interval
+		self.journal = []
+		self.due = CHECK_INTERVAL
+		self.nextTime = time.time() + interval
+		self.saves = 0
+		if not os.path.exists(path):
+			with open(path, 'wb') as fileHandle:
+				fileHandle.write(MAGIC)
+		self.file = open(path, 'r+b')
+		if self.file.read(len(MAGIC)) != MAGIC:
+			self.file.close()
+			raise ValueError("Not a checkpoint file: " + path)
+		# The bytes up to the end of the last commit, the bytes of its
+		# snapshot and commit records, and the bytes of the ones before it,
+		# which the next rewrite drops
+		self.size = len(MAGIC)
+		self.last = 0
+		self.stale = 0
+
+	def load(self):
+		"""
+		Return the state of the last complete checkpoint as a tuple of (meta,
+		journal, snapshot): the dict of counters it was saved with, a list of
+		arrays of the pairs in every journal record up to it, and the array of
+		its snapshot. Return None if there is no complete checkpoint.
+		"""
+		fileHandle = self.file
+		fileHandle.seek(len(MAGIC))
+		committed = len(MAGIC)
+		journal = []
+		pending = []
+		snapshot = pendingSnapshot = None
+		meta = None
+		last = pendingLast = stale = 0
+		while True:
+			header = fileHandle.read(RECORD.size)
+			if len(header) < RECORD.size:
+				break
+			(kind, length) = RECORD.unpack(header)
+			payload = fileHandle.read(length)
+			if len(payload) < length:
+				break
+			if kind == JOURNAL:
+				pending.append(unpackInts(payload))
+			elif kind == SNAPSHOT:
+				pendingSnapshot = unpackInts(payload)
+				pendingLast = RECORD.size + length
+			elif kind == COMMIT:
+				meta = json.loads(payload)
+				journal.extend(pending)
+				pending = []
+				snapshot = pendingSnapshot
+				stale += last
+				last = pendingLast + RECORD.size + length
+				committed = fileHandle.tell()
+		# Drop any incomplete checkpoint, so the next one follows the last
+		# complete one
+		fileHandle.seek(committed)
+		fileHandle.truncate()
+		self.size = committed
+		self.last = last
+		self.stale = stale
+		if meta is None:
+			return None
+		return (meta, journal, snapshot)
+
+	def isDue(self, nodes):
+		"""
+		Return whether it is time to save a checkpoint, after the given count
+		of nodes expanded has reached due.
+		"""
+		self.due = nodes + CHECK_INTERVAL
+		return time.time() >= self.nextTime
+
+	def save(self, snapshot, meta):
+		"""
+		Append a checkpoint of the journal (which is then emptied), a snapshot
+		given as a list of integers, and a dict of counters, or rewrite the
+		file with it if the old snapshots take up most of the file.
+		"""
+		journal = packInts(self.journal)
+		snapshot = packInts(snapshot)
+		commit = json.dumps(meta)
+		self.stale += self.last
+		self.last = 2 * RECORD.size + len(snapshot) + len(commit)
+		if 2 * self.stale > self.size:
+			self.rewrite(journal, snapshot, commit)
+		else:
+			fileHandle = self.file
+			fileHandle.seek(self.size)
+			writeRecord(fileHandle, JOURNAL, journal)
+			writeRecord(fileHandle, SNAPSHOT, snapshot)
+			syncFile(fileHandle)
+			writeRecord(fileHandle, COMMIT, commit)
+			syncFile(fileHandle)
+			self.size = fileHandle.tell()
+		# Emptied in place, since searches keep a local reference to it
+		del self.journal[:]
+		self.saves += 1
+		self.nextTime = time.time() + self.interval
+
+	def rewrite(self, journal, snapshot, commit):
+		"""
+		Replace the file with one of its journal records, followed by a
+		checkpoint of the given packed journal, snapshot, and commit.
+		"""
+		# Write to a temporary name, so a crash leaves the old file whole
+		partialPath = self.path + ".partial"
+		oldFile = self.file
+		oldFile.seek(len(MAGIC))
+		with open(partialPath, 'wb') as fileHandle:
+			fileHandle.write(MAGIC)
+			while oldFile.tell() < self.size:
+				header = oldFile.read(RECORD.size)
+				(kind, length) = RECORD.unpack(header)
+				payload = oldFile.read(length)
+				if kind == JOURNAL:
+					fileHandle.write(header)
+					fileHandle.write(payload)
+			writeRecord(fileHandle, JOURNAL, journal)
+			writeRecord(fileHandle, SNAPSHOT, snapshot)
+			writeRecord(fileHandle, COMMIT, commit)
+			syncFile(fileHandle)
+			self.size = fileHandle.tell()
+		os.rename(partialPath, self.path)
+		# The rename is only durable once the directory is synced too
+		directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+		try:
+			os.fsync(directory)
+		finally:
+			os.close(directory)
+		oldFile.close()
+		self.file = open(self.path, 'r+b')
+		self.stale = 0
+
+	def finish(self):
+		"""Close and delete the file, once the search no longer needs it."""
+		self.file.close()
+		os.remove(self.path)
+
+	def close(self):
+		"""Close the file, keeping it to resume from."""
+		self.file.close()
@@ -0,0 +1,199 @@
+import operator
+import bitboard
+import budget
+import pruning
+import search
+
+
+# The searches stop at the first solution; this module counts them all. A
+# solution is a sequence of jumps that leaves one peg in the center, so the
+# number of solutions from a state is the sum of the numbers from each of its
+# children, and is memoized by the state's symmetric key. That is sound
+# because the solved state is symmetric under all eight symmetries, so every
+# image of a state has the same number of solutions (each solution maps to
+# one of the image's by the same symmetry). So each distinct state up to
+# symmetry is only expanded once, and counting takes time proportional to the
+# number of such states reachable from the root, not to the number of paths
+# (which is astronomical for large boards). Every valid jump is followed, not
+# just those that validMoves keeps for symmetric states, since mirrored moves
+# lead to different solutions.
+# For boards with too many states to memoize, the memo can be bounded: it
+# then keeps two generations of entries, and when the young one fills half
+# the budget, the old one is dropped and the young one becomes old. Entries
+# found in the old generation are moved back to the young one, so recently
+# used entries survive. A dropped entry is just counted again when needed.
+
+
+class solutionCounter(object):
+	"""
+	A memo of the number of solutions from each symmetric key, holding at most
+	maxEntries entries if given. Counts of jumps followed are kept in
+	nodesExpanded, like getNextState counts them, and checked against the
+	searchBudget in limits, if any. A count that is stopped by the budget is
+	not memoized, so the memo stays correct.
+	"""
+
+	def __init__(self, maxEntries=None):
+		"""Initialize an empty memo."""
+		self.young = {}
+		self.old = {}
+		self.maxEntries = maxEntries
+		self.nodesExpanded = 0
+		self.evicted = 0
+		self.limits = None
+
+	def __len__(self):
+		"""Return the number of entries in the memo."""
+		return len(self.young) + len(self.old)
+
+	def lookup(self, key):
+		"""Return the memoized count for a key, or None if it has none."""
+		count = self.young.get(key)
+		if count is None:
+			count = self.old.get(key)
+			if count is not None:
+				self.store(key, count)
+		return count
+
+	def store(self, key, count):
+		"""Memoize the count for a key, evicting old entries if need be."""
+		young = self.young
+		young[key] = count
+		if self.maxEntries is not None and len(young) >= self.maxEntries // 2:
+			self.evicted += len(self.old)
+			self.old = young
+			self.young = {}
+
+	def count(self, images, pegs, CENTER=bitboard.CENTER, JUMP_IMAGES=bitboard.JUMP_IMAGES,
+			isDead=pruning.isDead, map=map, min=min, xor=operator.xor):
+		"""
+		Return the number of solutions from the state with the given symmetric
+		images and number of pegs. Raise budget.BudgetExceeded if the counter's
+		budget is exceeded first.
+		"""
+		if pegs <= 1:
+			return 1 if images[0] == CENTER else 0
+		key = min(images)
+		total = self.lookup(key)
+		if total is not None:
+			return total
+		total = 0
+		# Pruned states have no solutions to count
+		if not isDead(images[0]):
+			limits = self.limits
+			for jump in validJumps(images[0]):
+				self.nodesExpanded += 1
+				if limits is not None and self.nodesExpanded >= limits.due:
+					limits.check(self.nodesExpanded)
+				total += self.count(map(xor, images, JUMP_IMAGES[jump]), pegs - 1)
+		self.store(key, total)
+		return total
+
+	def firstMoves(self, images, pegs):
+		"""
+		Return a list of (jump, count) pairs for each valid jump from the state
+		with the given symmetric images and number of pegs, with the number of
+		solutions that start with that jump.
+		"""
+		return [(jump, self.count(bitboard.jumpImages(images, jump), pegs - 1))
+			for jump in validJumps(images[0])]
+
+	def solutions(self, images, pegs):
+		"""
+		Generate the solutions from the state with the given symmetric images
+		and number of pegs, one at a time, as lists of jumps (indexes in
+		bitboard.JUMPS). Only jumps to children with solutions are followed,
+		so every jump tried leads to at least one solution.
+		"""
+		if pegs <= 1:
+			if images[0] == bitboard.CENTER:
+				yield []
+			return
+		for jump in validJumps(images[0]):
+			childImages = bitboard.jumpImages(images, jump)
+			if self.count(childImages, pegs - 1):
+				for rest in self.solutions(childImages, pegs - 1):
+					yield [jump] + rest
+
+
+# Store MOVES_FROM locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def validJumps(bits, MOVES_FROM=bitboard.MOVES_FROM):
+	"""
+	Return the indexes in bitboard.JUMPS of every valid jump from a bitboard,
+	in the order of validMoves, but without leaving out symmetric moves.
+	"""
+	jumps = []
+	pegs = bits
+	while pegs:
+		peg = pegs & -pegs
+		pegs ^= peg
+		for (jump, _, overMask, toMask) in MOVES_FROM[peg.bit_length() - 1]:
+			if bits & overMask and not bits & toMask:
+				jumps.append(jump)
+	return jumps
+
+
+def jumpTrace(jumps):
+	"""
+	Return the trace of a list of jumps: the old and new positions of each
+	one as (row, column) pairs, like a game's trace.
+	"""
+	trace = []
+	for jump in jumps:
+		(oldPos, direction, _, _, _) = bitboard.JUMPS[jump]
+		newPos = oldPos + 2 * direction
+		trace.append((oldPos // 7, oldPos % 7))
+		trace.append((newPos // 7, newPos % 7))
+	return trace
+
+
+def countSolutions(pegSol, counter=None):
+	"""
+	Count the solutions of the given Peg Solitaire game with a
+	solutionCounter (a new unbounded one if none is given), and return the
+	counter. The total is saved as the game's solutionCount, the number of
+	solutions starting with each first move as its firstMoves (a list of
+	(trace of the move, count) pairs), and the jumps followed are added to
+	its nodesExpanded. If any solution exists, the first is saved as the
+	game's trace. The counter checks the game's budget, if it has one: if
+	the budget is exceeded first, the game is marked as limited (see
+	search.recordBudget), its solutionCount is None, and its firstMoves is
+	empty.
+	"""
+	search.checkPlainBoard(pegSol, "Counting")
+	if counter is None:
+		counter = solutionCounter()
+	root = pegSol.rootNode()
+	nodes = counter.nodesExpanded
+	pegSol.solutionCount = None
+	pegSol.firstMoves = []
+	counter.limits = pegSol.budget
+	try:
+		if counter.limits is not None:
+			# Counting has no partial trace, so the best is the root
+			counter.limits.offer(root)
+		solutionCount = counter.count(root.images, root.pegCount)
+		firstMoves = [(jumpTrace([jump]), count)
+			for (jump, count) in counter.firstMoves(root.images, root.pegCount)]
+	except budget.BudgetExceeded as e:
+		search.recordBudget(pegSol, e.reason)
+		return counter
+	finally:
+		counter.limits = None
+		pegSol.nodesExpanded += counter.nodesExpanded - nodes
+	pegSol.solutionCount = solutionCount
+	pegSol.firstMoves = firstMoves
+	first = next(counter.solutions(root.images, root.pegCount), None)
+	pegSol.trace = "Impossible to solve" if first is None else jumpTrace(first)
+	return counter
+
+
+def solutionTraces(pegSol, counter):
+	"""
+	Generate the trace of every solution of the given Peg Solitaire game, one
+	at a time, from a solutionCounter (such as one returned by
+	countSolutions, which has already counted them).
+	"""
+	root = pegSol.rootNode()
+	for jumps in counter.solutions(root.images, root.pegCount):
+		yield jumpTrace(jumps)
@@ -0,0 +1,82 @@
+import json
+import time
+
+
+# A game's stats attribute is None unless it is given a searchStats, and
+# search functions look it up once and only count events when it is not None,
+# so instrumentation costs one comparison per event when it is off.
+# Terms used by the counters:
+# - generated: child nodes created (what nodesExpanded counts, by the
+#   convention of getNextState)
+# - expanded: nodes whose children were generated
+# - symmetryPruned: children skipped because their symmetric key was already
+#   explored (possibly as a different one of the eight symmetric states)
+# - frontierHits: children skipped because their key was already in the frontier
+# - failedHits: children skipped because their key was known to fail
+# - heuristicEvaluations: heuristic values computed for children
+# - heapPushes and heapPops: operations on a frontier
+
+
+class searchStats(object):
+	"""
+	Counters, per-depth histograms, and a sampled time series for one search.
+	Every sampleInterval expanded nodes, the sizes of the frontier and explored
+	set are recorded as a sample, and passed to callback (if any) along with
+	these stats.
+	"""
+
+	COUNTERS = ("generated", "expanded", "symmetryPruned", "frontierHits",
+		"failedHits", "heuristicEvaluations", "heapPushes", "heapPops")
+
+	def __init__(self, callback=None, sampleInterval=10000):
+		"""Initialize zeroed stats."""
+		for name in self.COUNTERS:
+			setattr(self, name, 0)
+		# expandedByDepth[d] counts expanded nodes d moves from the root
+		self.expandedByDepth = []
+		# Each sample is (seconds since start, expanded, frontier size, explored size)
+		self.samples = []
+		self.callback = callback
+		self.sampleInterval = sampleInterval
+		self.nextSample = sampleInterval
+		self.start = time.time()
+		self.rootPegs = 0
+
+	def begin(self, root):
+		"""Start counting depths from the given root node."""
+		self.rootPegs = root.pegCount
+
+	def expand(self, pegCount, frontierSize, exploredSize):
+		"""
+		Count a node with the given number of pegs as expanded, and take a
+		sample if it is time to, given the current sizes of the frontier and
+		explored set.
+		"""
+		self.expanded += 1
+		depth = self.rootPegs - pegCount
+		histogram = self.expandedByDepth
+		if depth >= len(histogram):
+			histogram.extend([0] * (depth + 1 - len(histogram)))
+		histogram[depth] += 1
+		if self.expanded >= self.nextSample:
+			self.nextSample += self.sampleInterval
+			self.sample(frontierSize, exploredSize)
+
+	def sample(self, frontierSize, exploredSize):
+		"""Record a sample of the given sizes, and pass it to the callback."""
+		sample = (round(time.time() - self.start, 3), self.expanded, frontierSize, exploredSize)
+		self.samples.append(sample)
+		if self.callback is not None:
+			self.callback(self, sample)
+
+	def asDict(self):
+		"""Return the stats as a dict that can be dumped as JSON."""
+		stats = dict((name, getattr(self, name)) for name in self.COUNTERS)
+		stats["seconds"] = round(time.time() - self.start, 3)
+		stats["expandedByDepth"] = self.expandedByDepth
+		stats["samples"] = self.samples
+		return stats
+
+	def dump(self, fileHandle):
+		"""Write the stats as JSON to a file."""
+		json.dump(self.asDict(), fileHandle, indent=1, sort_keys=True)
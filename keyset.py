@@ -0,0 +1,226 @@
+import array
+import mmap
+import os
+import struct
+import tempfile
+
+
+# A Python set of symmetric keys costs about 60 bytes per key: a 24-byte int
+# object, plus a 16-byte hash table entry at most two-thirds full. A keySet
+# instead stores the keys themselves in a flat array of 8-byte slots, with
+# open addressing and linear probing, which takes 12 to 24 bytes per key.
+# Keys are stored plus one, so that 0 marks an empty slot even though the key
+# of an empty board is 0. Keys are removed by shifting later keys in the same
+# run back into the gap, so no deleted markers are left to slow down probes.
+# For searches too large even for that, the slots can be kept in a
+# memory-mapped temporary file instead, which the operating system can page
+# out to disk.
+
+SLOT = struct.Struct("<Q")
+
+# The table doubles in size when adding a key would make it more full than this
+MAX_LOAD = 2.0 / 3
+
+# Whether array.array('l') can hold a slot, which it cannot where a C long is
+# 32 bits, as on Windows
+LONG_SLOTS = array.array('l').itemsize >= SLOT.size
+
+
+class mappedSlots(object):
+	"""
+	An array of 8-byte unsigned slots in a memory-mapped temporary file, which
+	is deleted as soon as it is mapped, so it is freed once closed.
+	"""
+
+	def __init__(self, slots, directory=None):
+		"""Create a file of the given number of zeroed slots in a directory."""
+		(handle, path) = tempfile.mkstemp(".keys", "keyset", directory)
+		try:
+			os.ftruncate(handle, slots * SLOT.size)
+			self.map = mmap.mmap(handle, slots * SLOT.size)
+		finally:
+			os.close(handle)
+			os.remove(path)
+		self.slots = slots
+
+	def __len__(self):
+		"""Return the number of slots."""
+		return self.slots
+
+	def __iter__(self):
+		"""Generate the values of the slots in order."""
+		for i in xrange(self.slots):
+			yield self[i]
+
+	def __getitem__(self, i):
+		"""Return the value of a slot."""
+		return SLOT.unpack_from(self.map, i * SLOT.size)[0]
+
+	def __setitem__(self, i, value):
+		"""Set the value of a slot."""
+		SLOT.pack_into(self.map, i * SLOT.size, value)
+
+	def close(self):
+		"""Release the file."""
+		self.map.close()
+
+
+class keySet(object):
+	"""
+	A set of symmetric keys of game nodes, with the methods of a Python set
+	that the search functions use, in much less memory. If a directory is
+	given, the slots are kept in a memory-mapped file there.
+	"""
+
+	def __init__(self, keys=(), size=8, directory=None):
+		"""
+		Initialize a set of the given keys, with room for at least size slots
+		(rounded up to a power of two).
+		"""
+		slots = 8
+		while slots < size:
+			slots *= 2
+		self.directory = directory
+		# Without wide enough longs, the slots are kept in a temporary file
+		self.mapped = directory is not None or not LONG_SLOTS
+		self.slots = self._newSlots(slots)
+		self.mask = slots - 1
+		self.size = 0
+		for key in keys:
+			self.add(key)
+
+	def _newSlots(self, slots):
+		"""Return an array of the given number of empty slots."""
+		if self.mapped:
+			return mappedSlots(slots, self.directory)
+		# 'l' is a 64-bit integer on most 64-bit platforms (see LONG_SLOTS);
+		# unlike 'L', its items are read as ints rather than slower longs
+		return array.array('l', [0]) * slots
+
+	def __len__(self):
+		"""Return the number of keys in the set."""
+		return self.size
+
+	def __iter__(self):
+		"""Generate the keys in the set, in no particular order."""
+		for value in self.slots:
+			if value:
+				yield value - 1
+
+	@property
+	def nbytes(self):
+		"""The number of bytes that the slots take."""
+		return len(self.slots) * SLOT.size
+
+	def slot(self, key):
+		"""Return the slot that a key hashes to."""
+		# Folding the high bits down and multiplying by an odd constant spreads
+		# the bits of similar keys, and keeps the product within a machine
+		# integer (unlike the 64-bit constant of transposition.slot), which
+		# makes it several times faster in Python
+		return (((key ^ (key >> 16)) * 0x45D9F3B) >> 16) & self.mask
+
+	def find(self, key):
+		"""Return the slot holding a key, or the empty slot where it would go."""
+		value = key + 1
+		slots = self.slots
+		mask = self.mask
+		i = (((key ^ (key >> 16)) * 0x45D9F3B) >> 16) & mask
+		v = slots[i]
+		while v and v != value:
+			i = (i + 1) & mask
+			v = slots[i]
+		return i
+
+	# The search functions mostly test for keys, so this repeats the probe
+	# loop of find instead of calling it
+	def __contains__(self, key):
+		"""Return whether a key is in the set."""
+		value = key + 1
+		slots = self.slots
+		mask = self.mask
+		i = (((key ^ (key >> 16)) * 0x45D9F3B) >> 16) & mask
+		v = slots[i]
+		while v:
+			if v == value:
+				return True
+			i = (i + 1) & mask
+			v = slots[i]
+		return False
+
+	def add(self, key):
+		"""Add a key to the set."""
+		slots = self.slots
+		i = self.find(key)
+		if slots[i]:
+			return
+		if self.size + 1 > len(slots) * MAX_LOAD:
+			self.resize(len(slots) * 2)
+			slots = self.slots
+			i = self.find(key)
+		slots[i] = key + 1
+		self.size += 1
+
+	def update(self, keys):
+		"""Add every one of some keys to the set."""
+		for key in keys:
+			self.add(key)
+
+	def remove(self, key):
+		"""Remove a key from the set, or raise KeyError if it is not there."""
+		slots = self.slots
+		mask = self.mask
+		i = self.find(key)
+		if not slots[i]:
+			raise KeyError(key)
+		# Move each later key in the run that may sit at or after the gap
+		# back into it, so every key stays reachable from its own slot
+		j = i
+		while True:
+			j = (j + 1) & mask
+			value = slots[j]
+			if not value:
+				break
+			home = self.slot(value - 1)
+			if (j - home) & mask >= (j - i) & mask:
+				slots[i] = value
+				i = j
+		slots[i] = 0
+		self.size -= 1
+
+	def discard(self, key):
+		"""Remove a key from the set if it is there."""
+		if key in self:
+			self.remove(key)
+
+	def copy(self):
+		"""Return a new set with the same keys, in the same kind of storage."""
+		other = keySet((), len(self.slots), self.directory)
+		if not self.mapped:
+			other.slots = self.slots[:]
+			other.size = self.size
+		else:
+			other.update(self)
+		return other
+
+	def resize(self, slots):
+		"""Move the keys into a new array with the given number of slots."""
+		old = self.slots
+		self.slots = self._newSlots(slots)
+		self.mask = slots - 1
+		new = self.slots
+		mask = self.mask
+		for value in old:
+			if value:
+				key = value - 1
+				i = (((key ^ (key >> 16)) * 0x45D9F3B) >> 16) & mask
+				while new[i]:
+					i = (i + 1) & mask
+				new[i] = value
+		if self.mapped:
+			old.close()
+
+	def close(self):
+		"""Release a memory-mapped file, if the set uses one."""
+		if self.mapped:
+			self.slots.close()
@@ -0,0 +1,143 @@
+import argparse
+import collections
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import batch
+import server
+
+
+# Load-tests the solver daemon (server.py) from a corpus of board files: each
+# of a number of client threads keeps one connection, and sends requests of
+# a few boards drawn at random from the corpus until a given number of
+# requests has been answered. It prints the throughput and percentiles of the
+# latencies it saw, and then the server's own metrics.
+
+
+class serviceClient(object):
+	"""A connection to the solver daemon."""
+
+	def __init__(self, address):
+		"""Connect to a Unix socket path, or a (host, port) pair."""
+		family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+		self.socket = socket.socket(family, socket.SOCK_STREAM)
+		self.socket.connect(address)
+		self.rfile = self.socket.makefile('rb')
+		self.wfile = self.socket.makefile('wb')
+
+	def close(self):
+		"""Close the connection."""
+		self.rfile.close()
+		self.wfile.close()
+		self.socket.close()
+
+	def request(self, lines):
+		"""Send a request of some lines, and return the records of its reply."""
+		self.wfile.write(''.join(line + '\n' for line in lines) + '\n')
+		self.wfile.flush()
+		records = []
+		for line in iter(self.rfile.readline, ''):
+			if line == '\n':
+				return records
+			records.append(json.loads(line))
+		raise IOError("Connection closed by the server")
+
+	def solve(self, boards):
+		"""Return the records of solving a list of boards."""
+		return self.request(boards)
+
+	def metrics(self):
+		"""Return the server's metrics."""
+		return self.request([server.METRICS])[0]
+
+
+def readCorpus(patterns, maxPegs=None):
+	"""Return the first line of every board file matching a list of directories and patterns."""
+	boards = []
+	for path in batch.boardPaths(patterns):
+		if maxPegs is None or batch.pegCount(path) <= maxPegs:
+			with open(path, 'r') as fileHandle:
+				boards.append(fileHandle.readline().strip())
+	return boards
+
+
+def runClient(address, boards, batchSize, requests, latencies, statuses, lock):
+	"""Send requests until none are left to send, recording their latencies and statuses."""
+	client = serviceClient(address)
+	try:
+		while True:
+			with lock:
+				if requests[0] <= 0:
+					return
+				requests[0] -= 1
+			tic = time.time()
+			records = client.solve([random.choice(boards) for _ in xrange(batchSize)])
+			latency = time.time() - tic
+			with lock:
+				latencies.append(latency)
+				statuses.update(record["status"] for record in records)
+	finally:
+		client.close()
+
+
+def main(args):
+
+	address = args.socket or (args.host, args.port)
+	boards = readCorpus(args.boards, args.max_pegs)
+	if not boards:
+		sys.exit("No boards found")
+	random.seed(args.seed)
+	latencies = []
+	statuses = collections.Counter()
+	lock = threading.Lock()
+	# The number of requests left to send, shared by the clients
+	requests = [args.requests]
+	threads = [threading.Thread(target=runClient,
+		args=(address, boards, args.batch_size, requests, latencies, statuses, lock))
+		for _ in xrange(args.clients)]
+	tic = time.time()
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+	for thread in threads:
+		# Joining with a timeout lets a keyboard interrupt stop the test
+		while thread.is_alive():
+			thread.join(1)
+	elapsed = time.time() - tic
+	latencies.sort()
+	print "Requests: %d in %.3f seconds (%.1f boards/second)" % (len(latencies), elapsed,
+		len(latencies) * args.batch_size / elapsed)
+	print "Statuses: " + json.dumps(dict(statuses), sort_keys=True)
+	for (label, fraction) in (("P50", 0.5), ("P95", 0.95), ("P99", 0.99)):
+		print "Latency %s: %.3f" % (label, server.percentile(latencies, fraction))
+	print "Latency Max: %.3f" % latencies[-1]
+	client = serviceClient(address)
+	print "Server Metrics: " + json.dumps(client.metrics(), sort_keys=True)
+	client.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Load-test the solver daemon")
+	parser.add_argument("boards", nargs='*', default=["boards"],
+		help="board files, directories of them, or glob patterns (default: boards)")
+	parser.add_argument("--socket", type=str,
+		help="connect to the daemon's Unix socket at this path instead of a TCP port")
+	parser.add_argument("--host", default="127.0.0.1",
+		help="address of the daemon for TCP (default: 127.0.0.1)")
+	parser.add_argument("--port", type=int, default=5370,
+		help="TCP port of the daemon (default: 5370)")
+	parser.add_argument("--clients", type=int, default=4,
+		help="number of concurrent connections (default: 4)")
+	parser.add_argument("--requests", type=int, default=100,
+		help="total number of requests to send (default: 100)")
+	parser.add_argument("--batch-size", type=int, default=1,
+		help="boards per request (default: 1)")
+	parser.add_argument("--max-pegs", type=int,
+		help="leave out boards with more pegs than this")
+	parser.add_argument("--seed", type=int, default=0,
+		help="seed for drawing boards (default: 0)")
+	args = parser.parse_args()
+	main(args)
@@ -0,0 +1,107 @@
+import bitboard
+import search
+
+
+# The depth-first searches (RecursiveDLS and StackDLS) try the valid moves
+# from each node in row-major order of the moved peg unless they are given a
+# move ordering, which sorts the indexes in bitboard.JUMPS of the moves from
+# each node before they are tried. Sorting is stable, so moves that an
+# ordering ranks equally keep their row-major order. An ordering is also told
+# of every move whose subtree was cut off by the depth limit (rather than
+# failing), which the history ordering learns from. One ordering object is
+# kept for all the iterations of an iterative-deepening search, so what it
+# learns in one iteration orders the next.
+
+
+class moveOrdering(object):
+	"""The default ordering: row-major, as validMoves generates moves."""
+
+	name = "rowmajor"
+
+	def order(self, images, jumps):
+		"""
+		Return a list of the jumps (indexes in bitboard.JUMPS) that are valid
+		from a state with the given symmetric images, in the order to try them.
+		"""
+		return jumps
+
+	def orderMoves(self, images, moves, JUMP_INDEX=bitboard.JUMP_INDEX, JUMPS=bitboard.JUMPS):
+		"""
+		Return a list of the (oldPos, direction) moves generated by validMoves
+		for a state with the given symmetric images, in the order to try them.
+		"""
+		jumps = self.order(images, [JUMP_INDEX[move] for move in moves])
+		return [JUMPS[jump][:2] for jump in jumps]
+
+	def cutOff(self, jump):
+		"""Learn that a jump led to a subtree that was cut off by the depth limit."""
+		pass
+
+
+class difficultyOrdering(moveOrdering):
+	"""
+	A static ordering that moves pegs from the positions that heuristicTwo
+	rates hardest to clear first, so that the outer corners are cleared while
+	there are still pegs around them to jump over.
+	"""
+
+	name = "difficulty"
+
+	# Lower ranks are tried first
+	RANKS = [-search.DIFFICULTIES[oldPos] for (oldPos, _, _, _, _) in bitboard.JUMPS]
+
+	def order(self, images, jumps):
+		"""See moveOrdering.order."""
+		return sorted(jumps, key=self.RANKS.__getitem__)
+
+
+class historyOrdering(moveOrdering):
+	"""
+	The history heuristic: moves are tried in decreasing order of how many
+	times the same jump (the same peg position and direction) has led to a
+	subtree that was cut off instead of failing, in this iteration or any
+	earlier one.
+	"""
+
+	name = "history"
+
+	def __init__(self):
+		"""Initialize an ordering with no history."""
+		# Stored negated, so the most successful jumps sort first
+		self.counts = [0] * len(bitboard.JUMPS)
+
+	def order(self, images, jumps):
+		"""See moveOrdering.order."""
+		return sorted(jumps, key=self.counts.__getitem__)
+
+	def cutOff(self, jump):
+		"""See moveOrdering.cutOff."""
+		self.counts[jump] -= 1
+
+
+class childOrdering(moveOrdering):
+	"""
+	An ordering that tries first the moves to the children with the lowest
+	value of a heuristic, computed with its delta function from the parent's
+	value (which is the same for every child, so it is left out).
+	"""
+
+	name = "child"
+
+	def __init__(self, heuristic=search.heuristicOne):
+		"""Initialize an ordering by a heuristic that has a delta function."""
+		self.heuristic = heuristic
+		self.images = None
+
+	def order(self, images, jumps):
+		"""See moveOrdering.order."""
+		# The delta functions only read the images of the node they are
+		# given, so this ordering stands in for the node with these images
+		self.images = images
+		delta = self.heuristic.delta
+		return sorted(jumps, key=lambda jump: delta(self, jump))
+
+
+# Each ordering by name, as a class to create a new ordering for each search
+ORDERINGS = dict((ordering.name, ordering)
+	for ordering in (moveOrdering, difficultyOrdering, historyOrdering, childOrdering))
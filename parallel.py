@@ -0,0 +1,245 @@
+import multiprocessing
+import Queue
+import time
+import bitboard
+import budget
+import pegSolitaireUtils
+import pruning
+import search
+
+
+# Hash-distributed A* (HDA*): every symmetric key is owned by exactly one
+# worker process, picked by hashing the key. A worker pops nodes from its own
+# frontier and sends each child to the child's owner, which alone decides
+# whether the child is new. Each worker therefore keeps only its share of the
+# frontier and explored sets, and no locks are needed to share them.
+# Children are sent in batches to amortize the cost of pickling, as tuples of
+# (h, bits, key, parentKey). The owner of a key keeps its parent's key, so
+# once the search stops, the parent process rebuilds a trace by asking the
+# owner of each key in turn for the key's parent, back to the root.
+# A worker that finds a solution reports it and stops the others. Failure is
+# harder to detect, since a worker with nothing to do may still be sent more
+# work; the parent declares it when every worker is idle and as many batches
+# have been received as sent, for two successive checks of the same counts.
+# The parent also checks the game's budget against the workers' counts of
+# nodes expanded, except for the memory limit, which each worker checks
+# against its own resident memory.
+
+# Children sent to one owner at once
+BATCH_SIZE = 256
+# Nodes expanded between checks for new batches
+EXPANSIONS = 64
+# Seconds for an idle worker to wait for a batch, or the parent to wait
+# between termination checks
+POLL_INTERVAL = 0.01
+
+
+def owner(key, workers):
+	"""Return the index of the worker that owns a symmetric key."""
+	# Multiplying by a large odd constant spreads the bits of similar keys
+	# (see transposition.transpositionTable.slot)
+	return ((key * 0x9E3779B97F4A7C15) >> 17) % workers
+
+
+def worker(index, inboxes, results, queries, answers, stop, idle, sent, received,
+	expanded, heuristic, lifo, prune, maxMemory):
+	"""
+	Search the part of the game tree owned by one worker until a solution is
+	found or the parent stops it, then report its counts, and the key of its
+	node with the fewest pegs, to the results queue. Then answer the parent's
+	queries for the parents' keys of keys it owns, until it sends None.
+	"""
+	workers = len(inboxes)
+	inbox = inboxes[index]
+	# Batches left unread when the search stops must not keep this process
+	# from exiting
+	for queue in inboxes:
+		queue.cancel_join_thread()
+	outboxes = [[] for _ in xrange(workers)]
+	frontier = search.bucketQueue(lifo)
+	# The parent's key of every key that has ever been pushed to this
+	# worker's frontier, which are the union of UniformCostSearch's explored
+	# and frontierLookup sets
+	parents = {}
+	nodesExpanded = 0
+	nodesPruned = 0
+	bestPegs = 1 << 30
+	bestKey = None
+	JUMP_INDEX = bitboard.JUMP_INDEX
+	isDead = pruning.isDead
+
+	def receive(batch):
+		for (h, bits, key, parentKey) in batch:
+			if key not in parents:
+				parents[key] = parentKey
+				frontier.push(h, (h, bits, key))
+
+	def send(target):
+		# Count the batch before sending it, so it is never in transit uncounted
+		sent[index] += 1
+		inboxes[target].put(outboxes[target])
+		outboxes[target] = []
+
+	while not stop.is_set():
+		# Receive every waiting batch, or wait briefly for one if idle
+		wait = not frontier
+		while True:
+			try:
+				batch = inbox.get(wait, POLL_INTERVAL) if wait else inbox.get_nowait()
+			except Queue.Empty:
+				break
+			# Mark this worker busy before counting the batch as received
+			idle[index] = 0
+			received[index] += 1
+			receive(batch)
+			wait = False
+		if not frontier:
+			idle[index] = 1
+			continue
+		for _ in xrange(EXPANSIONS):
+			if not frontier:
+				break
+			(h, bits, key) = frontier.pop()
+			node = pegSolitaireUtils.bitNode(bits, None, None, bitboard.popCount(bits),
+				heuristic, None, h)
+			if node.pegCount < bestPegs:
+				(bestPegs, bestKey) = (node.pegCount, key)
+			if node.is_solved():
+				results.put(("solved", key))
+				stop.set()
+				break
+			for (oldPos, direction) in node.validMoves():
+				# Counted like getNextState
+				nodesExpanded += 1
+				jump = JUMP_INDEX[oldPos, direction]
+				child = node.child(jump, None)
+				if prune and isDead(child.bits):
+					nodesPruned += 1
+					continue
+				target = owner(child.key, workers)
+				item = (child.h or 0, child.bits, child.key, key)
+				if target == index:
+					receive((item,))
+				else:
+					outboxes[target].append(item)
+					if len(outboxes[target]) >= BATCH_SIZE:
+						send(target)
+		# Send partial batches too, or other workers could sit idle
+		for target in xrange(workers):
+			if outboxes[target]:
+				send(target)
+		expanded[index] = nodesExpanded
+		if maxMemory is not None and budget.residentMemory() >= maxMemory:
+			results.put(("limited", budget.MEMORY))
+			stop.set()
+	results.put(("done", nodesExpanded, nodesPruned, frontier.peak, bestPegs, bestKey))
+	for key in iter(queries[index].get, None):
+		answers.put(parents[key])
+
+
+def pathKeys(key, queries, answers):
+	"""
+	Return the list of symmetric keys from the root to a key, asking the
+	owner of each key for its parent's key.
+	"""
+	keys = []
+	while key is not None:
+		keys.append(key)
+		queries[owner(key, len(queries))].put(key)
+		key = answers.get()
+	keys.reverse()
+	return keys
+
+
+def ParallelUniformCostSearch(pegSol, heuristic=None, workers=None, lifo=False, prune=False):
+	"""
+	Perform a uniform-cost search (with an optional cost heuristic) like
+	search.UniformCostSearch, but split by hash across the given number of
+	worker processes (one per CPU by default), and return either the updated
+	game, FAILURE, or LIMITED. The game's nodesExpanded and nodesPruned are
+	the sums of every worker's counts, and its peakFrontier is the largest
+	one worker reached. Expanded nodes are not counted in the same order as a
+	single process, so the counts differ from UniformCostSearch's.
+
+	The game's budget is checked every POLL_INTERVAL, so a node limit may be
+	overshot by the nodes the workers expand meanwhile, and a memory limit
+	applies to each worker's resident memory. The game's stateStore, stats,
+	and checkpoint file are not used.
+	"""
+	search.checkPlainBoard(pegSol, "Parallel A*")
+	workers = workers or multiprocessing.cpu_count()
+	root = pegSol.rootNode(heuristic)
+	if prune and search.isPrunedRoot(pegSol, root):
+		return search.FAILURE
+	bits = root.images[0]
+	inboxes = [multiprocessing.Queue() for _ in xrange(workers)]
+	results = multiprocessing.Queue()
+	queries = [multiprocessing.Queue() for _ in xrange(workers)]
+	answers = multiprocessing.Queue()
+	stop = multiprocessing.Event()
+	# Shared without locks: each worker only writes its own entries, and the
+	# parent counts as an extra sender
+	idle = multiprocessing.Array('b', workers, lock=False)
+	sent = multiprocessing.Array('l', workers + 1, lock=False)
+	received = multiprocessing.Array('l', workers, lock=False)
+	expanded = multiprocessing.Array('l', workers, lock=False)
+	limits = pegSol.budget
+	maxMemory = limits.maxMemory if limits is not None else None
+	processes = [multiprocessing.Process(target=worker, args=(i, inboxes, results,
+		queries, answers, stop, idle, sent, received, expanded, heuristic, lifo, prune,
+		maxMemory)) for i in xrange(workers)]
+	for process in processes:
+		process.daemon = True
+		process.start()
+	sent[workers] += 1
+	inboxes[owner(root.key, workers)].put([(root.h or 0, bits, root.key, None)])
+
+	solvedKey = None
+	reason = None
+	done = []
+	try:
+		counts = None
+		while not stop.is_set():
+			time.sleep(POLL_INTERVAL)
+			if limits is not None:
+				# The parent holds little memory, so its own check of the memory
+				# limit is harmless, but only the workers' checks can fail
+				try:
+					limits.check(sum(expanded))
+				except budget.BudgetExceeded as e:
+					reason = e.reason
+					stop.set()
+			if all(idle) and sum(sent) == sum(received):
+				if counts == sum(sent):
+					stop.set()
+				counts = sum(sent)
+			else:
+				counts = None
+		while len(done) < workers:
+			result = results.get()
+			if result[0] == "solved":
+				solvedKey = result[1]
+			elif result[0] == "limited":
+				reason = reason or result[1]
+			else:
+				done.append(result)
+		pegSol.nodesExpanded += sum(result[1] for result in done)
+		pegSol.nodesPruned += sum(result[2] for result in done)
+		pegSol.peakFrontier = max(result[3] for result in done)
+		if solvedKey is not None:
+			node = pegSolitaireUtils.replayKeys(root, pathKeys(solvedKey, queries, answers)[1:])
+			# copySolution saves the move trace
+			node.copySolution(pegSol)
+			return node
+		if reason is not None:
+			(_, _, _, _, _, bestKey) = min(done, key=lambda result: result[4])
+			if bestKey is not None:
+				limits.offer(pegSolitaireUtils.replayKeys(root, pathKeys(bestKey, queries, answers)[1:]))
+			return search.recordBudget(pegSol, reason)
+		return search.FAILURE
+	finally:
+		stop.set()
+		for queue in queries:
+			queue.put(None)
+		for process in processes:
+			process.join()
@@ -0,0 +1,206 @@
+import argparse
+import collections
+import mmap
+import os
+import struct
+import bitboard
+import search
+
+
+# A pattern database splits the board into regions (the four arms and the
+# center 3x3) and stores, for every pattern of pegs in each region, a cost
+# computed offline by a retrograde search of an abstraction of the game. In
+# the abstraction only the region's positions are known, and every position
+# outside it is a wildcard that holds a peg or a hole as a jump needs, so a
+# jump that touches the region can be made whenever its positions in the
+# region allow it. The cost of a pattern is the fewest such jumps that turn it
+# into the region's part of the solved state (empty, or only the center peg),
+# found by a breadth-first search backward from that part. Every pattern can
+# be cleared in the abstraction, so the costs are finite; they still tell
+# apart pegs that are stuck, such as an isolated peg in an arm's corner, from
+# pegs that are easy to clear, in a way that no per-position weight can.
+# A search adds the costs of the five patterns of a state to heuristicTwo. A
+# jump only changes the patterns of the one or two regions it touches, so the
+# delta function looks up just those.
+# The sum is not an admissible lower bound: a jump that touches two regions
+# counts in both of their costs, and heuristicTwo is not a lower bound to
+# begin with. No heuristic needs to be one here, since every solution from a
+# state takes exactly one jump fewer than its number of pegs, so the fewest
+# jumps left are known and any solution found is as short as any other; the
+# costs only rank states by how hard their pegs are to clear.
+# The database is a small binary file: a header, then each region's positions
+# and its table of one byte per pattern. It is memory-mapped, so searches in
+# several processes share one copy.
+
+MAGIC = "PEGPDB1\n"
+HEADER = struct.Struct(">8sB")
+REGION_HEADER = struct.Struct(">B")
+
+# Each region as (name, positions). A region's pattern has bit k set if
+# there is a peg at its kth position.
+REGIONS = [
+	("north", [row * 7 + col for row in (0, 1) for col in (2, 3, 4)]),
+	("south", [row * 7 + col for row in (5, 6) for col in (2, 3, 4)]),
+	("west", [row * 7 + col for row in (2, 3, 4) for col in (0, 1)]),
+	("east", [row * 7 + col for row in (2, 3, 4) for col in (5, 6)]),
+	("center", [row * 7 + col for row in (2, 3, 4) for col in (2, 3, 4)]),
+]
+
+# The cost of a pattern that cannot reach the solved state (none can, with
+# the REGIONS above)
+UNREACHABLE = 255
+
+
+def abstractJumps(positions):
+	"""
+	Return each jump that touches a region with the given positions, as a
+	pair of pattern masks: the positions in the region that the jump flips,
+	and the pattern of those positions after the jump.
+	"""
+	index = dict((pos, k) for (k, pos) in enumerate(positions))
+	jumps = []
+	for (oldPos, direction, _, _, _) in bitboard.JUMPS:
+		mask = after = 0
+		# The jump empties its first two positions and fills the third
+		for (pos, filled) in ((oldPos, 0), (oldPos + direction, 0), (oldPos + 2 * direction, 1)):
+			if pos in index:
+				mask |= 1 << index[pos]
+				after |= filled << index[pos]
+		if mask:
+			jumps.append((mask, after))
+	return jumps
+
+
+def buildTable(positions):
+	"""
+	Return a list of the cost of every pattern of a region with the given
+	positions, by a breadth-first search that undoes abstract jumps from the
+	region's part of the solved state.
+	"""
+	goal = 1 << positions.index(24) if 24 in positions else 0
+	jumps = abstractJumps(positions)
+	costs = [UNREACHABLE] * (1 << len(positions))
+	costs[goal] = 0
+	queue = collections.deque([goal])
+	while queue:
+		pattern = queue.popleft()
+		cost = costs[pattern] + 1
+		for (mask, after) in jumps:
+			if pattern & mask == after:
+				parent = pattern ^ mask
+				if costs[parent] == UNREACHABLE:
+					costs[parent] = cost
+					queue.append(parent)
+	return costs
+
+
+def build(path, regions=REGIONS):
+	"""Build a pattern database for a list of (name, positions) regions in a file."""
+	# Build to a temporary name, so an incomplete database is never used
+	partialPath = path + ".partial"
+	with open(partialPath, 'wb') as fileHandle:
+		fileHandle.write(HEADER.pack(MAGIC, len(regions)))
+		for (_, positions) in regions:
+			fileHandle.write(REGION_HEADER.pack(len(positions)))
+			fileHandle.write(''.join(chr(pos) for pos in positions))
+			fileHandle.write(''.join(chr(cost) for cost in buildTable(positions)))
+	os.rename(partialPath, path)
+
+
+def _indexTables(positions):
+	"""
+	Return byte-wise lookup tables that map a bitboard to a region's pattern,
+	as (shift, table) pairs for each byte of the bitboard with a position in
+	the region, like bitboard.SYMMETRY_TABLES.
+	"""
+	tables = []
+	for shift in xrange(0, len(bitboard.HOLES), 8):
+		bits = [(bitboard.BITS[pos] - shift, k) for (k, pos) in enumerate(positions)
+			if 0 <= bitboard.BITS[pos] - shift < 8]
+		if bits:
+			tables.append((shift, [sum(1 << k for (bit, k) in bits if value >> bit & 1)
+				for value in xrange(256)]))
+	return tables
+
+
+class patternDatabase(object):
+	"""A read-only pattern database, memory-mapped from a file built by build."""
+
+	def __init__(self, path):
+		"""Open the database in a file."""
+		with open(path, 'rb') as fileHandle:
+			self.data = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+		(magic, count) = HEADER.unpack_from(self.data)
+		if magic != MAGIC:
+			self.data.close()
+			raise ValueError("Not a pattern database: " + path)
+		# Each region as (offset of its table, its byte-wise index tables)
+		self.regions = []
+		offset = HEADER.size
+		for _ in xrange(count):
+			(size,) = REGION_HEADER.unpack_from(self.data, offset)
+			offset += REGION_HEADER.size
+			positions = [ord(c) for c in self.data[offset:offset + size]]
+			offset += size
+			self.regions.append((offset, _indexTables(positions)))
+			offset += 1 << size
+		# The regions that each jump in bitboard.JUMPS touches
+		self.jumpRegions = []
+		for (_, _, fromMask, overMask, toMask) in bitboard.JUMPS:
+			touched = fromMask | overMask | toMask
+			self.jumpRegions.append([region for region in self.regions
+				if any(table[touched >> shift & 255] for (shift, table) in region[1])])
+
+	def close(self):
+		"""Release the database file."""
+		self.data.close()
+
+	def regionCost(self, region, bits):
+		"""Return the cost of a region's pattern on a bitboard."""
+		(offset, tables) = region
+		pattern = 0
+		for (shift, table) in tables:
+			pattern |= table[bits >> shift & 255]
+		return ord(self.data[offset + pattern])
+
+	def cost(self, bits):
+		"""Return the total cost of the patterns of every region on a bitboard."""
+		return sum(self.regionCost(region, bits) for region in self.regions)
+
+	def heuristic(self):
+		"""
+		Return a heuristic for the searches: heuristicTwo plus the total cost
+		of the node's patterns, with a delta function that looks up only the
+		regions that a jump touches. It is not admissible (see the top of this
+		module).
+		"""
+		def heuristicPattern(node):
+			return search.heuristicTwo(node) + self.cost(node.images[0])
+		def delta(node, jump, JUMPS=bitboard.JUMPS):
+			before = node.images[0]
+			(_, _, fromMask, overMask, toMask) = JUMPS[jump]
+			after = before ^ (fromMask | overMask | toMask)
+			change = search.heuristicTwo.delta(node, jump)
+			for region in self.jumpRegions[jump]:
+				change += self.regionCost(region, after) - self.regionCost(region, before)
+			return change
+		heuristicPattern.delta = delta
+		return heuristicPattern
+
+
+def main(args):
+
+	build(args.output)
+	database = patternDatabase(args.output)
+	for ((name, positions), region) in zip(REGIONS, database.regions):
+		costs = [ord(c) for c in database.data[region[0]:region[0] + (1 << len(positions))]]
+		print "%s: %d patterns, highest cost %d" % (name, len(costs), max(costs))
+	database.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Build a pattern database of region costs")
+	parser.add_argument("--output", type=str, required=True,
+		help="file for the database")
+	args = parser.parse_args()
+	main(args)
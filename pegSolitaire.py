@@ -1,60 +1,437 @@
 import argparse
+import cProfile
+import itertools
+import json
+import pstats
+import signal
+import sys
 import time
 import search
+import parallel
+import persistence
+import retrograde
 import config
+import budget
+import checkpoint
+import counting
+import instrument
+import ordering
+import patterns
 import pegSolitaireUtils
 import readGame
 
+# Heuristics that can be chosen by name for the searches that accept any one
+HEURISTICS = {
+	"one": search.heuristicOne,
+	"two": search.heuristicTwo,
+	"baseline": search.heuristicBaseline,
+	"manhattan": search.heuristicManhattan,
+	"difficulty1": search.heuristicDifficulty1,
+	"difficulty2": search.heuristicDifficulty2,
+}
+
+def aStarParallel(pegSol, heuristic, args):
+	"""Run a hash-distributed A* search like search.aStarOne or aStarTwo."""
+	result = parallel.ParallelUniformCostSearch(pegSol, heuristic, args.workers,
+		args.lifo, args.prune)
+	if result is search.FAILURE:
+		search.recordFailure(pegSol)
+
+# The budget of the search in progress, if any, for cancelSearch
+currentBudget = None
+
+def cancelSearch(signum, frame):
+	"""Stop the search in progress at its next budget check."""
+	if currentBudget is not None:
+		currentBudget.cancel()
+
+def newGame(args, store, allStats, name, resumable=False):
+	"""
+	Return a game of the input board with the options in args. With --stats,
+	the game counts its search events in a new searchStats, which is saved
+	in allStats under the given name. With any limits, or --interruptible,
+	the game has a searchBudget, whose time limit starts now. With
+	--checkpoint, a resumable search's game has a checkpointFile named after
+	the search.
+	"""
+	global currentBudget
+	stats = None
+	if args.stats:
+		stats = allStats[name] = instrument.searchStats()
+	searchBudget = None
+	if (args.time_limit is not None or args.node_limit is not None or
+		args.memory_limit is not None or args.interruptible):
+		searchBudget = currentBudget = budget.searchBudget(
+			time.time() + args.time_limit if args.time_limit is not None else None,
+			args.node_limit,
+			args.memory_limit << 20 if args.memory_limit is not None else None)
+	checkpointFile = None
+	if args.checkpoint and resumable:
+		checkpointFile = checkpoint.checkpointFile("%s.%s" % (args.checkpoint, name),
+			args.checkpoint_interval)
+	return pegSolitaireUtils.game(args.input, args.bitboard, args.parent_map, store,
+		args.compact_sets, args.set_directory, stats, searchBudget, checkpointFile)
+
+def closeCheckpoint(pegSol):
+	"""
+	Delete a game's checkpoint file if its search finished, or else keep it
+	to resume from.
+	"""
+	if pegSol.checkpoint is not None:
+		if pegSol.limitReason is None:
+			pegSol.checkpoint.finish()
+		else:
+			pegSol.checkpoint.close()
+
+def printLimit(pegSol):
+	"""Print why a game's search stopped early, if it did."""
+	if pegSol.limitReason is not None:
+		print "Limit Reached: %s (best trace leaves %s pegs)" % (pegSol.limitReason, pegSol.bestPegs)
+
+def dumpStats(allStats, path):
+	"""Write the stats of each search as JSON to a file, or to stdout for "-"."""
+	output = sys.stdout if path == "-" else open(path, 'w')
+	json.dump(dict((name, stats.asDict()) for (name, stats) in allStats.items()),
+		output, indent=1, sort_keys=True)
+	output.write('\n')
+	if output is not sys.stdout:
+		output.close()
+
 def main(args):
 
 	flag = args.flag
+	if args.workers and (args.stats or args.checkpoint):
+		sys.exit("--stats and --checkpoint cannot be used with --workers")
+	if args.set_directory:
+		args.compact_sets = True
+	if args.interruptible:
+		signal.signal(signal.SIGINT, cancelSearch)
+		signal.signal(signal.SIGTERM, cancelSearch)
+	allStats = {}
+	store = None
+	if args.store:
+		store = persistence.stateStore(args.store, args.store_size << 20)
+	# Worker processes' CPU time would not be counted by time.clock
+	clock = time.time if args.workers else time.clock
 	if not flag or flag == 1:
 		#Iterative Deepening Search
 		tic = time.clock()
-		gameItrObject = pegSolitaireUtils.game(args.input)
-		search.ItrDeepSearch(gameItrObject)
+		gameItrObject = newGame(args, store, allStats, "iddfs", not args.recursive)
+		moveOrdering = ordering.ORDERINGS[args.ordering]() if args.ordering else None
+		search.ItrDeepSearch(gameItrObject, args.prune, args.recursive, moveOrdering)
+		closeCheckpoint(gameItrObject)
 		toc = time.clock()
 		timeItr = toc - tic
 
 		print "Itr Deepening Search:"
 		print "Execution Time: " + str(timeItr)
 		print "Nodes Expanded: " + str(gameItrObject.nodesExpanded)
+		if args.ordering:
+			print "Move Ordering: " + args.ordering
+		printLimit(gameItrObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameItrObject.nodesPruned)
 		print "Trace: " + str(gameItrObject.trace) + '\n'
 
 
 	if not flag or flag == 2:
 		#Astar with first heuristic
-		tic = time.clock()
-		gameAOneObject = pegSolitaireUtils.game(args.input)
-		search.aStarOne(gameAOneObject)
-		toc = time.clock()
+		tic = clock()
+		gameAOneObject = newGame(args, store, allStats, "astar1", not args.workers)
+		if args.workers:
+			aStarParallel(gameAOneObject, search.heuristicOne, args)
+		else:
+			search.aStarOne(gameAOneObject, args.lifo, args.prune)
+			closeCheckpoint(gameAOneObject)
+		toc = clock()
 		timeAOne = toc - tic
 
 		print "Astar One Search:"
 		print "Execution Time: " + str(timeAOne)
 		print "Nodes Expanded: " + str(gameAOneObject.nodesExpanded)
+		printLimit(gameAOneObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameAOneObject.nodesPruned)
 		print "Trace: " + str(gameAOneObject.trace) + '\n'
 
 
 	if not flag or flag == 3:
 		#AStar with second Heuristic
-		tic = time.clock()
-		gameATwoObject = pegSolitaireUtils.game(args.input)
-		search.aStarTwo(gameATwoObject)
-		toc = time.clock()
+		tic = clock()
+		gameATwoObject = newGame(args, store, allStats, "astar2", not args.workers)
+		if args.workers:
+			aStarParallel(gameATwoObject, search.heuristicTwo, args)
+		else:
+			search.aStarTwo(gameATwoObject, args.lifo, args.prune)
+			closeCheckpoint(gameATwoObject)
+		toc = clock()
 		timeATwo = toc - tic
 
 		print "Astar Two Search:"
 		print "Execution Time: " + str(timeATwo)
 		print "Nodes Expanded: " + str(gameATwoObject.nodesExpanded)
+		printLimit(gameATwoObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameATwoObject.nodesPruned)
 		print "Trace: " + str(gameATwoObject.trace)
 
 
+	if flag == 4:
+		#Iterative deepening A* with a chosen heuristic
+		tic = time.clock()
+		gameIDAObject = newGame(args, store, allStats, "ida")
+		search.idaStar(gameIDAObject, HEURISTICS[args.heuristic], args.table_size, args.prune)
+		toc = time.clock()
+		timeIDA = toc - tic
+
+		print "IDA* Search:"
+		print "Execution Time: " + str(timeIDA)
+		print "Nodes Expanded: " + str(gameIDAObject.nodesExpanded)
+		printLimit(gameIDAObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameIDAObject.nodesPruned)
+		print "Iterations: " + str(gameIDAObject.iterations)
+		print "Thresholds: " + str(gameIDAObject.thresholds)
+		print "Trace: " + str(gameIDAObject.trace)
+
+	if flag == 5:
+		#Retrograde database lookups
+		tic = time.clock()
+		gameDBObject = newGame(args, store, allStats, "database")
+		database = retrograde.solvabilityDatabase(args.database)
+		search.DatabaseSearch(gameDBObject, database)
+		database.close()
+		toc = time.clock()
+		timeDB = toc - tic
+
+		print "Database Search:"
+		print "Execution Time: " + str(timeDB)
+		print "Nodes Expanded: " + str(gameDBObject.nodesExpanded)
+		printLimit(gameDBObject)
+		print "Trace: " + str(gameDBObject.trace)
+
+	if flag == 6:
+		#Bidirectional breadth-first search
+		tic = time.clock()
+		gameBiObject = newGame(args, store, allStats, "bidirectional")
+		memoryCap = args.memory_cap << 20 if args.memory_cap else None
+		search.BidirectionalSearch(gameBiObject, memoryCap, args.prune)
+		toc = time.clock()
+		timeBi = toc - tic
+
+		print "Bidirectional Search:"
+		print "Execution Time: " + str(timeBi)
+		print "Nodes Expanded: " + str(gameBiObject.nodesExpanded)
+		printLimit(gameBiObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameBiObject.nodesPruned)
+		print "Forward: %d nodes, depth %d" % (gameBiObject.forwardExpanded, gameBiObject.forwardDepth)
+		print "Backward: %d nodes, depth %d" % (gameBiObject.backwardExpanded, gameBiObject.backwardDepth)
+		print "Peak Frontier: " + str(gameBiObject.peakFrontier)
+		print "Trace: " + str(gameBiObject.trace)
+
+	if flag == 7:
+		#A* expanding batches of nodes with NumPy
+		try:
+			import vectorized
+		except ImportError:
+			sys.exit("Batched A* (flag 7) needs NumPy")
+		tic = time.clock()
+		gameBatchObject = newGame(args, store, allStats, "batched")
+		vectorized.BatchedAStarSearch(gameBatchObject, HEURISTICS[args.heuristic],
+			args.batch_size, args.prune)
+		toc = time.clock()
+		timeBatch = toc - tic
+
+		print "Batched A* Search:"
+		print "Execution Time: " + str(timeBatch)
+		print "Nodes Expanded: " + str(gameBatchObject.nodesExpanded)
+		printLimit(gameBatchObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameBatchObject.nodesPruned)
+		print "Peak Frontier: " + str(gameBatchObject.peakFrontier)
+		print "Trace: " + str(gameBatchObject.trace)
+
+	if flag == 8:
+		#Weighted A* with a chosen heuristic
+		tic = time.clock()
+		gameWeightedObject = newGame(args, store, allStats, "weighted")
+		search.weightedAStar(gameWeightedObject, HEURISTICS[args.heuristic], args.weight,
+			args.lifo, args.prune)
+		toc = time.clock()
+		timeWeighted = toc - tic
+
+		print "Weighted A* Search:"
+		print "Execution Time: " + str(timeWeighted)
+		print "Nodes Expanded: " + str(gameWeightedObject.nodesExpanded)
+		printLimit(gameWeightedObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameWeightedObject.nodesPruned)
+		print "Peak Frontier: " + str(gameWeightedObject.peakFrontier)
+		print "Trace: " + str(gameWeightedObject.trace)
+
+	if flag == 9:
+		#Beam search with a chosen heuristic
+		tic = time.clock()
+		gameBeamObject = newGame(args, store, allStats, "beam")
+		search.BeamSearch(gameBeamObject, HEURISTICS[args.heuristic], args.beam_width,
+			args.beam_widen, args.max_beam_width, args.prune)
+		toc = time.clock()
+		timeBeam = toc - tic
+
+		print "Beam Search:"
+		print "Execution Time: " + str(timeBeam)
+		print "Nodes Expanded: " + str(gameBeamObject.nodesExpanded)
+		printLimit(gameBeamObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gameBeamObject.nodesPruned)
+		print "Beam Width: " + str(gameBeamObject.beamWidth)
+		print "Peak Frontier: " + str(gameBeamObject.peakFrontier)
+		print "Trace: " + str(gameBeamObject.trace)
+
+	if flag == 10:
+		#Counting every solution
+		tic = time.clock()
+		gameCountObject = newGame(args, store, allStats, "count")
+		counter = counting.countSolutions(gameCountObject, counting.solutionCounter(args.memo_size))
+		toc = time.clock()
+		timeCount = toc - tic
+
+		print "Solution Counting:"
+		print "Execution Time: " + str(timeCount)
+		print "Nodes Expanded: " + str(gameCountObject.nodesExpanded)
+		printLimit(gameCountObject)
+		print "Solutions: " + str(gameCountObject.solutionCount)
+		print "Memo Entries: %d (%d evicted)" % (len(counter), counter.evicted)
+		print "First Moves:"
+		for (trace, count) in gameCountObject.firstMoves:
+			print "  %s -> %s: %d" % (trace[0], trace[1], count)
+		if args.list_solutions and gameCountObject.limitReason is None:
+			print "Solutions Listed:"
+			for trace in itertools.islice(counting.solutionTraces(gameCountObject, counter),
+					args.list_solutions):
+				print "  " + str(trace)
+		print "Trace: " + str(gameCountObject.trace)
+
+	if flag == 11:
+		#A* with the pattern database heuristic
+		tic = clock()
+		gamePatternObject = newGame(args, store, allStats, "patterns", not args.workers)
+		database = patterns.patternDatabase(args.patterns)
+		if args.workers:
+			aStarParallel(gamePatternObject, database.heuristic(), args)
+		else:
+			if search.UniformCostSearch(gamePatternObject, database.heuristic(), args.lifo,
+					args.prune) is search.FAILURE:
+				search.recordFailure(gamePatternObject)
+			closeCheckpoint(gamePatternObject)
+		database.close()
+		toc = clock()
+		timePattern = toc - tic
+
+		print "Pattern A* Search:"
+		print "Execution Time: " + str(timePattern)
+		print "Nodes Expanded: " + str(gamePatternObject.nodesExpanded)
+		printLimit(gamePatternObject)
+		if args.prune:
+			print "Nodes Pruned: " + str(gamePatternObject.nodesPruned)
+		print "Trace: " + str(gamePatternObject.trace)
+
+	if store is not None:
+		store.close()
+	if args.stats:
+		dumpStats(allStats, args.stats)
+
+
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description="HomeWork One")
 	parser.add_argument("--input", type=str)
 	parser.add_argument("--flag", type=int)
+	parser.add_argument("--bitboard", action="store_true",
+		help="search with packed bitboard nodes")
+	parser.add_argument("--parent-map", action="store_true",
+		help="recover the trace from a map of symmetric keys instead of parent nodes")
+	parser.add_argument("--lifo", action="store_true",
+		help="break A* ties in last-in, first-out order instead of first-in, first-out")
+	parser.add_argument("--prune", action="store_true",
+		help="reject unsolvable nodes by pagoda functions and position class")
+	parser.add_argument("--recursive", action="store_true",
+		help="use recursive depth-limited searches for IDDFS (flag 1)")
+	parser.add_argument("--ordering", choices=sorted(ordering.ORDERINGS),
+		help="order the moves of IDDFS (flag 1) instead of trying them in row-major order")
+	parser.add_argument("--workers", type=int,
+		help="split A* (flags 2, 3, and 11) across this many worker processes")
+	parser.add_argument("--compact-sets", action="store_true",
+		help="keep sets of keys in compact open-addressing tables instead of Python sets")
+	parser.add_argument("--set-directory", type=str,
+		help="memory-map compact sets in files in this directory (implies --compact-sets)")
+	parser.add_argument("--store", type=str,
+		help="consult and add to a persistent store of solved states in this file")
+	parser.add_argument("--store-size", type=int, default=persistence.DEFAULT_SIZE >> 20,
+		help="size in MiB of a new store file")
+	parser.add_argument("--database", type=str,
+		help="directory of a retrograde database built by retrograde.py (flag 5)")
+	parser.add_argument("--patterns", type=str,
+		help="pattern database file built by patterns.py, for A* (flag 11)")
+	parser.add_argument("--memory-cap", type=int,
+		help="memory in MiB for the layers of bidirectional search (flag 6)")
+	parser.add_argument("--heuristic", choices=sorted(HEURISTICS), default="two",
+		help="heuristic for IDA* (flag 4), batched A* (flag 7, one or two only), "
+		"weighted A* (flag 8), or beam search (flag 9)")
+	parser.add_argument("--weight", type=float, default=2,
+		help="weight of the heuristic in weighted A* (flag 8)")
+	parser.add_argument("--beam-width", type=int, default=1000,
+		help="nodes kept per layer in beam search (flag 9)")
+	parser.add_argument("--beam-widen", type=float, metavar="FACTOR",
+		help="restart a failed beam search with its width multiplied by FACTOR")
+	parser.add_argument("--max-beam-width", type=int,
+		help="width beyond which a failed beam search does not restart")
+	parser.add_argument("--memo-size", type=int, metavar="ENTRIES",
+		help="most counts to memoize when counting solutions (flag 10), evicting the oldest")
+	parser.add_argument("--list-solutions", type=int, metavar="N",
+		help="print the traces of the first N solutions counted (flag 10)")
+	parser.add_argument("--batch-size", type=int, default=4096,
+		help="most nodes to expand at once in batched A* (flag 7)")
+	parser.add_argument("--table-size", type=int, default=1 << 20,
+		help="transposition table slots for IDA* (flag 4)")
+	parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+		help="stop each search after this long and print its best partial trace")
+	parser.add_argument("--node-limit", type=int,
+		help="stop each search after expanding this many nodes")
+	parser.add_argument("--memory-limit", type=int, metavar="MIB",
+		help="stop each search once the process uses this much resident memory")
+	parser.add_argument("--interruptible", action="store_true",
+		help="stop the search in progress on SIGINT or SIGTERM and print its best partial trace")
+	parser.add_argument("--checkpoint", type=str, metavar="PREFIX",
+		help="save the progress of IDDFS and A* (flags 1-3 and 11) to PREFIX.<search> files, "
+		"and resume from them if they exist")
+	parser.add_argument("--checkpoint-interval", type=float, default=60, metavar="SECONDS",
+		help="time between checkpoints (default: 60)")
+	parser.add_argument("--stats", type=str, metavar="FILE",
+		help="write counters, depth histograms, and samples of each search as JSON (- for stdout)")
+	parser.add_argument("--profile", type=str, nargs='?', const="-", metavar="FILE",
+		help="profile the run, and print the top functions or save the profile to FILE")
 	args = parser.parse_args()
-	main(args)
-	#import cProfile
-	#cProfile.run('main(args)', sort='tottime')
+	if args.weight < 0:
+		parser.error("--weight must not be negative")
+	if args.beam_width < 1 or args.max_beam_width is not None and args.max_beam_width < 1:
+		parser.error("--beam-width and --max-beam-width must be at least 1")
+	if args.beam_widen is not None and args.beam_widen <= 1:
+		parser.error("--beam-widen must be greater than 1")
+	if args.flag == 5 and args.database is None:
+		parser.error("--flag 5 needs --database")
+	if args.flag == 11 and args.patterns is None:
+		parser.error("--flag 11 needs --patterns")
+	# A board that a chosen search cannot handle ends the run with the reason
+	try:
+		if args.profile:
+			profile = cProfile.Profile()
+			profile.runcall(main, args)
+			if args.profile == "-":
+				pstats.Stats(profile).sort_stats('tottime').print_stats(30)
+			else:
+				profile.dump_stats(args.profile)
+		else:
+			main(args)
+	except ValueError as e:
+		sys.exit(str(e))
@@ -1,4 +1,5 @@
 import readGame
+import bitboard
 
 
 # We separated the given game class into two classes, game and gameNode.
@@ -10,6 +11,14 @@ import readGame
 # associated game object). It implements all the required methods as well as
 # its own helper methods. Note that while gameNode uses a 1D list to store
 # its game state, the game class's gameState is unmodified.
+# The bitNode class is a drop-in replacement for gameNode that packs its game
+# state into an integer (see the bitboard module); a game created with
+# bitboard=True searches with bitNodes instead.
+# Nodes do not store their own move traces; each one only refers to its parent
+# node and the jump that created it, and the trace is rebuilt when a solution
+# is found. A game created with parentMap=True does not even keep parent
+# nodes, but maps the symmetric key of each new node to its parent's key, and
+# replays the keys from the root node to recover the trace.
 class game(object):
 	"""
 	Stores the global state for a single game of Peg Solitaire.
@@ -19,21 +28,138 @@ class game(object):
 	set to a list of old and new positions for pegs that will solve the game.
 	"""
 
-	def __init__(self, filePath):
-		"""Initialize a game from a text file."""
-		self.gameState = readGame.readGameState(filePath)
+	def __init__(self, filePath, bitboard=False, parentMap=False, store=None,
+			compactSets=False, setDirectory=None, stats=None, budget=None,
+			checkpoint=None, gameState=None):
+		"""
+		Initialize a game from a text file. If bitboard is True, the game tree
+		is searched with bitNodes instead of gameNodes. If parentMap is True,
+		nodes do not refer to their parents, and the solution's trace is
+		recovered from a map of symmetric keys instead. A store, if given, is a
+		persistence.stateStore that searches consult and add to, unless the
+		board has walls inside the plus shape. If compactSets is True, searches
+		keep their sets of keys in keyset.keySets instead of Python sets,
+		memory-mapped in setDirectory if it is given.
+		If stats is an instrument.searchStats, searches count their events in it.
+		If budget is a budget.searchBudget, searches stop when it is exceeded.
+		If checkpoint is a checkpoint.checkpointFile, searches that support it
+		save their progress to it, and resume from any progress already saved.
+		If gameState is given, as a 2D list like readGame.readGameState
+		returns, it is used instead of reading filePath.
+		"""
+		if gameState is None:
+			gameState = readGame.readGameState(filePath)
+		self.gameState = gameState
+		# bitNodes cannot tell a wall inside the plus shape from a hole
+		if bitboard and self.walls:
+			raise ValueError("A board with walls inside the plus shape cannot be searched with bitboards")
 		self.nodesExpanded = 0
+		# Counts nodes rejected by pruning without being searched
+		self.nodesPruned = 0
+		# Set by searches that keep a frontier to its peak size
+		self.peakFrontier = 0
 		self.trace = []
+		self.bitboard = bitboard
+		self.parentMap = {} if parentMap else None
+		# Cleared by a search that maps only the keys it keeps to their
+		# parents' keys, instead of every child that getNextState creates
+		self.mapChildren = True
+		# A store's keys are of states on the plain board, where a wall would
+		# be a hole, so a board with walls does not share it
+		self.store = None if self.walls else store
+		self.compactSets = compactSets
+		self.setDirectory = setDirectory
+		self.stats = stats
+		self.budget = budget
+		self.checkpoint = checkpoint
+		# Set by a search that exceeded the budget, to the reason why and the
+		# number of pegs left by its partial trace
+		self.limitReason = None
+		self.bestPegs = None
 
 	def __str__(self):
 		"""Return a printable string representation of the game."""
 		return ','.join(''.join('0X-'[t] for t in row) for row in self.gameState)
 
-	def rootNode(self, heuristic=id):
-		"""Return a root node of the game tree for this game."""
+	@property
+	def walls(self):
+		"""
+		The bitboard of the holes of the plus-shaped board that this game's
+		board does not have (see bitboard.packWalls), 0 for the usual board.
+		"""
+		return bitboard.packWalls(sum(self.gameState, []))
+
+	def rootNode(self, heuristic=None):
+		"""
+		Return a root node of the game tree for this game. A heuristic, if
+		given, must follow the interface described in the search module.
+		"""
 		# gameNode uses a flat list, not a 2D list of lists, for efficiency
 		rootState = sum(self.gameState, [])
-		return gameNode(rootState, self.trace, rootState.count(1), heuristic)
+		if self.bitboard:
+			return bitNode(bitboard.pack(rootState), None, None, rootState.count(1), heuristic)
+		return gameNode(rootState, None, None, rootState.count(1), heuristic)
+
+	def nodeFromBits(self, bits, heuristic=None):
+		"""
+		Return a node with the given bitboard and no parent, of the same kind
+		as rootNode returns, such as for resuming a search from a checkpoint.
+		"""
+		if self.bitboard:
+			return bitNode(bits, None, None, bitboard.popCount(bits), heuristic)
+		walls = self.walls
+		return gameNode(bitboard.unpack(bits, walls), None, None, bitboard.popCount(bits), heuristic, walls=walls)
+
+	def replay(self, key):
+		"""
+		Return a node with the given symmetric key, and with parent nodes all
+		the way back to the root node, by following parentMap back from the key
+		and then replaying the path forward with replayKeys.
+		"""
+		parentMap = self.parentMap
+		keys = []
+		while key in parentMap:
+			keys.append(key)
+			key = parentMap[key]
+		keys.reverse()
+		return replayKeys(self.rootNode(), keys)
+
+
+def replayKeys(node, keys):
+	"""
+	Return the node reached from a node by children with each of a list of
+	symmetric keys in turn, each referring to the one before. Each step tries
+	every valid jump (including ones that validMoves prunes by symmetry)
+	until one leads to the next key, without counting any nodes as expanded,
+	and raises KeyError if none does.
+	"""
+	for key in keys:
+		for (jump, (oldPos, direction, _, _, _)) in enumerate(bitboard.JUMPS):
+			if node.is_validMove(oldPos, direction):
+				child = node.child(jump, node)
+				if child.key == key:
+					break
+		else:
+			raise KeyError(key)
+		node = child
+	return node
+
+
+def nodeTrace(node):
+	"""
+	Return the trace of a game node: a list of old and new positions, as
+	(row, column) pairs, for the moves from the root node to this one.
+	"""
+	moves = []
+	while node.parent is not None:
+		(oldPos, direction, _, _, _) = bitboard.JUMPS[node.jump]
+		newPos = oldPos + 2 * direction
+		# Convert positions back into pairs for printing
+		moves.append((newPos // 7, newPos % 7))
+		moves.append((oldPos // 7, oldPos % 7))
+		node = node.parent
+	moves.reverse()
+	return moves
 
 
 class gameNode(object):
@@ -44,6 +170,11 @@ class gameNode(object):
 	created, it increments the game's nodesExpanded counter.
 	"""
 
+	# Search functions may keep millions of nodes alive, so __slots__ saves
+	# the memory of a __dict__ for each one
+	__slots__ = ('state', 'parent', 'jump', 'pegCount', 'heuristic', 'h',
+		'images', 'key', 'vsym', 'hsym', 'walls')
+
 	# We do not use this method. Instead of writing something like:
 	#     self.state[pos] if self.is_corner(pos) else -1
 	# We implemented __getitem__ with a bounds check so we can write:
@@ -69,23 +200,50 @@ class gameNode(object):
 		# If direction is 1 or -1 (changing columns), the row should not change
 			newPos // 7 == oldPos // 7 else -1)
 
-	def __init__(self, state, trace, pegCount, heuristic=id):
-		"""Initialize the game node."""
+	def __init__(self, state, parent, jump, pegCount, heuristic=None, images=None, h=None, walls=None):
+		"""
+		Initialize the game node. The parent node and the index of the jump in
+		bitboard.JUMPS that created this node are None for the root node (or
+		for any node when the game uses a parentMap). The eight symmetric images
+		of the state, the heuristic value, and the bitboard of the board's
+		walls (see bitboard.packWalls) are passed down from the parent node if
+		possible, or else computed in full.
+		"""
 		self.state = state
-		self.trace = trace
+		# Referring to the parent instead of copying its trace plus one move
+		# makes each node take constant time and memory instead of O(depth)
+		self.parent = parent
+		self.jump = jump
 		# The peg count is cached so that validMoves can return early if only
 		# one peg is left
 		self.pegCount = pegCount
-		# The heuristic being used, if any, is stored so that __cmp__ can use it
+		# The heuristic being used, if any, is stored so that child nodes can
+		# update its value
 		self.heuristic = heuristic
-		# The representative one of eight symmetric states is cached because
-		# recalculating it is relatively expensive
+		# Walls inside the plus shape limit which symmetric states are
+		# equivalent, so they are kept for symmetricState
+		if walls is None:
+			walls = bitboard.packWalls(state)
+		self.walls = walls
+		# The symmetric images are kept so that each child can update them for
+		# the three positions its move changed instead of rebuilding them
+		if images is None:
+			images = bitboard.symmetricImages(bitboard.pack(state))
+		self.images = images
+		# The representative one of eight symmetric states is cached
 		self.key = self.symmetricState()
+		# The heuristic value is cached so that it is computed once per node
+		if h is None and heuristic is not None:
+			h = heuristic(self)
+		self.h = h
 
 	def __str__(self):
 		"""Return a printable string representation of the game state."""
 		return ','.join(''.join('0X-'[t] for t in self.state[i*7:i*7+7]) for i in xrange(7))
 
+	# The trace is only needed for a solution, so it is rebuilt on demand
+	trace = property(nodeTrace)
+
 	def __getitem__(self, pos):
 		"""node[pos] is bounds-checked shorthand for node.state[pos]."""
 		return self.state[pos] if 0 <= pos < 49 else -1
@@ -96,12 +254,11 @@ class gameNode(object):
 		Nodes have to be comparable by their estimated cost for informed
 		searches to prioritize the lower-cost nodes. Cost may incorporate a
 		heuristic function as well as a distance estimate.
-		The default heuristic is the id function, so that comparisons without
-		a heuristic act like default Python comparisons.
+		Nodes without a heuristic are compared like default Python objects.
 		"""
-		# Store heuristic locally to avoid repeated LOAD_ATTR instructions
-		heuristic = self.heuristic
-		return heuristic(self) - heuristic(other)
+		if self.heuristic is None:
+			return cmp(id(self), id(other))
+		return self.h - other.h
 
 	def is_solved(self):
 		"""Return whether the game node is in a solved state (one central peg)."""
@@ -177,66 +334,241 @@ class gameNode(object):
 		# eg: remove crossed over pegs by replacing it's
 		# position in gameState by 0
 		# and updating new peg position as 1
-		midPos = self.getNextPosition(oldPos, direction)
-		newPos = self.getNextPosition(midPos, direction)
+		jump = bitboard.JUMP_INDEX[oldPos, direction]
+		parentMap = pegSol.parentMap
+		if parentMap is None:
+			return self.child(jump, self)
+		childNode = self.child(jump, None)
+		if pegSol.mapChildren:
+			parentMap.setdefault(childNode.key, self.key)
+		return childNode
+
+	def child(self, jump, parent):
+		"""
+		Return a child node of the current one, created by the valid move with
+		the given index in bitboard.JUMPS, and referring to the given parent.
+		Unlike getNextState, this does not count the node as expanded.
+		"""
+		(oldPos, direction, _, _, _) = bitboard.JUMPS[jump]
+		midPos = oldPos + direction
+		newPos = midPos + direction
 		# x[:] makes a copy of x (necessary to avoid mutating self.state
 		# when updating childState)
 		childState = self.state[:]
 		childState[oldPos] = 0 # The peg moves from here, leaving a hole
 		childState[midPos] = 0 # The jumped-over peg is removed
 		childState[newPos] = 1 # The peg moves to this hole
-		# Convert positions back into pairs for printing
-		childTrace = self.trace + [(oldPos // 7, oldPos % 7), (newPos // 7, newPos % 7)]
-		return gameNode(childState, childTrace, self.pegCount - 1, self.heuristic)
+		childImages = bitboard.jumpImages(self.images, jump)
+		# The heuristic's delta function updates the value for the three
+		# positions that the move changed
+		heuristic = self.heuristic
+		h = None if heuristic is None else self.h + heuristic.delta(self, jump)
+		return gameNode(childState, parent, jump, self.pegCount - 1, heuristic, childImages, h, self.walls)
 
 	def copySolution(self, pegSol):
 		"""
 		Copy a found solution to the given game by copying the solved game
 		state and found move trace to it.
 		"""
+		# Without parent nodes, the trace has to be replayed from the root
+		# (which must happen before the game state is replaced); a search
+		# may still link the nodes of a solution it found some other way
+		node = self if self.parent is not None or pegSol.parentMap is None else pegSol.replay(self.key)
+		pegSol.trace = node.trace
+		if pegSol.store is not None:
+			pegSol.store.putSolution(node)
 		# Convert the game state back into a 2D list
 		pegSol.gameState = [self.state[i*7:i*7+7] for i in xrange(7)]
-		pegSol.trace = self.trace
 
-	# Store tuple, zip, and xrange locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
-	def symmetricState(self, tuple=tuple, zip=zip, xrange=xrange):
+	def symmetricState(self):
 		"""
 		Return a representative game state equivalent to this game state under
 		rotation and reflection. For any game state, there are seven other
-		symmetric ones; the minimum one of these, encoded with immutable tuples
-		instead of mutable lists so they can be hashed and stored in a set,
-		represents all eight.
-		"""
-		# Convert the game state into a 2D list of tuples
-		r0 = [tuple(self.state[i*7:i*7+7]) for i in xrange(7)]
-		# x[::-1] reverses x, or reflects a 2D list across the horizontal axis
-		# zip(*x[::-1]) rotates a 2D list 90 degrees clockwise
-		f0 = r0[::-1]
-		# Cache vertical symmetry to prune validMoves
-		self.vsym = r0 == f0
-		r90 = zip(*f0)
-		f90 = r90[::-1]
-		r180 = zip(*f90)
-		f180 = r180[::-1]
-		# Cache horizontal symmetry to prune validMoves
-		self.hsym = r0 == f180
-		r270 = zip(*f180)
-		f270 = r270[::-1]
-		return tuple(min(r0, f0, r90, f90, r180, f180, r270, f270))
-
-		# We also tried compressing states by treating holes and pegs as 0s and
-		# 1s in a 33-bit integer, but this approach was slower without usefully
-		# lowering memory usage. Even when an A* search expands 2 million nodes
-		# to solve a 32-peg game, the Python process using tuples takes up
-		# 100 MB RAM versus 20 MB when using integers, but runs 50% faster.
-		# Saving 80% of the memory is significant, but neither quantity is
-		# large compared to the gigabytes available on modern computers.
-		# To test this approach anyway, replace the "return" line with this:
-		# def binaryHash(state):
-		# 	hash = 0
-		# 	for row in state:
-		# 		for t in row:
-		# 			if t != -1:
-		# 				hash = (hash << 1) | pos
-		# 	return hash
-		# return binaryHash(min(r0, f0, r90, f90, r180, f180, r270, f270))
+		symmetric ones; the minimum one of these, encoded as a bitboard (see
+		the bitboard module) so it can be hashed and stored in a set,
+		represents all eight. On a board with walls inside the plus shape,
+		only the symmetries that agree on where the walls end up count (see
+		bitboard.wallSymmetries).
+		"""
+		images = self.images
+		if self.walls:
+			(keys, vflip, hflip) = bitboard.wallSymmetries(self.walls)
+			# A reflection that moves the walls cannot prune validMoves
+			self.vsym = vflip and images[bitboard.VFLIP] == images[0]
+			self.hsym = hflip and images[bitboard.HFLIP] == images[0]
+			return min([images[k] for k in keys])
+		# Cache vertical and horizontal symmetry to prune validMoves
+		self.vsym = images[bitboard.VFLIP] == images[0]
+		self.hsym = images[bitboard.HFLIP] == images[0]
+		return min(images)
+
+		# We used to build the eight symmetric states as 2D tuples with zip and
+		# slicing for every node, which was relatively expensive. We had also
+		# tried encoding them as 33-bit integers, but converting each one bit by
+		# bit was even slower. Now the images are looked up a byte at a time for
+		# the root node, and every child node updates its parent's images with
+		# one precomputed XOR mask each, which is faster than either approach
+		# and saves about 80% of the memory used by the explored sets.
+
+
+class bitNode(object):
+	"""
+	Stores a single node in the game tree of a game of Peg Solitaire, like
+	gameNode, but with the game state packed into a 33-bit integer. Finding
+	valid moves and creating child nodes only take a few bitwise operations
+	with the precomputed jump masks in the bitboard module.
+	"""
+
+	__slots__ = ('bits', 'parent', 'jump', 'pegCount', 'heuristic', 'h',
+		'images', 'key', 'vsym', 'hsym')
+
+	def __init__(self, bits, parent, jump, pegCount, heuristic=None, images=None, h=None):
+		"""Initialize the game node. See gameNode.__init__."""
+		self.bits = bits
+		self.parent = parent
+		self.jump = jump
+		# The peg count is cached so that validMoves can return early if only
+		# one peg is left
+		self.pegCount = pegCount
+		# The heuristic being used, if any, is stored so that child nodes can
+		# update its value
+		self.heuristic = heuristic
+		if images is None:
+			images = bitboard.symmetricImages(bits)
+		self.images = images
+		# The representative one of eight symmetric states is cached
+		self.key = self.symmetricState()
+		# The heuristic value is cached so that it is computed once per node
+		if h is None and heuristic is not None:
+			h = heuristic(self)
+		self.h = h
+
+	def __str__(self):
+		"""Return a printable string representation of the game state."""
+		state = self.state
+		return ','.join(''.join('0X-'[t] for t in state[i*7:i*7+7]) for i in xrange(7))
+
+	# The trace is only needed for a solution, so it is rebuilt on demand
+	trace = property(nodeTrace)
+
+	def __getitem__(self, pos, MASKS=bitboard.MASKS):
+		"""node[pos] is bounds-checked shorthand for node.state[pos]."""
+		if not 0 <= pos < 49:
+			return -1
+		mask = MASKS[pos]
+		if not mask:
+			return -1
+		return 1 if self.bits & mask else 0
+
+	@property
+	def state(self):
+		"""
+		The game state as a flat list of 49 positions, for compatibility with
+		functions written for gameNode (such as the heuristics).
+		"""
+		return bitboard.unpack(self.bits)
+
+	def __cmp__(self, other):
+		"""
+		Return the comparison of this node with another one (1, 0, or -1).
+		See gameNode.__cmp__.
+		"""
+		if self.heuristic is None:
+			return cmp(id(self), id(other))
+		return self.h - other.h
+
+	def is_solved(self):
+		"""Return whether the game node is in a solved state (one central peg)."""
+		return self.bits == bitboard.CENTER
+
+	def is_validMove(self, oldPos, direction):
+		"""
+		Return whether it is valid to move a peg from a given position in a
+		given direction. The position must have a peg, the destination must be
+		empty, and the intermediate position must have another peg.
+		"""
+		jump = bitboard.JUMP_INDEX.get((oldPos, direction))
+		if jump is None:
+			return False
+		(_, _, fromMask, overMask, toMask) = bitboard.JUMPS[jump]
+		bits = self.bits
+		return bool(bits & fromMask and bits & overMask and not bits & toMask)
+
+	# Store JUMPS_FROM locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+	def validMoves(self, JUMPS_FROM=bitboard.JUMPS_FROM):
+		"""
+		Generate all the valid moves from the current game state, in the same
+		order as gameNode.validMoves.
+		"""
+		if self.pegCount <= 1:
+			raise StopIteration
+		bits = self.bits
+		vsym = self.vsym
+		hsym = self.hsym
+		pegs = bits
+		while pegs:
+			# x & -x isolates the lowest set bit of x, so pegs are visited in
+			# row-major order
+			peg = pegs & -pegs
+			pegs ^= peg
+			for (oldPos, direction, _, overMask, toMask) in JUMPS_FROM[peg.bit_length() - 1]:
+				# Valid moves jump over a peg to a hole
+				if not bits & overMask or bits & toMask: continue
+				# Moves north or west are redundant if the state is vertically or
+				# horizontally symmetric
+				if direction == -7 and vsym or direction == -1 and hsym: continue
+				yield (oldPos, direction)
+
+	def getNextState(self, oldPos, direction, pegSol):
+		"""
+		Return a child node of the current one, created by a given valid move.
+		The given game has its count of expanded nodes incremented.
+		"""
+		pegSol.nodesExpanded += 1
+		if not self.is_validMove(oldPos, direction):
+			print "Error, You are not checking for valid move"
+			exit(0)
+		jump = bitboard.JUMP_INDEX[oldPos, direction]
+		parentMap = pegSol.parentMap
+		if parentMap is None:
+			return self.child(jump, self)
+		childNode = self.child(jump, None)
+		if pegSol.mapChildren:
+			parentMap.setdefault(childNode.key, self.key)
+		return childNode
+
+	def child(self, jump, parent):
+		"""
+		Return a child node of the current one. See gameNode.child.
+		"""
+		(_, _, fromMask, overMask, toMask) = bitboard.JUMPS[jump]
+		# Flipping the three bits removes the moved and jumped-over pegs and
+		# fills the destination hole
+		childBits = self.bits ^ (fromMask | overMask | toMask)
+		childImages = bitboard.jumpImages(self.images, jump)
+		heuristic = self.heuristic
+		h = None if heuristic is None else self.h + heuristic.delta(self, jump)
+		return bitNode(childBits, parent, jump, self.pegCount - 1, heuristic, childImages, h)
+
+	def copySolution(self, pegSol):
+		"""
+		Copy a found solution to the given game by copying the solved game
+		state and found move trace to it.
+		"""
+		node = self if self.parent is not None or pegSol.parentMap is None else pegSol.replay(self.key)
+		pegSol.trace = node.trace
+		if pegSol.store is not None:
+			pegSol.store.putSolution(node)
+		state = self.state
+		pegSol.gameState = [state[i*7:i*7+7] for i in xrange(7)]
+
+	def symmetricState(self):
+		"""
+		Return a representative game state equivalent to this game state under
+		rotation and reflection: the minimum of the eight symmetric bitboards.
+		"""
+		images = self.images
+		# Cache vertical and horizontal symmetry to prune validMoves
+		self.vsym = images[bitboard.VFLIP] == images[0]
+		self.hsym = images[bitboard.HFLIP] == images[0]
+		return min(images)
@@ -1,13 +1,11 @@
 #!/bin/bash
 
-OUTFILE="perf.txt"
+# Benchmark every algorithm on every board, with a timeout per board (which
+# covers gcentral.txt under IDDFS), and compare with a baseline if one is
+# given as the first argument. See benchmark.py --help for more options.
 
-echo Testing performance > $OUTFILE
-
-for board in boards/g*.txt; do
-	# gcentral.txt would take too long for IDDFS, so test it manually
-	if [[ $board == *gcentral.txt ]]; then continue; fi
-	echo $board >> $OUTFILE
-	echo $(fgrep -o X $board | wc -l) pegs >> $OUTFILE
-	python pegSolitaire.py --input $board --flag 0 >> $OUTFILE
-done
+if [[ -n $1 ]]; then
+	python benchmark.py boards --tsv perf.txt --baseline "$1"
+else
+	python benchmark.py boards --tsv perf.txt
+fi
@@ -0,0 +1,181 @@
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import bitboard
+
+
+# Searches can share what they learn across runs through a stateStore: a
+# memory-mapped file recording whether symmetric keys are solvable, and the
+# best next move from each solvable one. All the boards in boards/ are reached
+# backward from the same solved state, so they share many positions.
+# The file is a fixed-size hash table of 8-byte slots after a 16-byte header
+# (the MAGIC string and the number of slots). A slot packs, from low to high
+# bits, a 33-bit key, a 2-bit status, a 7-bit jump index, and an 8-bit check
+# of the other fields; an all-zero slot is empty.
+# Moves are stored relative to the key's own orientation (the image of the
+# state that is the minimum one), so they apply to all eight symmetric states.
+# Only one process at a time may write to a file, enforced by an exclusive
+# flock; any others open it read-only. Slots are only ever filled, never
+# changed, and a reader that sees a slot in the middle of being written will
+# find its check wrong and treat it as empty.
+
+MAGIC = "PEGSTOR1"
+HEADER = struct.Struct("<8sQ")
+SLOT = struct.Struct("<Q")
+
+# Statuses of a key
+SOLVABLE = 1
+UNSOLVABLE = 2
+
+# The jump index stored for a solved state, which has no next move
+NO_MOVE = 127
+
+# Slots to look through from a key's hash before giving up, so a full table
+# drops new entries instead of slowing down
+PROBES = 16
+
+# The default file size in bytes, if a new file is created
+DEFAULT_SIZE = 64 << 20
+
+KEY_BITS = 33
+KEY_MASK = (1 << KEY_BITS) - 1
+
+
+def _check(fields):
+	"""Return the 8-bit check of the 42 bits of packed key, status, and move."""
+	return ((fields * 0x9E3779B97F4A7C15) >> 56) & 255
+
+
+class stateStore(object):
+	"""
+	A persistent, memory-mapped table from symmetric keys of game nodes to
+	whether they are solvable, and if so, the best next move. Stores are
+	opened for writing if possible, and otherwise (or if writable is False)
+	read-only.
+	"""
+
+	def __init__(self, path, size=DEFAULT_SIZE, writable=True):
+		"""
+		Open a store file, creating it with the given size in bytes (rounded
+		down to a power of two slots) if it does not exist. An existing file
+		keeps the size it was created with, which caps its growth.
+		"""
+		self.path = path
+		self.hits = 0
+		self.stores = 0
+		# Counts entries that could not be stored because their slots were full
+		self.dropped = 0
+		if writable and not os.path.exists(path):
+			slots = 1
+			while slots * 2 * SLOT.size + HEADER.size <= size:
+				slots *= 2
+			with open(path, 'wb') as fileHandle:
+				fileHandle.write(HEADER.pack(MAGIC, slots))
+				fileHandle.truncate(HEADER.size + slots * SLOT.size)
+		self.file = open(path, 'r+b' if writable else 'rb')
+		header = self.file.read(HEADER.size)
+		if len(header) == HEADER.size:
+			(magic, slots) = HEADER.unpack(header)
+		if (len(header) != HEADER.size or magic != MAGIC or
+			HEADER.size + slots * SLOT.size != os.fstat(self.file.fileno()).st_size):
+			self.file.close()
+			raise ValueError("Not a state store file: " + path)
+		self.mask = slots - 1
+		self.writable = False
+		if writable:
+			try:
+				fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+				self.writable = True
+			except IOError as e:
+				if e.errno not in (errno.EAGAIN, errno.EACCES):
+					raise
+		access = mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+		self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+
+	def __len__(self):
+		"""Return the number of slots in the store."""
+		return self.mask + 1
+
+	def close(self):
+		"""Write any changes to disk, and release the file and its lock."""
+		if self.writable:
+			self.map.flush()
+		self.map.close()
+		self.file.close()
+
+	def slot(self, key):
+		"""Return the first slot that a key hashes to."""
+		return ((key * 0x9E3779B97F4A7C15) >> 17) & self.mask
+
+	def get(self, key):
+		"""
+		Return a tuple of (status, move) stored for a key, where move is the
+		index in bitboard.JUMPS of a jump relative to the key's orientation, or
+		None if it is not stored.
+		"""
+		i = self.slot(key)
+		mask = self.mask
+		m = self.map
+		for _ in xrange(PROBES):
+			(value,) = SLOT.unpack_from(m, HEADER.size + i * SLOT.size)
+			if not value:
+				return None
+			fields = value & 0x3FFFFFFFFFF
+			if fields & KEY_MASK == key and value >> 42 == _check(fields):
+				self.hits += 1
+				return ((fields >> KEY_BITS) & 3, fields >> (KEY_BITS + 2))
+			i = (i + 1) & mask
+		return None
+
+	def put(self, key, status, move=NO_MOVE):
+		"""
+		Store the status of a key, and the index of its best next move relative
+		to its orientation, unless it is already stored. Nothing is stored if
+		the store is read-only or full around the key's slot.
+		"""
+		if not self.writable:
+			return
+		i = self.slot(key)
+		mask = self.mask
+		m = self.map
+		for _ in xrange(PROBES):
+			offset = HEADER.size + i * SLOT.size
+			(value,) = SLOT.unpack_from(m, offset)
+			if not value:
+				fields = key | status << KEY_BITS | move << (KEY_BITS + 2)
+				SLOT.pack_into(m, offset, fields | _check(fields) << 42)
+				self.stores += 1
+				return
+			if value & KEY_MASK == key:
+				return
+			i = (i + 1) & mask
+		self.dropped += 1
+
+	def isUnsolvable(self, key):
+		"""Return whether a key is stored as unsolvable."""
+		entry = self.get(key)
+		return entry is not None and entry[0] == UNSOLVABLE
+
+	def bestMove(self, images):
+		"""
+		Return the index in bitboard.JUMPS of the stored best move from a state
+		with the given symmetric images, or None if it is not stored as
+		solvable or is already solved.
+		"""
+		key = min(images)
+		entry = self.get(key)
+		if entry is None or entry[0] != SOLVABLE or entry[1] == NO_MOVE:
+			return None
+		k = images.index(key)
+		return bitboard.JUMP_SYMMETRIES[bitboard.INVERSE_SYMMETRIES[k]][entry[1]]
+
+	def putSolution(self, node):
+		"""Store every node on the path to a solved node as solvable, with its move."""
+		self.put(node.key, SOLVABLE)
+		while node.parent is not None:
+			images = node.parent.images
+			key = min(images)
+			self.put(key, SOLVABLE, bitboard.JUMP_SYMMETRIES[images.index(key)][node.jump])
+			node = node.parent
@@ -0,0 +1,170 @@
+import bitboard
+
+
+# Search functions can optionally reject game states that provably cannot be
+# solved, before pushing them to a frontier or recursing into them.
+# Two classical arguments are used:
+# - A pagoda function assigns a weight to each hole such that for every jump
+#   from A over B to C, weight(A) + weight(B) >= weight(C). Then the total
+#   weight of the pegs on the board can never increase, so a state whose total
+#   is less than that of the solved state (one central peg) is unsolvable.
+#   Resource counts are the special case of 0/1 weights: if the central hole
+#   has weight 1, at least one peg must always remain in the weighted holes.
+# - Conway's position classes: color the holes by (row + column) % 3 and by
+#   (row - column) % 3. Every jump flips the parity of the peg count in each
+#   of the three colors, so the parities of their pairwise sums never change.
+#   A game whose class differs from the solved state's can never be solved,
+#   and since moves preserve the class, only root nodes need to be checked.
+
+
+def _images(weights):
+	"""
+	Return the distinct images of a table of weights for the 49 positions
+	under the eight symmetries of the board. Since the solved state is
+	symmetric, each image of a pagoda function is also a useful one.
+	"""
+	images = []
+	for symmetry in bitboard.SYMMETRIES:
+		image = [0] * 49
+		for bit, pos in enumerate(bitboard.HOLES):
+			image[bitboard.HOLES[symmetry[bit]]] = weights[pos]
+		if image not in images:
+			images.append(image)
+	return images
+
+
+def isPagoda(weights):
+	"""Return whether a table of weights for the 49 positions is a pagoda function."""
+	return all(weights[oldPos] + weights[oldPos + direction] >= weights[oldPos + 2 * direction]
+		for (oldPos, direction, _, _, _) in bitboard.JUMPS)
+
+
+# Pagoda functions chosen by how many dead states they rejected among random
+# playouts of the boards in boards/. Both are symmetric under all eight
+# symmetries of the board.
+PAGODAS = [
+	[
+		 0,  0, -1,  0, -1,  0,  0,
+		 0,  0,  1,  1,  1,  0,  0,
+		-1,  1,  0,  1,  0,  1, -1,
+		 0,  1,  1,  2,  1,  1,  0,
+		-1,  1,  0,  1,  0,  1, -1,
+		 0,  0,  1,  1,  1,  0,  0,
+		 0,  0, -1,  0, -1,  0,  0,
+	],
+	[
+		 0,  0, -1,  1, -1,  0,  0,
+		 0,  0,  1,  0,  1,  0,  0,
+		-1,  1,  0,  1,  0,  1, -1,
+		 1,  0,  1,  1,  1,  0,  1,
+		-1,  1,  0,  1,  0,  1, -1,
+		 0,  0,  1,  0,  1,  0,  0,
+		 0,  0, -1,  1, -1,  0,  0,
+	],
+]
+
+# Resource counts (0/1 pagoda functions), chosen the same way, and used along
+# with all their images
+RESOURCES = [
+	[
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 0, 1, 0, 0, 0,
+		0, 0, 0, 0, 0, 0, 0,
+		0, 1, 0, 1, 0, 1, 0,
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 0, 1, 0, 0, 0,
+		0, 0, 0, 0, 0, 0, 0,
+	],
+	[
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 0, 1, 0, 0, 0,
+		0, 0, 0, 0, 0, 0, 0,
+		0, 1, 0, 1, 0, 1, 0,
+		0, 1, 0, 1, 0, 1, 0,
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 0, 1, 0, 0, 0,
+	],
+	[
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 1, 1, 1, 0, 0,
+		0, 0, 0, 0, 0, 0, 0,
+		1, 0, 1, 1, 1, 0, 1,
+		1, 0, 1, 1, 1, 0, 1,
+		0, 0, 0, 0, 0, 0, 0,
+		0, 0, 1, 1, 1, 0, 0,
+	],
+]
+
+
+def _pagodaTables(weights):
+	"""
+	Return byte-wise lookup tables for the total weight of the pegs on a
+	bitboard, like bitboard.SYMMETRY_TABLES.
+	"""
+	holes = bitboard.HOLES
+	tables = []
+	for shift in xrange(0, len(holes), 8):
+		size = 1 << min(8, len(holes) - shift)
+		tables.append([sum(weights[holes[shift + i]] for i in xrange(8) if value >> i & 1)
+			for value in xrange(size)])
+	return tables
+
+# Each pagoda function is stored as its lookup tables and the value of the
+# solved state, and each resource count as the mask of its holes
+PAGODA_TABLES = [(_pagodaTables(weights), weights[24])
+	for weights in PAGODAS if isPagoda(weights)]
+RESOURCE_MASKS = [sum(bitboard.MASKS[pos] for pos in xrange(49) if weights[pos])
+	for resource in RESOURCES if isPagoda(resource) for weights in _images(resource)]
+
+
+# Store PAGODA_TABLES and RESOURCE_MASKS locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def isDead(bits, PAGODA_TABLES=PAGODA_TABLES, RESOURCE_MASKS=RESOURCE_MASKS):
+	"""
+	Return whether a bitboard has a lower pagoda value than the solved state
+	for any of the pagoda functions or resource counts, which means it cannot
+	be solved.
+	"""
+	for mask in RESOURCE_MASKS:
+		if not bits & mask:
+			return True
+	b0 = bits & 255
+	b1 = (bits >> 8) & 255
+	b2 = (bits >> 16) & 255
+	b3 = (bits >> 24) & 255
+	b4 = bits >> 32
+	for ((t0, t1, t2, t3, t4), goal) in PAGODA_TABLES:
+		if t0[b0] + t1[b1] + t2[b2] + t3[b3] + t4[b4] < goal:
+			return True
+	return False
+
+
+def _colorMasks(color):
+	"""
+	Return the masks of the holes of each of three colors, given a function
+	that colors a row and column from 0 to 2.
+	"""
+	return [sum(bitboard.MASKS[pos] for pos in bitboard.HOLES if color(*divmod(pos, 7)) == k)
+		for k in xrange(3)]
+
+# The holes colored for position classes
+CLASS_MASKS = (_colorMasks(lambda row, col: (row + col) % 3) +
+	_colorMasks(lambda row, col: (row - col) % 3))
+
+
+def positionClass(bits):
+	"""
+	Return the position class of a bitboard, as a tuple of the parities of the
+	sums of peg counts in pairs of colors.
+	"""
+	(a0, a1, a2, b0, b1, b2) = [bitboard.popCount(bits & mask) & 1 for mask in CLASS_MASKS]
+	return (a0 ^ a1, a1 ^ a2, b0 ^ b1, b1 ^ b2)
+
+SOLVED_CLASS = positionClass(bitboard.CENTER)
+
+
+def isImpossible(bits):
+	"""
+	Return whether a bitboard for the root of a search cannot be solved,
+	because of its position class or its pagoda values.
+	"""
+	return positionClass(bits) != SOLVED_CLASS or isDead(bits)
@@ -8,20 +8,33 @@
 def readGameState(filePath):
 	#Reading file
 	fileHandle = open(filePath, 'r')
-	rawState = fileHandle.readline().strip().split(',')
+	line = fileHandle.readline()
+	fileHandle.close()
+	try:
+		return parseGameState(line)
+	except ValueError as e:
+		print e
+		exit(0)
+
+
+def parseGameState(line):
+	"""
+	Return the game state of one line in the comma-separated 7x7 format of a
+	board file, as a 2D list. Raise ValueError with the reason if the line is
+	not a valid board, so that a stream of boards can skip it.
+	"""
+	rawState = line.strip().split(',')
 	#updating game state with all 0
 	pegHolder = [[0 for x in range(7)] for x in range(7)]
-	
+
 	#check for dimension of given board
 	if len(rawState) != 7:
-		print "Wrong gameState given, check txt file"
-		exit(0)
+		raise ValueError("Wrong gameState given, check txt file")
 	else:
 		for i in range(7):
 			if len(rawState[i]) != 7:
-				print "Wrong gameState given, check txt file"
-				exit(0)
-	
+				raise ValueError("Wrong gameState given, check txt file")
+
 	#update peg and corner positions
 	for i in range(7):
 		for j in range(7):
@@ -30,9 +43,15 @@ def readGameState(filePath):
 			elif rawState[i][j] == 'X':
 				pegHolder[i][j] = 1
 			elif rawState[i][j] == '0':
-				pegHolder[i][j] == 0
+				pegHolder[i][j] = 0
 			else:
-				print "Invalid Charachter in game state, check txt file"
-				exit(0)
-	
+				raise ValueError("Invalid Charachter in game state, check txt file")
+
+	#check that the corners are off the board, since a node has no room for
+	#a peg or hole there (walls inside the plus shape are fine)
+	for i in (0, 1, 5, 6):
+		for j in (0, 1, 5, 6):
+			if pegHolder[i][j] != -1:
+				raise ValueError("Peg or hole outside the board at row %d, column %d, check txt file" % (i, j))
+
 	return pegHolder
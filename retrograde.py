@@ -0,0 +1,237 @@
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import bitboard
+
+
+# A retrograde database stores every game state that can be solved, built
+# backward from the solved state: the states with n + 1 pegs that can be
+# solved are exactly those that one jump turns into a solvable state with n
+# pegs. So each layer of states with one more peg is found by undoing every
+# possible jump in the previous layer.
+# Each layer is a file of the symmetric keys of its states, sorted and without
+# duplicates, packed as 5-byte big-endian integers so that comparing the bytes
+# compares the keys. Lookups are binary searches on the memory-mapped file.
+# Layers are built by external sorting so that no layer has to fit in memory:
+# keys are collected into sorted runs of a bounded size, written to temporary
+# files, and merged.
+
+KEY = struct.Struct(">BI")
+KEY_SIZE = KEY.size
+
+# Keys read from a file at a time
+READ_KEYS = 1 << 16
+
+
+def layerPath(directory, pegs):
+	"""Return the path of the layer file for a given number of pegs."""
+	return os.path.join(directory, "layer%02d.keys" % pegs)
+
+
+def packKey(key):
+	"""Return the 5-byte string for a key."""
+	return KEY.pack(key >> 32, key & 0xFFFFFFFF)
+
+
+def readKeys(path):
+	"""Generate the keys in a file, in order."""
+	unpack = KEY.unpack_from
+	with open(path, 'rb') as fileHandle:
+		while True:
+			data = fileHandle.read(READ_KEYS * KEY_SIZE)
+			if not data:
+				break
+			for offset in xrange(0, len(data), KEY_SIZE):
+				(high, low) = unpack(data, offset)
+				yield high << 32 | low
+
+
+def writeKeys(path, keys):
+	"""Write sorted keys to a file, skipping duplicates, and return how many were written."""
+	count = 0
+	previous = None
+	buffer = []
+	with open(path, 'wb') as fileHandle:
+		for key in keys:
+			if key == previous:
+				continue
+			previous = key
+			buffer.append(packKey(key))
+			count += 1
+			if len(buffer) >= READ_KEYS:
+				fileHandle.write(''.join(buffer))
+				buffer = []
+		fileHandle.write(''.join(buffer))
+	return count
+
+
+def _jumpsTo():
+	"""
+	Return a list of the jumps that end at each bit, as tuples of (flipMask,
+	emptyMask): the bits that undoing the jump flips, and the bits that must be
+	empty for it to be undone.
+	"""
+	jumpsTo = [[] for _ in bitboard.HOLES]
+	for (_, _, fromMask, overMask, toMask) in bitboard.JUMPS:
+		jumpsTo[toMask.bit_length() - 1].append((fromMask | overMask | toMask, fromMask | overMask))
+	return jumpsTo
+
+JUMPS_TO = _jumpsTo()
+
+
+# Store JUMPS_TO and symmetricImages locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def parentKeys(bits, JUMPS_TO=JUMPS_TO, symmetricImages=bitboard.symmetricImages, min=min):
+	"""Generate the symmetric keys of every state that one jump turns into a bitboard."""
+	pegs = bits
+	while pegs:
+		peg = pegs & -pegs
+		pegs ^= peg
+		for (flipMask, emptyMask) in JUMPS_TO[peg.bit_length() - 1]:
+			if not bits & emptyMask:
+				yield min(symmetricImages(bits ^ flipMask))
+
+
+def buildLayer(previousPath, path, runSize, tempDirectory=None):
+	"""
+	Build the layer file at path from the layer file with one fewer peg, by
+	undoing every jump, holding at most runSize keys in memory at once. Return
+	the number of keys in the new layer.
+	"""
+	runs = []
+	run = set()
+	try:
+		for key in readKeys(previousPath):
+			run.update(parentKeys(key))
+			if len(run) >= runSize:
+				runs.append(_writeRun(run, tempDirectory))
+				run = set()
+		if run or not runs:
+			runs.append(_writeRun(run, tempDirectory))
+		run = None
+		return writeKeys(path, heapq.merge(*[readKeys(runPath) for runPath in runs]))
+	finally:
+		for runPath in runs:
+			os.remove(runPath)
+
+
+def _writeRun(keys, tempDirectory):
+	"""Write a set of keys, sorted, to a temporary file and return its path."""
+	(handle, runPath) = tempfile.mkstemp(".run", "layer", tempDirectory)
+	os.close(handle)
+	writeKeys(runPath, sorted(keys))
+	return runPath
+
+
+def build(directory, maxPegs, runSize=1 << 22, tempDirectory=None, log=None):
+	"""
+	Build a database in a directory, with layers from one peg up to maxPegs.
+	Existing layers are kept, so an interrupted build resumes from the last
+	complete layer. If log is given, it is called with each layer's number of
+	pegs and count of keys.
+	"""
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	path = layerPath(directory, 1)
+	if not os.path.exists(path):
+		writeKeys(path, [bitboard.CENTER])
+	for pegs in xrange(2, maxPegs + 1):
+		path = layerPath(directory, pegs)
+		if os.path.exists(path):
+			continue
+		# Build to a temporary name, so an incomplete layer is never used
+		partialPath = path + ".partial"
+		count = buildLayer(layerPath(directory, pegs - 1), partialPath, runSize, tempDirectory)
+		os.rename(partialPath, path)
+		if log:
+			log(pegs, count)
+
+
+class solvabilityDatabase(object):
+	"""
+	A read-only retrograde database of solvable states, for game nodes with
+	up to maxPegs pegs.
+	"""
+
+	def __init__(self, directory):
+		"""Open the consecutive layer files in a directory, starting from one peg."""
+		self.layers = [None]
+		while os.path.exists(layerPath(directory, len(self.layers))):
+			with open(layerPath(directory, len(self.layers)), 'rb') as fileHandle:
+				# An empty file (a layer with no solvable states, such as 32 or
+				# 33 pegs) cannot be memory-mapped, but an empty string reads
+				# the same way
+				if os.fstat(fileHandle.fileno()).st_size == 0:
+					self.layers.append('')
+				else:
+					self.layers.append(mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ))
+		if len(self.layers) == 1:
+			raise ValueError("Not a retrograde database: " + directory)
+		self.maxPegs = len(self.layers) - 1
+
+	def close(self):
+		"""Release the layer files."""
+		for layer in self.layers[1:]:
+			if layer:
+				layer.close()
+
+	def contains(self, key, pegs):
+		"""
+		Return whether a symmetric key with a given number of pegs is solvable.
+		A key with no pegs, or more than maxPegs, is not in the database.
+		"""
+		if not 1 <= pegs <= self.maxPegs:
+			return False
+		layer = self.layers[pegs]
+		target = packKey(key)
+		low = 0
+		high = len(layer) // KEY_SIZE
+		while low < high:
+			mid = (low + high) // 2
+			offset = mid * KEY_SIZE
+			if layer[offset:offset + KEY_SIZE] < target:
+				low = mid + 1
+			else:
+				high = mid
+		offset = low * KEY_SIZE
+		return layer[offset:offset + KEY_SIZE] == target
+
+	def is_solvable(self, node):
+		"""Return whether a game node with at most maxPegs pegs can be solved."""
+		return self.contains(node.key, node.pegCount)
+
+	def best_move(self, node):
+		"""
+		Return a move, as (oldPos, direction), from a solvable game node to
+		another solvable one, or None if there is none (because the node is
+		solved or cannot be solved).
+		"""
+		for (oldPos, direction) in node.validMoves():
+			jump = bitboard.JUMP_INDEX[oldPos, direction]
+			if self.contains(min(bitboard.jumpImages(node.images, jump)), node.pegCount - 1):
+				return (oldPos, direction)
+		return None
+
+
+def main(args):
+
+	def log(pegs, count):
+		print "%d pegs: %d states" % (pegs, count)
+
+	build(args.output, args.max_pegs, args.run_size, args.temp, log)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Build a retrograde solvability database")
+	parser.add_argument("--output", type=str, required=True,
+		help="directory for the layer files")
+	parser.add_argument("--max-pegs", type=int, default=32,
+		help="build layers up to this many pegs")
+	parser.add_argument("--run-size", type=int, default=1 << 22,
+		help="keys to sort in memory at once")
+	parser.add_argument("--temp", type=str,
+		help="directory for temporary sorted runs")
+	args = parser.parse_args()
+	main(args)
@@ -1,12 +1,30 @@
 import pegSolitaireUtils
+import bitboard
+import pruning
+import transposition
+import persistence
+import retrograde
+import keyset
+import budget
+import checkpoint
 import config
+import collections
+import fractions
 import heapq
+import operator
 
 
 # Returned by a search function that was cut off before exhausting itself
 CUTOFF = object()
 # Returned by a search function that exhausted itself without solving a game
 FAILURE = object()
+# Returned by a search function that exceeded its game's budget (see the
+# budget module) before solving the game or exhausting itself
+LIMITED = object()
+
+# The reason recorded (like a budget's reasons) by a BeamSearch that ran out
+# of nodes after cutting down a layer, so the game is not proven unsolvable
+BEAM = "beam"
 
 
 def recordFailure(pegSol):
@@ -17,16 +35,183 @@ def recordFailure(pegSol):
 	pegSol.trace = "Impossible to solve"
 
 
-def ItrDeepSearch(pegSol):
+def recordBudget(pegSol, reason):
+	"""
+	Mark a Peg Solitaire game as stopped for exceeding its budget for the
+	given reason, set its trace to the moves to the node with the fewest pegs
+	that the search offered to the budget (which is not a solution), and
+	return LIMITED.
+	"""
+	return recordLimit(pegSol, reason, pegSol.budget.best)
+
+
+def recordLimit(pegSol, reason, node):
+	"""
+	Mark a Peg Solitaire game as stopped early for the given reason, set its
+	trace to the moves to the given node (the best one the search found,
+	which is not a solution, or None), and return LIMITED.
+	"""
+	pegSol.limitReason = reason
+	if node is None:
+		pegSol.trace = []
+		return LIMITED
+	if node.parent is None and pegSol.parentMap is not None:
+		node = pegSol.replay(node.key)
+	pegSol.trace = node.trace
+	pegSol.bestPegs = node.pegCount
+	return LIMITED
+
+
+def loadCheckpoint(pegSol, settings):
+	"""
+	Return the (meta, journal, snapshot) of the last checkpoint in the game's
+	checkpoint file (see checkpointFile.load), or None if it has none yet.
+	Raise ValueError if the checkpoint was saved with different settings: a
+	dict that must be a subset of its meta.
+	"""
+	saved = pegSol.checkpoint.load()
+	if saved is None:
+		return None
+	meta = saved[0]
+	for (name, value) in settings.items():
+		if meta.get(name) != value:
+			raise ValueError("Checkpoint %s has %s %s, not %s" %
+				(pegSol.checkpoint.path, name, meta.get(name), value))
+	return saved
+
+
+def parentKey(pegSol, node):
+	"""
+	Return the symmetric key of a node's parent, from the node itself or else
+	from the game's parentMap, or checkpoint.NO_PARENT for the root node.
+	"""
+	if node.parent is not None:
+		return node.parent.key
+	if pegSol.parentMap is not None:
+		return pegSol.parentMap.get(node.key, checkpoint.NO_PARENT)
+	return checkpoint.NO_PARENT
+
+
+def newKeySet(pegSol):
+	"""
+	Return an empty set of symmetric keys for a search of the given game: a
+	keyset.keySet if the game asks for compact sets, or else a Python set.
+	"""
+	if pegSol.compactSets:
+		return keyset.keySet(directory=pegSol.setDirectory)
+	return set()
+
+
+def checkPlainBoard(pegSol, name):
+	"""
+	Raise ValueError if the given game's board has walls inside the plus
+	shape, for a search (of the given name) that generates moves from
+	bitboards, which cannot tell a wall from a hole.
+	"""
+	if pegSol.walls:
+		raise ValueError(name + " cannot search a board with walls inside the plus shape")
+
+
+def isPrunedRoot(pegSol, root):
+	"""
+	Return whether the root node of a game can be rejected by the pruning
+	module's position class or pagoda functions, and count it as pruned if so.
+	"""
+	if pruning.isImpossible(root.images[0]):
+		pegSol.nodesPruned += 1
+		return True
+	return False
+
+
+def isPrunedNode(pegSol, node, explored):
+	"""
+	Return whether a node can be rejected by the pruning module's pagoda
+	functions before it is searched, and count it as pruned if so. Pruned
+	nodes are added to the explored set so that they are not checked again.
+	"""
+	if pruning.isDead(node.images[0]):
+		pegSol.nodesPruned += 1
+		explored.add(node.key)
+		return True
+	return False
+
+
+# With a persistence.stateStore, searches skip stored unsolvable nodes and
+# follow the stored moves from solvable ones, and add every solution they find
+# (see gameNode.copySolution). Depth-limited searches also store nodes they
+# prove unsolvable, which is stricter than adding them to the failed set: a
+# node can fail only because a child was skipped for having already been
+# explored in the same iteration, while being cut off there. So a node is
+# only proven unsolvable if each of its children is: pruned, stored as
+# unsolvable, or a single peg off center.
+
+
+def storedSolution(pegSol, node):
+	"""
+	Return a solved node, with parent nodes back to the root node, reached from
+	the given node by following best moves in the game's stateStore, or None if
+	they do not lead all the way to a solved state.
+	"""
+	store = pegSol.store
+	# Stored moves must be followed from a node whose parents are known
+	if node.parent is None and pegSol.parentMap is not None:
+		node = pegSol.replay(node.key)
+	while not node.is_solved():
+		jump = store.bestMove(node.images)
+		if jump is None:
+			return None
+		node = node.child(jump, node)
+	return node
+
+
+def storedResult(pegSol, root):
+	"""
+	Return the result of searching from a root node as known by the game's
+	stateStore: a solved node (after copying the solution to the game),
+	FAILURE, or None if the store does not know.
+	"""
+	if pegSol.store is None:
+		return None
+	if pegSol.store.isUnsolvable(root.key):
+		return FAILURE
+	node = storedSolution(pegSol, root)
+	if node is not None:
+		node.copySolution(pegSol)
+	return node
+
+
+def isProvenUnsolvable(store, node):
+	"""
+	Return whether an unsolved node is known to be unsolvable by the game's
+	stateStore, or by having a single peg.
+	"""
+	return node.pegCount == 1 or store.isUnsolvable(node.key)
+
+
+def ItrDeepSearch(pegSol, prune=False, recursive=False, ordering=None):
 	"""
 	Perform an iterative-deepening depth-first search on the game tree of the
-	given Peg Solitaire game, and return whether or not the game could be solved.
+	given Peg Solitaire game, and return whether or not the game could be
+	solved, or LIMITED if the game's budget was exceeded first. If prune is
+	True, nodes that the pruning module proves unsolvable are not searched, and
+	are counted in the game's nodesPruned instead. If recursive is True, each
+	iteration uses RecursiveDLS instead of StackDLS; both expand exactly the
+	same nodes. StackDLS generates moves from bitboards, which cannot tell a
+	wall from a hole, so a board with walls inside the plus shape is always
+	searched with RecursiveDLS. If ordering is given (see the ordering
+	module), it orders the moves from each node in every iteration; otherwise
+	they are tried in row-major order.
 
 	Based on textbook figure 3.18 (section 3.4, page 89), but with an additional
 	set of failed nodes (modulo symmetry) to avoid revisiting, which is reused
 	over succesive depth-limited searches and roughly halves the count of
 	expanded nodes. (A cut-off result may succeed at a greater depth, but a
 	failed result will not and can safely be pruned.)
+
+	If the game has a checkpoint file, StackDLS saves its table and stack to
+	it, and a later search of the same game resumes from the last checkpoint
+	at the same depth. Recursive iterations do not save checkpoints. What an
+	ordering learned before the checkpoint is not saved.
 	"""
 	#################################################
 	# Must use functions:
@@ -47,14 +232,52 @@ def ItrDeepSearch(pegSol):
 	# SEE example in the PDF to see what to save
 	#
 	#################################################
-	failed = set()
+	if prune and isPrunedRoot(pegSol, pegSol.rootNode()):
+		recordFailure(pegSol)
+		return False
+	result = storedResult(pegSol, pegSol.rootNode())
+	if result is not None:
+		if result is FAILURE:
+			recordFailure(pegSol)
+			return False
+		return True
+	if pegSol.stats is not None:
+		pegSol.stats.begin(pegSol.rootNode())
 	# Without a maximum depth, impossible games would infintely loop
 	maxDepth = sum(row.count(1) for row in pegSol.gameState)
-	for depth in xrange(maxDepth):
-		# DepthLimitedSearch eventually calls getNextState and saves the move trace
-		result = DepthLimitedSearch(pegSol, depth, failed)
-		if result is not CUTOFF and result is not FAILURE:
-			return True
+	try:
+		if recursive or pegSol.walls:
+			failed = newKeySet(pegSol)
+			for depth in xrange(maxDepth):
+				# DepthLimitedSearch eventually calls getNextState and saves the move trace
+				result = DepthLimitedSearch(pegSol, depth, failed, prune, ordering)
+				if result is not CUTOFF and result is not FAILURE:
+					return True
+		else:
+			# One table serves every iteration, with each depth as its generation
+			table = {}
+			startDepth = 0
+			resume = None
+			if pegSol.checkpoint is not None:
+				saved = loadCheckpoint(pegSol,
+					{"kind": "iddfs", "rootKey": pegSol.rootNode().key, "prune": prune})
+				if saved is not None:
+					(meta, journal, snapshot) = saved
+					# Later marks of a key replace earlier ones
+					for pairs in journal:
+						for i in xrange(0, len(pairs), 2):
+							table[pairs[i]] = pairs[i + 1]
+					startDepth = meta["depth"]
+					pegSol.nodesExpanded = meta["nodesExpanded"]
+					pegSol.nodesPruned = meta["nodesPruned"]
+					resume = unpackStack(snapshot)
+			for depth in xrange(startDepth, maxDepth):
+				result = StackDLS(pegSol, depth, table, depth, prune, resume, ordering)
+				resume = None
+				if result is not CUTOFF and result is not FAILURE:
+					return True
+	except budget.BudgetExceeded as e:
+		return recordBudget(pegSol, e.reason)
 	recordFailure(pegSol)
 	return False
 
@@ -66,7 +289,7 @@ def ItrDeepSearch(pegSol):
 	# return DepthLimitedSearch(pegSol, limit, set())
 
 
-def DepthLimitedSearch(pegSol, limit, failed):
+def DepthLimitedSearch(pegSol, limit, failed, prune=False, ordering=None):
 	"""
 	Perform a depth-limited search on the game tree of the given Peg Solitaire
 	game, and return either the updated game, CUTOFF (if the game cannot be
@@ -79,10 +302,10 @@ def DepthLimitedSearch(pegSol, limit, failed):
 	"""
 	root = pegSol.rootNode()
 	# RecursiveDLS eventually calls getNextState and saves the move trace
-	return RecursiveDLS(root, pegSol, limit, set(failed), failed)
+	return RecursiveDLS(root, pegSol, limit, failed.copy(), failed, prune, ordering)
 
 
-def RecursiveDLS(node, pegSol, limit, explored, failed):
+def RecursiveDLS(node, pegSol, limit, explored, failed, prune=False, ordering=None):
 	"""
 	Perform a recursive depth-limited search on the game tree of the given Peg
 	Solitaire game, and return either the updated game, CUTOFF (if the game
@@ -91,7 +314,8 @@ def RecursiveDLS(node, pegSol, limit, explored, failed):
 
 	Based on textbook figure 3.17 (section 3.4, page 88), but with an additional
 	set of explored nodes (modulo symmetry) to avoid revisiting, and a set of
-	failed nodes to avoid revisiting even at a greater depth.
+	failed nodes to avoid revisiting even at a greater depth. Moves are tried
+	in the order of a moveOrdering, if one is given.
 	"""
 	if node.is_solved():
 		# copySolution saves the move trace
@@ -101,28 +325,293 @@ def RecursiveDLS(node, pegSol, limit, explored, failed):
 		return CUTOFF
 	explored.add(node.key)
 	cut_off = False
-	for (oldPos, dir) in node.validMoves():
+	store = pegSol.store
+	stats = pegSol.stats
+	if stats is not None:
+		stats.expand(node.pegCount, 0, len(explored))
+	limits = pegSol.budget
+	if limits is not None:
+		limits.offer(node)
+		if pegSol.nodesExpanded >= limits.due:
+			limits.check(pegSol.nodesExpanded)
+	# Whether every child so far is proven unsolvable
+	proven = True
+	moves = node.validMoves()
+	if ordering is not None:
+		moves = ordering.orderMoves(node.images, moves)
+	for (oldPos, dir) in moves:
 		# getNextState updates the game's nodesExpanded count
 		childNode = node.getNextState(oldPos, dir, pegSol)
+		if stats is not None:
+			stats.generated += 1
 		if childNode.key in explored:
+			if stats is not None:
+				if childNode.key in failed:
+					stats.failedHits += 1
+				else:
+					stats.symmetryPruned += 1
+			if store is not None and proven:
+				proven = isProvenUnsolvable(store, childNode)
+			continue
+		# Pruned nodes are known to fail, so they are also added to failed
+		if prune and isPrunedNode(pegSol, childNode, explored):
+			failed.add(childNode.key)
 			continue
-		result = RecursiveDLS(childNode, pegSol, limit - 1, explored, failed)
+		if store is not None:
+			entry = store.get(childNode.key)
+			if entry is not None and entry[0] == persistence.UNSOLVABLE:
+				explored.add(childNode.key)
+				failed.add(childNode.key)
+				continue
+			if entry is not None and entry[0] == persistence.SOLVABLE:
+				solvedNode = storedSolution(pegSol, childNode)
+				if solvedNode is not None:
+					solvedNode.copySolution(pegSol)
+					return solvedNode
+		result = RecursiveDLS(childNode, pegSol, limit - 1, explored, failed, prune, ordering)
 		if result is CUTOFF:
 			cut_off = True
+			if ordering is not None:
+				ordering.cutOff(childNode.jump)
 		elif result is FAILURE:
 			failed.add(childNode.key)
 		else:
 			return result
+		if store is not None and proven:
+			proven = isProvenUnsolvable(store, childNode)
+	if store is not None and proven:
+		store.put(node.key, persistence.UNSOLVABLE)
 	if cut_off:
 		return CUTOFF
 	failed.add(node.key)
 	return FAILURE
 
 
-def aStarOne(pegSol):
+# Marks a key in a StackDLS table as failed at any depth, as opposed to the
+# non-negative generation of the iteration that explored it
+FAILED = -1
+
+
+# Store MOVES_FROM and xor locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def stackMoves(images, MOVES_FROM=bitboard.MOVES_FROM,
+		VFLIP=bitboard.VFLIP, HFLIP=bitboard.HFLIP):
+	"""
+	Return the indexes in bitboard.JUMPS of the valid moves from a bitboard
+	with the given symmetric images, pruned by symmetry like
+	gameNode.validMoves, and in reverse order so they can be popped.
+	"""
+	bits = images[0]
+	vsym = images[VFLIP] == bits
+	hsym = images[HFLIP] == bits
+	moves = []
+	pegs = bits
+	while pegs:
+		peg = pegs & -pegs
+		pegs ^= peg
+		for (jump, direction, overMask, toMask) in MOVES_FROM[peg.bit_length() - 1]:
+			if not bits & overMask or bits & toMask: continue
+			if direction == -7 and vsym or direction == -1 and hsym: continue
+			moves.append(jump)
+	moves.reverse()
+	return moves
+
+
+def packStack(stack):
+	"""
+	Return a StackDLS stack as a flat list of integers for a checkpoint: for
+	each frame, its bitboard, the jump from its parent (-1 for the root), its
+	cut off and proven flags as bits 0 and 1, and its count of moves left to
+	try followed by the moves.
+	"""
+	ints = []
+	for (moves, cutOff, _, images, jump, proven) in stack:
+		ints += (images[0], checkpoint.NO_PARENT if jump is None else jump,
+			cutOff | proven << 1, len(moves))
+		ints += moves
+	return ints
+
+
+def unpackStack(ints):
+	"""Return a StackDLS stack from the integers of packStack."""
+	stack = []
+	i = 0
+	while i < len(ints):
+		(bits, jump, flags, count) = ints[i:i + 4]
+		images = bitboard.symmetricImages(bits)
+		moves = list(ints[i + 4:i + 4 + count])
+		stack.append([moves, bool(flags & 1), min(images), images,
+			None if jump == checkpoint.NO_PARENT else jump, bool(flags & 2)])
+		i += 4 + count
+	return stack
+
+
+def orderedStackMoves(images, ordering):
+	"""Return the moves of stackMoves in the order of a moveOrdering, reversed to be popped."""
+	moves = ordering.order(images, stackMoves(images)[::-1])
+	moves.reverse()
+	return moves
+
+
+def StackDLS(pegSol, limit, table, generation, prune=False, resume=None, ordering=None,
+		JUMP_IMAGES=bitboard.JUMP_IMAGES, CENTER=bitboard.CENTER,
+		map=map, min=min, xor=operator.xor):
+	"""
+	Perform a depth-limited search like DepthLimitedSearch, expanding exactly
+	the same nodes in the same order, but with an explicit stack instead of
+	recursion, and return either the updated game, CUTOFF, or FAILURE.
+
+	Instead of a copied set of explored nodes and a set of failed nodes, one
+	table maps keys to the generation of the iteration that explored them, or
+	to FAILED. A new generation makes the old entries stale without clearing
+	them. The stack holds only bitboard images and move lists; nodes are built
+	just for the path of a found solution.
+
+	If the game has a checkpoint file, every change to the table is journaled
+	to it, and the stack is saved with each checkpoint. A stack restored from
+	a checkpoint by unpackStack can be given as resume to carry on from there.
+	Moves are tried in the order of a moveOrdering, if one is given.
+	"""
+	root = pegSol.rootNode()
+	store = pegSol.store
+	stats = pegSol.stats
+	limits = pegSol.budget
+	ckpt = pegSol.checkpoint
+	journal = None if ckpt is None else ckpt.journal
+	if resume is None:
+		if root.is_solved():
+			root.copySolution(pegSol)
+			return root
+		elif limit == 0:
+			return CUTOFF
+		table[root.key] = generation
+		if journal is not None:
+			journal += (root.key, generation)
+		if stats is not None:
+			stats.expand(root.pegCount, 1, len(table))
+		# Each frame is [moves left to try, cut off, key, images, jump from
+		# parent, proven unsolvable so far (see RecursiveDLS)]
+		if ordering is None:
+			moves = stackMoves(root.images)
+		else:
+			moves = orderedStackMoves(root.images, ordering)
+		frame = [moves, False, root.key, root.images, None, True]
+		stack = [frame]
+	else:
+		stack = resume
+	if limits is not None:
+		limits.offer(root)
+	expanded = 0
+	try:
+		while stack:
+			frame = stack[-1]
+			moves = frame[0]
+			if not moves:
+				# Every move has been tried, so return from this frame
+				stack.pop()
+				if frame[1]:
+					if stack:
+						stack[-1][1] = True
+						if ordering is not None:
+							ordering.cutOff(frame[4])
+				else:
+					table[frame[2]] = FAILED
+					if journal is not None:
+						journal += (frame[2], FAILED)
+				if store is not None:
+					if frame[5]:
+						store.put(frame[2], persistence.UNSOLVABLE)
+					elif stack:
+						stack[-1][5] = False
+				continue
+			if ckpt is not None and pegSol.nodesExpanded + expanded >= ckpt.due:
+				# Saved before the next move, when every frame is consistent
+				if ckpt.isDue(pegSol.nodesExpanded + expanded):
+					ckpt.save(packStack(stack), {"kind": "iddfs", "rootKey": root.key,
+						"prune": prune, "depth": limit,
+						"nodesExpanded": pegSol.nodesExpanded + expanded,
+						"nodesPruned": pegSol.nodesPruned})
+			jump = moves.pop()
+			# Counted like getNextState
+			expanded += 1
+			if limits is not None and pegSol.nodesExpanded + expanded >= limits.due:
+				limits.check(pegSol.nodesExpanded + expanded)
+			childImages = map(xor, frame[3], JUMP_IMAGES[jump])
+			childKey = min(childImages)
+			mark = table.get(childKey)
+			if stats is not None:
+				stats.generated += 1
+				if mark == FAILED:
+					stats.failedHits += 1
+				elif mark == generation:
+					stats.symmetryPruned += 1
+			if mark == generation or mark == FAILED:
+				if store is not None and frame[5] and not store.isUnsolvable(childKey):
+					# A single peg left is unsolvable anyway
+					frame[5] = root.pegCount - len(stack) == 1
+				continue
+			childBits = childImages[0]
+			if prune and pruning.isDead(childBits):
+				pegSol.nodesPruned += 1
+				table[childKey] = FAILED
+				if journal is not None:
+					journal += (childKey, FAILED)
+				continue
+			solvable = childBits == CENTER
+			if store is not None and not solvable:
+				entry = store.get(childKey)
+				if entry is not None:
+					if entry[0] == persistence.UNSOLVABLE:
+						table[childKey] = FAILED
+						if journal is not None:
+							journal += (childKey, FAILED)
+						continue
+					solvable = True
+			if solvable:
+				node = root
+				for jump in [f[4] for f in stack[1:]] + [jump]:
+					node = node.child(jump, node)
+				if store is not None:
+					node = storedSolution(pegSol, node)
+				if node is not None:
+					node.copySolution(pegSol)
+					return node
+			if len(stack) == limit:
+				# The child would be cut off at a limit of 0
+				frame[1] = True
+				if ordering is not None:
+					ordering.cutOff(jump)
+				if store is not None and root.pegCount - len(stack) > 1:
+					frame[5] = False
+				continue
+			table[childKey] = generation
+			if journal is not None:
+				journal += (childKey, generation)
+			if ordering is None:
+				moves = stackMoves(childImages)
+			else:
+				moves = orderedStackMoves(childImages, ordering)
+			stack.append([moves, False, childKey, childImages, jump, True])
+			if stats is not None:
+				stats.expand(root.pegCount - len(stack) + 1, len(stack), len(table))
+			if limits is not None and root.pegCount - len(stack) + 1 < limits.bestPegs:
+				# Nodes are only built for the path when it is the deepest yet
+				node = root
+				for f in stack[1:]:
+					node = node.child(f[4], node)
+				limits.offer(node)
+	finally:
+		pegSol.nodesExpanded += expanded
+	# The root frame was the last to return
+	return CUTOFF if frame[1] else FAILURE
+
+
+def aStarOne(pegSol, lifo=False, prune=False):
 	"""
 	Perform an A* search using heuristic #1 on the game tree of the given Peg
-	Solitaire game, and return either the updated game or FAILURE.
+	Solitaire game, and return whether or not the game could be solved, or
+	LIMITED. Ties are broken in last-in, first-out order if lifo is True (or
+	else first-in, first-out), and nodes are pruned if prune is True (see
+	UniformCostSearch).
 	"""
 	#################################################
 	# Must use functions:
@@ -145,16 +634,22 @@ def aStarOne(pegSol):
 	#
 	#################################################
 	# UniformCostSearch eventually calls getNextState and saves the move trace
-	if UniformCostSearch(pegSol, heuristicOne) is FAILURE:
+	result = UniformCostSearch(pegSol, heuristicOne, lifo, prune)
+	if result is LIMITED:
+		return LIMITED
+	if result is FAILURE:
 		recordFailure(pegSol)
 		return False
 	return True
 
 
-def aStarTwo(pegSol):
+def aStarTwo(pegSol, lifo=False, prune=False):
 	"""
 	Perform an A* search using heuristic #2 on the game tree of the given Peg
-	Solitaire game, and return either the updated game or FAILURE.
+	Solitaire game, and return whether or not the game could be solved, or
+	LIMITED. Ties are broken in last-in, first-out order if lifo is True (or
+	else first-in, first-out), and nodes are pruned if prune is True (see
+	UniformCostSearch).
 	"""
 	#################################################
 	# Must use functions:
@@ -177,51 +672,737 @@ def aStarTwo(pegSol):
 	#
 	#################################################
 	# UniformCostSearch eventually calls getNextState and saves the move trace
-	if UniformCostSearch(pegSol, heuristicTwo) is FAILURE:
+	result = UniformCostSearch(pegSol, heuristicTwo, lifo, prune)
+	if result is LIMITED:
+		return LIMITED
+	if result is FAILURE:
 		recordFailure(pegSol)
 		return False
 	return True
 
 
-def UniformCostSearch(pegSol, heuristic=None):
+def idaStar(pegSol, heuristic=None, tableSize=1 << 20, prune=False):
+	"""
+	Perform an iterative-deepening A* search using the given heuristic
+	(heuristic #2 by default) on the game tree of the given Peg Solitaire game,
+	and return whether or not the game could be solved.
+
+	Based on the IDA* algorithm (textbook section 3.5.3, page 99): a series of
+	depth-first searches that cut off nodes whose cost f = g + h (moves made
+	plus heuristic value) exceeds a threshold, which starts at the root's cost
+	and rises to the lowest cost that was cut off each time. Instead of an
+	explored set that grows with the board, it uses a transposition table with
+	a fixed number of slots (tableSize), so its memory use is capped. The
+	count of iterations and the list of thresholds are saved as the game's
+	iterations and thresholds. LIMITED is returned if the game's budget is
+	exceeded first.
+	"""
+	root = pegSol.rootNode(heuristic or heuristicTwo)
+	pegSol.iterations = 0
+	pegSol.thresholds = []
+	if prune and isPrunedRoot(pegSol, root):
+		recordFailure(pegSol)
+		return False
+	if pegSol.stats is not None:
+		pegSol.stats.begin(root)
+	table = transposition.transpositionTable(tableSize)
+	threshold = root.h
+	try:
+		while threshold < UNBOUNDED:
+			pegSol.iterations += 1
+			pegSol.thresholds.append(threshold)
+			# RecursiveIDAStar eventually calls getNextState and saves the move trace
+			result = RecursiveIDAStar(root, pegSol, 0, threshold, table, prune)
+			if not isinstance(result, int):
+				return True
+			threshold = result
+	except budget.BudgetExceeded as e:
+		return recordBudget(pegSol, e.reason)
+	recordFailure(pegSol)
+	return False
+
+
+# The bound of a node that can never be solved at any threshold
+UNBOUNDED = 1 << 30
+
+
+def RecursiveIDAStar(node, pegSol, g, threshold, table, prune=False):
+	"""
+	Perform a recursive cost-limited search on the game tree of the given Peg
+	Solitaire game, from a node reached after g moves, and return either the
+	updated game or the lowest cost above the threshold of a node that was cut
+	off (UNBOUNDED if none were).
+
+	The transposition table stores the bound returned for each fully searched
+	node, so a node is skipped whenever its stored bound is above the current
+	threshold: it was already searched (in this iteration or a previous one)
+	without finding any solution within the threshold. Every path to a state
+	makes the same number of moves, so its bound does not depend on the path.
+	"""
+	f = g + node.h
+	if f > threshold:
+		return f
+	if node.is_solved():
+		# copySolution saves the move trace
+		node.copySolution(pegSol)
+		return node
+	bound = table.get(node.key)
+	if bound is not None and bound > threshold:
+		return bound
+	stats = pegSol.stats
+	if stats is not None:
+		stats.expand(node.pegCount, 0, table.stores)
+	limits = pegSol.budget
+	if limits is not None:
+		limits.offer(node)
+		if pegSol.nodesExpanded >= limits.due:
+			limits.check(pegSol.nodesExpanded)
+	# Trying the children with the lowest costs first finds a solution sooner
+	# in the last iteration
+	children = []
+	for (oldPos, dir) in node.validMoves():
+		# getNextState updates the game's nodesExpanded count
+		childNode = node.getNextState(oldPos, dir, pegSol)
+		if stats is not None:
+			stats.generated += 1
+			stats.heuristicEvaluations += 1
+		if prune and pruning.isDead(childNode.images[0]):
+			pegSol.nodesPruned += 1
+			continue
+		children.append(childNode)
+	children.sort(key=lambda child: child.h)
+	bound = UNBOUNDED
+	for childNode in children:
+		result = RecursiveIDAStar(childNode, pegSol, g + 1, threshold, table, prune)
+		if not isinstance(result, int):
+			return result
+		if result < bound:
+			bound = result
+	table.put(node.key, bound, node.pegCount)
+	return bound
+
+
+def DatabaseSearch(pegSol, database):
+	"""
+	Solve the given Peg Solitaire game with a retrograde.solvabilityDatabase,
+	and return either the updated game, FAILURE, or LIMITED. Once a node has few enough
+	pegs to be in the database, it is known to be solvable or not, and a
+	solvable one is solved by following best_move in linear time. A node with
+	more pegs is searched depth-first until that point, with a set of failed
+	nodes (modulo symmetry), which never has to be revisited since the
+	database is exact.
+	"""
+	checkPlainBoard(pegSol, "Database search")
+	failed = newKeySet(pegSol)
+	try:
+		result = RecursiveDatabaseSearch(pegSol.rootNode(), pegSol, database, failed)
+	except budget.BudgetExceeded as e:
+		return recordBudget(pegSol, e.reason)
+	if result is FAILURE:
+		recordFailure(pegSol)
+	return result
+
+
+def RecursiveDatabaseSearch(node, pegSol, database, failed):
+	"""
+	Perform a recursive depth-first search for DatabaseSearch, and return
+	either the updated game or FAILURE.
+	"""
+	if node.pegCount <= database.maxPegs:
+		if not database.is_solvable(node):
+			return FAILURE
+		while not node.is_solved():
+			(oldPos, dir) = database.best_move(node)
+			# getNextState updates the game's nodesExpanded count
+			node = node.getNextState(oldPos, dir, pegSol)
+		# copySolution saves the move trace
+		node.copySolution(pegSol)
+		return node
+	limits = pegSol.budget
+	if limits is not None:
+		limits.offer(node)
+		if pegSol.nodesExpanded >= limits.due:
+			limits.check(pegSol.nodesExpanded)
+	for (oldPos, dir) in node.validMoves():
+		childNode = node.getNextState(oldPos, dir, pegSol)
+		if childNode.key in failed:
+			continue
+		result = RecursiveDatabaseSearch(childNode, pegSol, database, failed)
+		if result is not FAILURE:
+			return result
+		failed.add(childNode.key)
+	return FAILURE
+
+
+# Estimated bytes to store one key in a set, for BidirectionalSearch
+KEY_BYTES = 80
+
+
+# Store JUMPS_FROM and symmetricImages locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def childKeys(bits, JUMPS_FROM=bitboard.JUMPS_FROM, symmetricImages=bitboard.symmetricImages, min=min):
+	"""
+	Generate the symmetric keys of every state that one jump from a bitboard
+	leads to (see retrograde.parentKeys for the reverse).
+	"""
+	pegs = bits
+	while pegs:
+		peg = pegs & -pegs
+		pegs ^= peg
+		for (_, _, fromMask, overMask, toMask) in JUMPS_FROM[peg.bit_length() - 1]:
+			if bits & overMask and not bits & toMask:
+				yield min(symmetricImages(bits ^ (fromMask | overMask | toMask)))
+
+
+def BidirectionalSearch(pegSol, memoryCap=None, prune=False):
+	"""
+	Perform a bidirectional breadth-first search on the game tree of the given
+	Peg Solitaire game, and return either the updated game, FAILURE, or
+	LIMITED.
+
+	A solution always takes one move fewer than the initial number of pegs,
+	so layers of symmetric keys are expanded forward from the root by jumps,
+	and backward from the solved state by undoing jumps, until their depths
+	add up to that. The game can be solved iff the two last layers share a
+	key. Each step expands the side whose last layer is smaller, unless its
+	next layer would not fit in memoryCap bytes (estimated from its growth so
+	far) but the other side's would; if neither fits, MemoryError is raised.
+	If prune is True, forward nodes that the pruning module proves unsolvable
+	are not stored.
+
+	Only sets of keys are stored, not parents: the path is rebuilt by finding,
+	for each key from the meeting point outward, a neighbor in the adjacent
+	layer. The counts of keys generated on each side are saved as the game's
+	forwardExpanded and backwardExpanded (which sum to nodesExpanded), their
+	depths as forwardDepth and backwardDepth, and the largest layer as
+	peakFrontier. If the game's budget is exceeded, the partial trace leads
+	to a node in the deepest complete forward layer.
+	"""
+	checkPlainBoard(pegSol, "Bidirectional search")
+	root = pegSol.rootNode()
+	pegSol.forwardExpanded = pegSol.backwardExpanded = 0
+	pegSol.forwardDepth = pegSol.backwardDepth = 0
+	if root.pegCount == 0 or prune and isPrunedRoot(pegSol, root):
+		recordFailure(pegSol)
+		return FAILURE
+	forward = [{root.key}]
+	backward = [{bitboard.CENTER}]
+	limits = pegSol.budget
+	try:
+		expandLayers(pegSol, forward, backward, memoryCap, prune, limits)
+	except budget.BudgetExceeded as e:
+		# Layers are only added once complete, so the last one can be rebuilt
+		key = next(iter(forward[-1]), None)
+		if key is not None:
+			limits.offer(pegSolitaireUtils.replayKeys(root, forwardKeys(forward, key)[1:]))
+		return recordBudget(pegSol, e.reason)
+	finally:
+		pegSol.nodesExpanded += pegSol.forwardExpanded + pegSol.backwardExpanded
+		pegSol.forwardDepth = len(forward) - 1
+		pegSol.backwardDepth = len(backward) - 1
+	meeting = forward[-1] & backward[-1]
+	if not meeting:
+		recordFailure(pegSol)
+		return FAILURE
+	# Walk outward from the meeting point to the root and the solved state
+	keys = forwardKeys(forward, min(meeting))
+	key = keys[-1]
+	for layer in reversed(backward[:-1]):
+		key = next(child for child in childKeys(key) if child in layer)
+		keys.append(key)
+	node = pegSolitaireUtils.replayKeys(root, keys[1:])
+	# copySolution saves the move trace
+	node.copySolution(pegSol)
+	return node
+
+
+def expandLayers(pegSol, forward, backward, memoryCap, prune, limits):
+	"""
+	Expand the layers of forward and backward for BidirectionalSearch, until
+	their depths add up to the length of a solution, checking the game's
+	budget (limits) if it has one.
+	"""
+	root = pegSol.rootNode()
+	capacity = memoryCap // KEY_BYTES if memoryCap else None
+	stored = 2
+	isDead = pruning.isDead
+	while len(forward) + len(backward) - 2 < root.pegCount - 1:
+		sides = [forward, backward]
+		if len(backward[-1]) < len(forward[-1]):
+			sides.reverse()
+		if capacity is not None:
+			sides = [side for side in sides if stored + estimateLayer(side) <= capacity]
+			if not sides:
+				raise MemoryError("Bidirectional search needs more than %d bytes" % memoryCap)
+		side = sides[0]
+		layer = set()
+		if side is forward:
+			for bits in forward[-1]:
+				if limits is not None:
+					nodes = pegSol.nodesExpanded + pegSol.forwardExpanded + pegSol.backwardExpanded
+					if nodes >= limits.due:
+						limits.check(nodes)
+				for key in childKeys(bits):
+					pegSol.forwardExpanded += 1
+					if prune and isDead(key):
+						pegSol.nodesPruned += 1
+						continue
+					layer.add(key)
+		else:
+			for bits in backward[-1]:
+				if limits is not None:
+					nodes = pegSol.nodesExpanded + pegSol.forwardExpanded + pegSol.backwardExpanded
+					if nodes >= limits.due:
+						limits.check(nodes)
+				for key in retrograde.parentKeys(bits):
+					pegSol.backwardExpanded += 1
+					layer.add(key)
+		side.append(layer)
+		stored += len(layer)
+		pegSol.peakFrontier = max(pegSol.peakFrontier, len(layer))
+		if not layer:
+			break
+
+
+def forwardKeys(forward, key):
+	"""
+	Return the list of symmetric keys on a path from the root through the
+	forward layers of BidirectionalSearch to a key in the last one.
+	"""
+	keys = [key]
+	for layer in reversed(forward[:-1]):
+		key = next(parent for parent in retrograde.parentKeys(key) if parent in layer)
+		keys.append(key)
+	keys.reverse()
+	return keys
+
+
+def estimateLayer(side):
+	"""
+	Return an estimate of the size of the next layer for BidirectionalSearch,
+	from the growth between its last two layers.
+	"""
+	if len(side) < 2 or not side[-2]:
+		# The first layer can have at most one key for each jump
+		return len(side[-1]) * len(bitboard.JUMPS)
+	return len(side[-1]) * len(side[-1]) // len(side[-2]) + 1
+
+
+class bucketQueue(object):
+	"""
+	A priority queue for items with small non-negative integer priorities,
+	such as the values of our heuristics. Items are kept in a list of buckets
+	indexed by priority, so pushing and popping take constant time instead of
+	O(log n) comparisons like a heap. Items with equal priorities are popped
+	last-in, first-out if lifo is True, or else first-in, first-out.
+	"""
+
+	def __init__(self, lifo=False):
+		"""Initialize an empty queue."""
+		self.buckets = []
+		# No bucket before this index has any items
+		self.lowest = 0
+		self.size = 0
+		# The largest size the queue has reached
+		self.peak = 0
+		self.lifo = lifo
+
+	def __len__(self):
+		"""Return the number of items in the queue."""
+		return self.size
+
+	def push(self, priority, item):
+		"""Add an item to the queue with the given priority."""
+		buckets = self.buckets
+		if priority >= len(buckets):
+			buckets.extend(collections.deque() for _ in xrange(priority + 1 - len(buckets)))
+		buckets[priority].append(item)
+		if priority < self.lowest:
+			self.lowest = priority
+		self.size += 1
+		if self.size > self.peak:
+			self.peak = self.size
+
+	def pop(self):
+		"""Remove and return an item with the lowest priority in the queue."""
+		buckets = self.buckets
+		i = self.lowest
+		while not buckets[i]:
+			i += 1
+		self.lowest = i
+		self.size -= 1
+		return buckets[i].pop() if self.lifo else buckets[i].popleft()
+
+	def items(self):
+		"""
+		Generate the items in the queue bucket by bucket, each bucket in the
+		order its items were pushed, so that pushing them in this order into
+		an empty queue recreates this one.
+		"""
+		for bucket in self.buckets[self.lowest:]:
+			for item in bucket:
+				yield item
+
+
+def UniformCostSearch(pegSol, heuristic=None, lifo=False, prune=False):
 	"""
 	Perform a uniform-cost search (with an optional cost heuristic) of the game
 	tree of the given Peg Solitaire game, and return either the updated game
-	or FAILURE.
+	or FAILURE. Without a heuristic, every node has the same cost, so nodes
+	are expanded in the order they are generated: breadth-first, which is in
+	order of the number of moves made to reach them. Ties between nodes with
+	equal costs are broken in first-in, first-out order, or else last-in,
+	first-out if lifo is True.
+	If prune is True, nodes that the pruning module proves unsolvable are not
+	pushed to the frontier, and are counted in the game's nodesPruned instead.
+	The frontier's peak size is saved as the game's peakFrontier. LIMITED is
+	returned if the game's budget is exceeded first. If the game has a
+	checkpoint file, the search saves its progress to it (see
+	saveUniformCost), and resumes from the last checkpoint already there.
 
 	Based on textbook figure 3.14 (section 3.4, page 84), but with the set of
 	explored nodes taken modulo symmetry. (One board state can be solved iff
 	its seven symmetrical states can be solved, so when one has been expanded
 	the other seven can be pruned.)
 	"""
+	# Costs are computed once per node, and updated from parent to child,
+	# instead of for every comparison. Without a heuristic, a node's h is
+	# None, and its cost is 0.
 	root = pegSol.rootNode(heuristic)
-	frontier = [root]
-	frontierLookup = {root.key}
-	explored = set()
-	while True:
-		if not frontier:
-			return FAILURE
-		node = heapq.heappop(frontier)
-		frontierLookup.remove(node.key)
-		if node.is_solved():
-			# copySolution saves the move trace
-			node.copySolution(pegSol)
-			return node
-		explored.add(node.key)
-		for (oldPos, dir) in node.validMoves():
-			# getNextState updates the game's nodesExpanded count
-			childNode = node.getNextState(oldPos, dir, pegSol)
-			# This only checks if childNode is in explored or frontier, and if
-			# not, adds it to frontier. True A* would also check if a node in
-			# frontier has the same state but a higher path cost, and would
-			# replace that node with childNode. However, in Peg Solitaire,
-			# the path cost from states P to Q will be the number of moves from
-			# P to Q, i.e. the number of pegs removed. So if nodes Q and Q' have
-			# the same state, they must have the same path cost from any node P,
-			# and there is no need to replace one with the other.
-			if childNode.key not in explored and childNode.key not in frontierLookup:
-				heapq.heappush(frontier, childNode)
-				frontierLookup.add(childNode.key)
+	if prune and isPrunedRoot(pegSol, root):
+		return FAILURE
+	result = storedResult(pegSol, root)
+	if result is not None:
+		return result
+	store = pegSol.store
+	stats = pegSol.stats
+	if stats is not None:
+		stats.begin(root)
+		stats.heapPushes += 1
+	frontier = bucketQueue(lifo)
+	frontier.push(root.h or 0, root)
+	frontierLookup = newKeySet(pegSol)
+	frontierLookup.add(root.key)
+	explored = newKeySet(pegSol)
+	limits = pegSol.budget
+	ckpt = pegSol.checkpoint
+	journal = None
+	if ckpt is not None:
+		journal = ckpt.journal
+		settings = {"kind": "ucs", "rootKey": root.key,
+			"heuristic": None if heuristic is None else heuristic.__name__,
+			"lifo": lifo, "prune": prune}
+		saved = loadCheckpoint(pegSol, settings)
+		if saved is not None:
+			frontier = bucketQueue(lifo)
+			frontierLookup = newKeySet(pegSol)
+			resumeUniformCost(pegSol, saved, root.heuristic, frontier, frontierLookup, explored)
+	# With a parentMap, only the keys pushed to the frontier are mapped to
+	# their parents' keys, so that the map stays the size of the explored set
+	# and the frontier, instead of holding every child generated
+	parentMap = pegSol.parentMap
+	pegSol.mapChildren = False
+	try:
+		while True:
+			if not frontier:
+				pegSol.peakFrontier = frontier.peak
+				# The search was exhaustive, so every explored node is unsolvable
+				if store is not None:
+					for key in explored:
+						store.put(key, persistence.UNSOLVABLE)
+				return FAILURE
+			if ckpt is not None and pegSol.nodesExpanded >= ckpt.due:
+				if ckpt.isDue(pegSol.nodesExpanded):
+					saveUniformCost(pegSol, settings, frontier)
+			node = frontier.pop()
+			frontierLookup.remove(node.key)
+			if stats is not None:
+				stats.heapPops += 1
+			if node.is_solved():
+				pegSol.peakFrontier = frontier.peak
+				# copySolution saves the move trace
+				node.copySolution(pegSol)
+				return node
+			explored.add(node.key)
+			if journal is not None:
+				journal += (node.key, parentKey(pegSol, node))
+			if stats is not None:
+				stats.expand(node.pegCount, len(frontier), len(explored))
+			if limits is not None:
+				limits.offer(node)
+				if pegSol.nodesExpanded >= limits.due:
+					limits.check(pegSol.nodesExpanded)
+			for (oldPos, dir) in node.validMoves():
+				# getNextState updates the game's nodesExpanded count
+				childNode = node.getNextState(oldPos, dir, pegSol)
+				if stats is not None:
+					stats.generated += 1
+					stats.heuristicEvaluations += 1
+					if childNode.key in explored:
+						stats.symmetryPruned += 1
+					elif childNode.key in frontierLookup:
+						stats.frontierHits += 1
+				# This only checks if childNode is in explored or frontier, and if
+				# not, adds it to frontier. True A* would also check if a node in
+				# frontier has the same state but a higher path cost, and would
+				# replace that node with childNode. However, in Peg Solitaire,
+				# the path cost from states P to Q will be the number of moves from
+				# P to Q, i.e. the number of pegs removed. So if nodes Q and Q' have
+				# the same state, they must have the same path cost from any node P,
+				# and there is no need to replace one with the other.
+				if childNode.key not in explored and childNode.key not in frontierLookup:
+					if prune and isPrunedNode(pegSol, childNode, explored):
+						if journal is not None:
+							journal += (childNode.key, checkpoint.NO_PARENT)
+						continue
+					if store is not None:
+						entry = store.get(childNode.key)
+						if entry is not None and entry[0] == persistence.UNSOLVABLE:
+							explored.add(childNode.key)
+							if journal is not None:
+								journal += (childNode.key, checkpoint.NO_PARENT)
+							continue
+					if parentMap is not None:
+						parentMap[childNode.key] = node.key
+					if store is not None and entry is not None and entry[0] == persistence.SOLVABLE:
+						solvedNode = storedSolution(pegSol, childNode)
+						if solvedNode is not None:
+							pegSol.peakFrontier = frontier.peak
+							solvedNode.copySolution(pegSol)
+							return solvedNode
+					frontier.push(childNode.h or 0, childNode)
+					frontierLookup.add(childNode.key)
+					if stats is not None:
+						stats.heapPushes += 1
+	except budget.BudgetExceeded as e:
+		pegSol.peakFrontier = frontier.peak
+		return recordBudget(pegSol, e.reason)
+	finally:
+		pegSol.mapChildren = True
+
+
+def saveUniformCost(pegSol, settings, frontier):
+	"""
+	Save a checkpoint of a UniformCostSearch with the given settings to the
+	game's checkpoint file. The journal holds each explored key with its
+	parent's key, or with checkpoint.NO_PARENT for keys that were never
+	expanded (pruned, or stored as unsolvable), and the snapshot holds the bitboard and parent's key of each
+	frontier node, in the order of bucketQueue.items.
+	"""
+	snapshot = []
+	for node in frontier.items():
+		snapshot += (node.images[0], parentKey(pegSol, node))
+	meta = dict(settings, nodesExpanded=pegSol.nodesExpanded,
+		nodesPruned=pegSol.nodesPruned, peakFrontier=frontier.peak)
+	pegSol.checkpoint.save(snapshot, meta)
+
+
+def resumeUniformCost(pegSol, saved, heuristic, frontier, frontierLookup, explored):
+	"""
+	Restore the explored set and the (empty) frontier of a UniformCostSearch
+	from a checkpoint saved by saveUniformCost, along with the game's counts.
+	Pruned and stored unsolvable keys are restored as explored, so they are
+	not counted again. The restored nodes have no parent nodes, so the game
+	switches to a parentMap of the saved keys to recover the trace.
+	"""
+	(meta, journal, snapshot) = saved
+	if pegSol.parentMap is None:
+		pegSol.parentMap = {}
+	parentMap = pegSol.parentMap
+	for pairs in journal:
+		for i in xrange(0, len(pairs), 2):
+			explored.add(pairs[i])
+			if pairs[i + 1] != checkpoint.NO_PARENT:
+				parentMap[pairs[i]] = pairs[i + 1]
+	for i in xrange(0, len(snapshot), 2):
+		node = pegSol.nodeFromBits(snapshot[i], heuristic)
+		frontier.push(node.h or 0, node)
+		frontierLookup.add(node.key)
+		if snapshot[i + 1] != checkpoint.NO_PARENT:
+			parentMap[node.key] = snapshot[i + 1]
+	frontier.peak = meta["peakFrontier"]
+	pegSol.nodesExpanded = meta["nodesExpanded"]
+	pegSol.nodesPruned = meta["nodesPruned"]
+
+
+def weightedAStar(pegSol, heuristic=None, weight=2, lifo=False, prune=False):
+	"""
+	Perform a weighted A* search, with f = g + weight * h for a heuristic h
+	(heuristicTwo by default), on the game tree of the given Peg Solitaire
+	game, and return whether or not the game could be solved, or LIMITED.
+	Every solution has the same length, so a weight above 1 gives up nothing
+	but the order in which nodes are expanded, and favors nodes closer to a
+	solution over shallower ones. Ties and pruning are as in UniformCostSearch.
+	"""
+	result = UniformCostSearch(pegSol, weightedHeuristic(heuristic or heuristicTwo, weight),
+		lifo, prune)
+	if result is LIMITED:
+		return LIMITED
+	if result is FAILURE:
+		recordFailure(pegSol)
+		return False
+	return True
+
+
+def BeamSearch(pegSol, heuristic=None, width=1000, widen=None, maxWidth=None, prune=False):
+	"""
+	Perform a beam search on the game tree of the given Peg Solitaire game,
+	and return whether or not the game could be solved, or LIMITED.
+
+	Every jump removes one peg, so each layer of the tree has nodes of one
+	depth, and a key can only repeat within a layer. Each layer is expanded
+	in full, and only the width children with the lowest values of a
+	heuristic (heuristicTwo by default) with distinct keys are kept as the
+	next layer, in a bounded heap as they are generated. Ties are broken in
+	favor of the first child generated. Nodes only refer to their parents, so
+	the layers kept take O(width * depth) memory for any board.
+
+	If a layer runs out of nodes after some layer was cut down to the width,
+	the search may have dropped a solvable node, so if widen is given the
+	search restarts with the width multiplied by it, up to maxWidth, as long
+	as that makes the beam wider. The game is only proven unsolvable if no
+	layer was cut down; otherwise it is marked as limited for the reason
+	BEAM (see recordLimit), with the trace to the best node of the deepest
+	layer. The final width is saved as the game's beamWidth, and the
+	largest layer as peakFrontier.
+	If prune is True, children that the pruning module proves unsolvable are
+	counted in the game's nodesPruned and dropped.
+	"""
+	heuristic = heuristic or heuristicTwo
+	root = pegSol.rootNode(heuristic)
+	pegSol.beamWidth = width
+	if prune and isPrunedRoot(pegSol, root):
+		recordFailure(pegSol)
+		return False
+	stats = pegSol.stats
+	if stats is not None:
+		stats.begin(root)
+	limits = pegSol.budget
+	isDead = pruning.isDead
+	try:
+		while True:
+			pegSol.beamWidth = width
+			if root.is_solved():
+				root.copySolution(pegSol)
+				return True
+			layer = [root]
+			# The best node of the deepest layer so far
+			deepest = root
+			truncated = False
+			while layer:
+				# Each heap item is (-h, -order, key, node), so the root of the
+				# heap is the worst child kept: the highest h, generated last
+				heap = []
+				keys = set()
+				order = 0
+				for node in layer:
+					if stats is not None:
+						stats.expand(node.pegCount, len(heap), 0)
+					if limits is not None:
+						limits.offer(node)
+						if pegSol.nodesExpanded >= limits.due:
+							limits.check(pegSol.nodesExpanded)
+					for (oldPos, dir) in node.validMoves():
+						# getNextState updates the game's nodesExpanded count
+						childNode = node.getNextState(oldPos, dir, pegSol)
+						if stats is not None:
+							stats.generated += 1
+							stats.heuristicEvaluations += 1
+						if childNode.is_solved():
+							pegSol.peakFrontier = max(pegSol.peakFrontier, len(layer))
+							# copySolution saves the move trace
+							childNode.copySolution(pegSol)
+							return True
+						if childNode.key in keys:
+							if stats is not None:
+								stats.symmetryPruned += 1
+							continue
+						if prune and isDead(childNode.images[0]):
+							pegSol.nodesPruned += 1
+							continue
+						order += 1
+						item = (-childNode.h, -order, childNode.key, childNode)
+						if len(heap) < width:
+							heapq.heappush(heap, item)
+						else:
+							truncated = True
+							if item > heap[0]:
+								keys.discard(heapq.heapreplace(heap, item)[2])
+							else:
+								continue
+						keys.add(childNode.key)
+				pegSol.peakFrontier = max(pegSol.peakFrontier, len(layer))
+				# Expand the next layer best first, like the children of a node
+				layer = [item[3] for item in sorted(heap, reverse=True)]
+				if layer:
+					deepest = layer[0]
+			if not truncated:
+				recordFailure(pegSol)
+				return False
+			wider = int(width * widen) if widen else width
+			if maxWidth is not None:
+				wider = min(wider, maxWidth)
+			# A restart must widen the beam, or it would cut the same layers
+			if wider <= width:
+				return recordLimit(pegSol, BEAM, deepest)
+			width = wider
+	except budget.BudgetExceeded as e:
+		return recordBudget(pegSol, e.reason)
+
+
+#####################################
+# Heuristics
+#####################################
+
+
+# A heuristic is a function that takes a game node and returns an integer
+# estimate of the cost of solving it, with a delta attribute: a function that
+# takes a game node and the index of a valid jump in bitboard.JUMPS, and
+# returns how much the estimate changes when that jump is made. Game nodes only
+# evaluate a heuristic in full for the root node, and then give each child its
+# parent's value plus the delta, so the two functions must agree exactly.
+# A jump only changes three positions, so every delta takes constant time.
+# Deltas read the state from node.images[0], which is the identity image of
+# the state as a bitboard for both gameNodes and bitNodes.
+
+
+def weightedPegDelta(weights, pegWeight):
+	"""
+	Return a delta function for a heuristic that sums the given weights of the
+	positions with pegs and adds pegWeight times the number of pegs. The delta
+	of each jump is precomputed in a table.
+	"""
+	table = [weights[oldPos + 2 * direction] - weights[oldPos] -
+		weights[oldPos + direction] - pegWeight
+		for (oldPos, direction, _, _, _) in bitboard.JUMPS]
+	return lambda node, jump: table[jump]
+
+
+def heuristicPathCost(node):
+	"""
+	Return the number of moves needed to reach the given game node from a
+	full board. This is what a uniform-cost search without a heuristic
+	minimizes, since the starting number of pegs is the same for every node.
+	"""
+	return len(bitboard.HOLES) - node.pegCount
+
+heuristicPathCost.delta = lambda node, jump: 1
+
+
+def weightedHeuristic(heuristic, weight):
+	"""
+	Return a heuristic for weighted A*: the path cost g plus weight times the
+	given heuristic h. The weight is approximated by a fraction num / den
+	(with a denominator of at most 100), and the cost is scaled to the integer
+	den * g + num * h, which orders nodes the same way.
+	"""
+	weight = fractions.Fraction(weight).limit_denominator(100)
+	(num, den) = (weight.numerator, weight.denominator)
+	delta = heuristic.delta
+	weighted = lambda node: den * heuristicPathCost(node) + num * heuristic(node)
+	weighted.delta = lambda node, jump: den + num * delta(node, jump)
+	# UniformCostSearch saves the name with a checkpoint
+	weighted.__name__ = "%s*%s" % (heuristic.__name__, weight)
+	return weighted
 
 
 # Store xrange locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
@@ -249,8 +1430,65 @@ def heuristicOne(node, xrange=xrange):
 	return node.pegCount * 2 + num_dangling
 
 
-# Store sum and xrange locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
-def heuristicTwo(node, sum=sum, xrange=xrange):
+def _danglingCells():
+	"""
+	Return a table of the positions whose dangling status a jump could change
+	(the three positions it touches and their neighbors), as lists of pairs of
+	a position's mask and the mask of its neighbors, for each jump in
+	bitboard.JUMPS.
+	"""
+	MASKS = bitboard.MASKS
+	def neighbors(pos):
+		# This matches heuristicOne's node[i + direction], which lets east and
+		# west neighbors wrap around between rows 2, 3, and 4
+		return [pos + d for d in (7, 1, -7, -1) if 0 <= pos + d < 49 and MASKS[pos + d]]
+	table = []
+	for (oldPos, direction, _, _, _) in bitboard.JUMPS:
+		touched = [oldPos, oldPos + direction, oldPos + 2 * direction]
+		cells = set(touched)
+		for pos in touched:
+			cells.update(neighbors(pos))
+		table.append([(MASKS[pos], sum(MASKS[n] for n in neighbors(pos)))
+			for pos in sorted(cells)])
+	return table
+
+DANGLING_CELLS = _danglingCells()
+
+
+# Store DANGLING_CELLS and JUMPS locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def heuristicOneDelta(node, jump, DANGLING_CELLS=DANGLING_CELLS, JUMPS=bitboard.JUMPS):
+	"""
+	Return the change in heuristicOne when the given jump is made: one fewer
+	peg, plus the change in dangling pegs among the positions near the jump.
+	"""
+	before = node.images[0]
+	(_, _, fromMask, overMask, toMask) = JUMPS[jump]
+	after = before ^ (fromMask | overMask | toMask)
+	delta = -2
+	for (mask, neighbors) in DANGLING_CELLS[jump]:
+		if before & mask and not before & neighbors:
+			delta -= 1
+		if after & mask and not after & neighbors:
+			delta += 1
+	return delta
+
+heuristicOne.delta = heuristicOneDelta
+
+
+# The estimated difficulty of removing a peg from each position, for heuristicTwo
+DIFFICULTIES = [
+	0, 0, 4, 1, 4, 0, 0,
+	0, 0, 1, 1, 1, 0, 0,
+	4, 1, 2, 0, 2, 1, 4,
+	1, 1, 0, 1, 0, 1, 1,
+	4, 1, 2, 0, 2, 1, 4,
+	0, 0, 1, 1, 1, 0, 0,
+	0, 0, 4, 1, 4, 0, 0,
+]
+
+
+# Store sum, xrange, and DIFFICULTIES locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+def heuristicTwo(node, sum=sum, xrange=xrange, difficulties=DIFFICULTIES):
 	"""
 	Return a heuristic estimate of the cost of solving the given game node.
 
@@ -268,19 +1506,12 @@ def heuristicTwo(node, sum=sum, xrange=xrange):
 	but prior to that having a peg sit there is not quite useful (since if you
 	are left with two pegs and one is in the center, the game is unsolvable).
 	"""
-	difficulties = [
-		0, 0, 4, 1, 4, 0, 0,
-		0, 0, 1, 1, 1, 0, 0,
-		4, 1, 2, 0, 2, 1, 4,
-		1, 1, 0, 1, 0, 1, 1,
-		4, 1, 2, 0, 2, 1, 4,
-		0, 0, 1, 1, 1, 0, 0,
-		0, 0, 4, 1, 4, 0, 0,
-	]
 	# Store node.state locally to avoid repeated LOAD_ATTR instructions
 	state = node.state
 	return node.pegCount * 2 + sum(difficulties[k] for k in xrange(49) if state[k] == 1)
 
+heuristicTwo.delta = weightedPegDelta(DIFFICULTIES, 2)
+
 
 #####################################
 # Abandoned heuristics
@@ -293,24 +1524,30 @@ def heuristicBaseline(node):
 	"""
 	return node.pegCount
 
+heuristicBaseline.delta = lambda node, jump: -1
+
+
+DISTANCES = [
+	5, 4, 3, 2, 3, 4, 5,
+	4, 3, 2, 1, 2, 3, 4,
+	3, 2, 1, 0, 1, 2, 3,
+	2, 1, 0, 1, 0, 1, 2,
+	3, 2, 1, 0, 1, 2, 3,
+	4, 3, 2, 1, 2, 3, 4,
+	5, 4, 3, 2, 3, 4, 5
+]
+
 
-def heuristicManhattan(node, sum=sum, xrange=xrange):
+def heuristicManhattan(node, sum=sum, xrange=xrange, distances=DISTANCES):
 	"""
 	This heuristic sums the Manhattan distances of each peg from the four holes
 	surrounding the center hole.
 	"""
-	distances = [
-		5, 4, 3, 2, 3, 4, 5,
-		4, 3, 2, 1, 2, 3, 4,
-		3, 2, 1, 0, 1, 2, 3,
-		2, 1, 0, 1, 0, 1, 2,
-		3, 2, 1, 0, 1, 2, 3,
-		4, 3, 2, 1, 2, 3, 4,
-		5, 4, 3, 2, 3, 4, 5
-	]
 	state = node.state
 	return sum(distances[k] for k in xrange(49) if state[k] == 1)
 
+heuristicManhattan.delta = weightedPegDelta(DISTANCES, 0)
+
 
 def heuristicDifficulty1(node):
 	"""
@@ -327,6 +1564,16 @@ def heuristicDifficulty1(node):
 		state[24]
 	)
 
+heuristicDifficulty1.delta = weightedPegDelta([
+	0, 0, 4, 0, 4, 0, 0,
+	0, 0, 0, 0, 0, 0, 0,
+	4, 0, 3, 0, 3, 0, 4,
+	0, 0, 0, 1, 0, 0, 0,
+	4, 0, 3, 0, 3, 0, 4,
+	0, 0, 0, 0, 0, 0, 0,
+	0, 0, 4, 0, 4, 0, 0,
+], 2)
+
 
 def heuristicDifficulty2(node):
 	"""
@@ -336,3 +1583,13 @@ def heuristicDifficulty2(node):
 	state = node.state
 	return (node.pegCount * 3 - state[16] - state[17] - state[18] -
 		state[23] - state[24] - state[25] - state[30] - state[31] - state[32])
+
+heuristicDifficulty2.delta = weightedPegDelta([
+	0, 0, 0, 0, 0, 0, 0,
+	0, 0, 0, 0, 0, 0, 0,
+	0, 0, -1, -1, -1, 0, 0,
+	0, 0, -1, -1, -1, 0, 0,
+	0, 0, -1, -1, -1, 0, 0,
+	0, 0, 0, 0, 0, 0, 0,
+	0, 0, 0, 0, 0, 0, 0,
+], 3)
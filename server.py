@@ -0,0 +1,285 @@
+import argparse
+import collections
+import errno
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import SocketServer
+import stat
+import sys
+import threading
+import time
+import batch
+import benchmark
+import cache
+import stream
+
+
+# The solver daemon keeps a pool of worker processes running between
+# requests, so each board is solved without starting an interpreter or
+# rebuilding the tables, and each worker keeps an lruStore of what its
+# searches have learned, warm for the next board.
+# Clients connect to a Unix socket or a local TCP port and send requests: one
+# or more boards, one per line in the comma-separated format of a board file,
+# ended by a blank line. The boards of a request are solved in parallel by
+# the pool, and the server replies with one JSON record per board, in the
+# order they were sent, like the records of the stream module, followed by a
+# blank line. A client can send any number of requests on one connection.
+# A request of the single line "metrics" gets a JSON record of the server's
+# metrics instead: counts of requests and boards, percentiles of recent
+# latencies, and the hit rate of the workers' stores.
+# Connections are served by one thread each (the pool does the solving), in
+# place of an event loop, which Python 2 does not have.
+
+METRICS = "metrics"
+
+# Latencies kept for percentiles, most recent first
+LATENCY_WINDOW = 1000
+
+# The store of a worker process, created by initWorker
+workerStore = None
+
+
+def initWorker(maxBytes):
+	"""
+	Prepare a worker process like batch.initWorker, with a store capped at
+	maxBytes. Workers also ignore SIGTERM, which may be sent to the whole
+	process group, so that the server stops them (see main), instead of one
+	being killed while it holds the lock of the pool's task queue.
+	"""
+	global workerStore
+	batch.initWorker()
+	signal.signal(signal.SIGTERM, signal.SIG_IGN)
+	workerStore = cache.lruStore(maxBytes)
+
+
+def solveLine(task):
+	"""
+	Solve the board of one line in a worker with its store, and return its
+	record (see stream.solveLine), with the lookups and hits of the store
+	during the search, and the number of entries it holds after it.
+	"""
+	lookups = workerStore.lookups
+	hits = workerStore.hits
+	record = stream.solveLine(task, workerStore)
+	record["cacheLookups"] = workerStore.lookups - lookups
+	record["cacheHits"] = workerStore.hits - hits
+	record["cacheEntries"] = len(workerStore)
+	record["worker"] = os.getpid()
+	return record
+
+
+def percentile(values, fraction):
+	"""Return the value at a fraction of the way through a sorted list, or None if it is empty."""
+	if not values:
+		return None
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class serviceMetrics(object):
+	"""The counts and latencies of the requests a server has answered, safe to share between threads."""
+
+	def __init__(self):
+		"""Initialize metrics with nothing counted."""
+		self.lock = threading.Lock()
+		self.started = time.time()
+		self.requests = 0
+		self.boards = 0
+		self.statuses = collections.Counter()
+		self.cacheLookups = 0
+		self.cacheHits = 0
+		# The entries of each worker's store, as of its last record
+		self.cacheEntries = {}
+		self.boardLatencies = collections.deque(maxlen=LATENCY_WINDOW)
+		self.requestLatencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+	def addRecord(self, record):
+		"""Count the record of one board, with its latency in seconds."""
+		with self.lock:
+			self.boards += 1
+			self.statuses[record["status"]] += 1
+			self.cacheLookups += record.get("cacheLookups", 0)
+			self.cacheHits += record.get("cacheHits", 0)
+			if "worker" in record:
+				self.cacheEntries[record["worker"]] = record["cacheEntries"]
+			self.boardLatencies.append(record["latency"])
+
+	def addRequest(self, latency):
+		"""Count one request, with its latency in seconds."""
+		with self.lock:
+			self.requests += 1
+			self.requestLatencies.append(latency)
+
+	def asDict(self):
+		"""Return the metrics as a dict of JSON types."""
+		with self.lock:
+			metrics = {
+				"uptime": round(time.time() - self.started, 3),
+				"requests": self.requests,
+				"boards": self.boards,
+				"statuses": dict(self.statuses),
+				"cacheLookups": self.cacheLookups,
+				"cacheHits": self.cacheHits,
+				"cacheHitRate": round(float(self.cacheHits) / self.cacheLookups, 4)
+					if self.cacheLookups else None,
+				"cacheEntries": sum(self.cacheEntries.values()),
+			}
+			for (name, latencies) in (("board", self.boardLatencies),
+					("request", self.requestLatencies)):
+				latencies = sorted(latencies)
+				for (label, fraction) in (("P50", 0.5), ("P95", 0.95), ("P99", 0.99)):
+					metrics[name + "Latency" + label] = percentile(latencies, fraction)
+				metrics[name + "LatencyMax"] = latencies[-1] if latencies else None
+		return metrics
+
+
+class requestHandler(SocketServer.StreamRequestHandler):
+	"""Answer the requests of one connection until the client closes it."""
+
+	def handle(self):
+		"""See SocketServer.BaseRequestHandler.handle."""
+		while True:
+			lines = self.readRequest()
+			if lines is None:
+				return
+			if lines == [METRICS]:
+				self.writeRecord(self.server.metrics.asDict())
+			elif not self.solve(lines):
+				return
+			self.wfile.write('\n')
+			self.wfile.flush()
+
+	def readRequest(self):
+		"""Return the lines of the next request, or None at the end of the connection."""
+		lines = []
+		for line in iter(self.rfile.readline, ''):
+			line = line.strip()
+			if not line:
+				if lines:
+					return lines
+				continue
+			lines.append(line)
+		# A last request without its blank line is still answered
+		return lines or None
+
+	def writeRecord(self, record):
+		"""Write one JSON record as a line."""
+		self.wfile.write(json.dumps(record, sort_keys=True) + '\n')
+
+	def solve(self, lines):
+		"""
+		Solve the boards of a request with the pool, write their records in
+		order, and return True, or return False without answering if the
+		server is stopping.
+		"""
+		server = self.server
+		tic = time.time()
+		def finish(record):
+			# Called by the pool as each board is solved, in any order
+			record["latency"] = round(time.time() - tic, 3)
+		with server.poolLock:
+			if server.stopping:
+				return False
+			results = [server.pool.apply_async(solveLine,
+				((number, line, server.algorithm, server.bitboard, server.prune, server.timeLimit),),
+				callback=finish) for (number, line) in enumerate(lines, 1)]
+		for result in results:
+			# Without a timeout, waiting cannot be interrupted in Python 2
+			record = result.get(1 << 30)
+			server.metrics.addRecord(record)
+			self.writeRecord(record)
+			self.wfile.flush()
+		server.metrics.addRequest(round(time.time() - tic, 3))
+		return True
+
+
+class unixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	"""A server on a Unix socket, with a thread for each connection."""
+	daemon_threads = True
+
+
+class tcpServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	"""A server on a TCP port, with a thread for each connection."""
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+def main(args):
+
+	if args.algorithm not in benchmark.ALGORITHM_NAMES:
+		sys.exit("Unknown algorithm: " + args.algorithm)
+	if args.socket:
+		# Refuse to take over the socket of a server that is still running,
+		# but remove one left behind by a server that did not clean up
+		probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			probe.connect(args.socket)
+		except socket.error as e:
+			if e.errno == errno.ECONNREFUSED and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+				os.remove(args.socket)
+		else:
+			sys.exit("A server is already listening on " + args.socket)
+		finally:
+			probe.close()
+		server = unixServer(args.socket, requestHandler)
+	else:
+		server = tcpServer((args.host, args.port), requestHandler)
+	server.pool = multiprocessing.Pool(args.workers, initWorker, (args.cache_memory << 20,))
+	# Set, under the lock, once no more boards may be sent to the pool
+	server.poolLock = threading.Lock()
+	server.stopping = False
+	server.metrics = serviceMetrics()
+	server.algorithm = args.algorithm
+	server.bitboard = args.bitboard
+	server.prune = args.prune
+	server.timeLimit = args.time_limit
+
+	def stop(signum, frame):
+		# shutdown waits for serve_forever to return, so it cannot be called
+		# from the main thread, which the handler interrupts
+		thread = threading.Thread(target=server.shutdown)
+		thread.daemon = True
+		thread.start()
+
+	# Stop serving on SIGTERM or a keyboard interrupt, and clean up below
+	# once serve_forever has returned, rather than raising an exception
+	# wherever the main thread happens to be
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+	print >> sys.stderr, "Listening on %s" % (args.socket or "%s:%d" % server.server_address)
+	server.serve_forever()
+	server.server_close()
+	# Open connections stop at their next request, and the workers finish the
+	# boards already sent to them, and then exit
+	with server.poolLock:
+		server.stopping = True
+		server.pool.close()
+	server.pool.join()
+	if args.socket:
+		os.remove(args.socket)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve board solving over a local socket")
+	parser.add_argument("--socket", type=str,
+		help="listen on a Unix socket at this path instead of a TCP port")
+	parser.add_argument("--host", default="127.0.0.1",
+		help="address to listen on for TCP (default: 127.0.0.1)")
+	parser.add_argument("--port", type=int, default=5370,
+		help="TCP port to listen on (default: 5370)")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+		help="number of worker processes (default: one per CPU)")
+	parser.add_argument("--cache-memory", type=int, default=256, metavar="MIB",
+		help="memory for each worker's cache of solvable and unsolvable states (default: 256)")
+	parser.add_argument("--algorithm", default="two",
+		help="one of: " + ','.join(benchmark.ALGORITHM_NAMES) + " (default: two)")
+	parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+		help="stop each search after this long and record its best partial trace")
+	parser.add_argument("--bitboard", action="store_true",
+		help="search with packed bitboard nodes")
+	parser.add_argument("--prune", action="store_true",
+		help="reject unsolvable nodes by pagoda functions and position class")
+	args = parser.parse_args()
+	main(args)
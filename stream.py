@@ -0,0 +1,156 @@
+import argparse
+import json
+import multiprocessing
+import Queue
+import sys
+import time
+import budget
+import batch
+import benchmark
+import pegSolitaireUtils
+import readGame
+
+
+# A stream solves boards read one per line (in the comma-separated format of
+# a board file) from a file or stdin, and writes one JSON record per board to
+# stdout as soon as it is solved, so that any number of generated boards can
+# be piped through without a file for each. Every stage is a generator, and
+# at most readAhead boards are read before their records are written, so
+# memory stays flat however long the stream is. A line that is not a valid
+# board gets an error record instead of stopping the stream. With more than
+# one worker, records are written in the order boards finish, and each one
+# has the line number of its board to match them up.
+
+# Statuses of a record, besides those of benchmark
+LIMITED = "limited"
+ERROR = "error"
+
+
+def readBoards(fileHandle):
+	"""Generate (line number, line) pairs for the non-blank lines of a file."""
+	for (number, line) in enumerate(fileHandle, 1):
+		line = line.strip()
+		if line:
+			yield (number, line)
+
+
+def solveLine(task, store=None):
+	"""
+	Solve the board of one line with an algorithm, and return its record as a
+	dict. A store, if given, is consulted and added to by the search.
+	"""
+	(number, line, name, bitboard, prune, timeLimit) = task
+	record = {"line": number, "board": line, "algorithm": name}
+	try:
+		gameState = readGame.parseGameState(line)
+	except ValueError as e:
+		record["status"] = ERROR
+		record["error"] = str(e)
+		return record
+	searchBudget = None
+	if timeLimit is not None:
+		searchBudget = budget.searchBudget(time.time() + timeLimit)
+	try:
+		pegSol = pegSolitaireUtils.game(None, bitboard, store=store, budget=searchBudget,
+			gameState=gameState)
+		tic = time.time()
+		dict(benchmark.ALGORITHMS)[name](pegSol, prune)
+		record["seconds"] = round(time.time() - tic, 3)
+		record["nodesExpanded"] = pegSol.nodesExpanded
+		if pegSol.limitReason is not None:
+			record["status"] = LIMITED
+			record["reason"] = pegSol.limitReason
+			record["bestPegs"] = pegSol.bestPegs
+		elif isinstance(pegSol.trace, str):
+			record["status"] = benchmark.IMPOSSIBLE
+		else:
+			record["status"] = benchmark.SOLVED
+		if not isinstance(pegSol.trace, str):
+			record["trace"] = pegSol.trace
+	except MemoryError:
+		record["status"] = benchmark.MEMERR
+	except Exception as e:
+		# One bad board must not stop the stream
+		record["status"] = ERROR
+		record["error"] = "%s: %s" % (type(e).__name__, e)
+	return record
+
+
+def solveBoards(lines, name, bitboard=False, prune=False, timeLimit=None,
+		workers=1, readAhead=64):
+	"""
+	Generate the record of each (line number, line) pair in lines, solved
+	with the named algorithm of benchmark.ALGORITHMS. With one worker, boards
+	are solved in this process, in order; with more, they are solved by a
+	pool of worker processes, with at most readAhead boards taken from lines
+	but not yet generated.
+	"""
+	tasks = ((number, line, name, bitboard, prune, timeLimit) for (number, line) in lines)
+	if workers <= 1:
+		for task in tasks:
+			yield solveLine(task)
+		return
+	results = Queue.Queue()
+	pool = multiprocessing.Pool(workers, batch.initWorker)
+	try:
+		pending = 0
+		for task in tasks:
+			pool.apply_async(solveLine, (task,), callback=results.put)
+			pending += 1
+			if pending >= readAhead:
+				yield nextResult(results)
+				pending -= 1
+		pool.close()
+		while pending:
+			yield nextResult(results)
+			pending -= 1
+	except:
+		# Includes keyboard interrupts, a closed output pipe, and a consumer
+		# that stops early
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+
+def nextResult(results):
+	"""Return the next record that a pool put in a queue."""
+	# Without a timeout, Queue.get cannot be interrupted by a keyboard
+	# interrupt in Python 2
+	return results.get(True, 1 << 30)
+
+
+def main(args):
+
+	if args.algorithm not in benchmark.ALGORITHM_NAMES:
+		sys.exit("Unknown algorithm: " + args.algorithm)
+	input = sys.stdin if args.input == "-" else open(args.input, 'r')
+	try:
+		records = solveBoards(readBoards(input), args.algorithm, args.bitboard, args.prune,
+			args.time_limit, args.workers, args.read_ahead)
+		for record in records:
+			sys.stdout.write(json.dumps(record, sort_keys=True) + '\n')
+			sys.stdout.flush()
+	finally:
+		if input is not sys.stdin:
+			input.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Solve a stream of boards, one per line")
+	parser.add_argument("input", nargs='?', default="-",
+		help="file of boards, one per line (default: - for stdin)")
+	parser.add_argument("--algorithm", default="two",
+		help="one of: " + ','.join(benchmark.ALGORITHM_NAMES) + " (default: two)")
+	parser.add_argument("--workers", type=int, default=1,
+		help="number of worker processes (default: 1, solving in this process)")
+	parser.add_argument("--read-ahead", type=int, default=64,
+		help="most boards to read before their records are written (default: 64)")
+	parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+		help="stop each search after this long and record its best partial trace")
+	parser.add_argument("--bitboard", action="store_true",
+		help="search with packed bitboard nodes")
+	parser.add_argument("--prune", action="store_true",
+		help="reject unsolvable nodes by pagoda functions and position class")
+	args = parser.parse_args()
+	main(args)
@@ -0,0 +1,227 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import bitboard
+import budget
+import checkpoint
+import counting
+import keyset
+import ordering
+import pegSolitaireUtils
+import search
+
+
+# Behavior checks for the parts of the searches that are easy to get subtly
+# wrong, each against a slower but plainer way of getting the same answer.
+# Run them with:
+#     python -m unittest discover
+
+BOARDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "boards")
+
+# Small boards that every search solves (or proves impossible) in well under a
+# second, with IDDFS expanding hundreds to thousands of nodes
+SMALL_BOARDS = ["gcross", "grandom_12", "grandom_13", "grandom_60", "gimpossible"]
+
+
+def newGame(name, **options):
+	"""Return a game of one of the boards in the boards directory."""
+	return pegSolitaireUtils.game(os.path.join(BOARDS, name + ".txt"), **options)
+
+
+class heuristicDeltaTest(unittest.TestCase):
+	"""Each heuristic's delta function must match recomputing it in full."""
+
+	HEURISTICS = [search.heuristicOne, search.heuristicTwo, search.heuristicBaseline,
+		search.heuristicManhattan, search.heuristicDifficulty1, search.heuristicDifficulty2]
+
+	def checkPlayouts(self, heuristic, name, playouts=20):
+		"""Follow random moves from a board, checking every child on the way."""
+		pegSol = newGame(name)
+		rng = random.Random(name)
+		for _ in xrange(playouts):
+			node = pegSol.rootNode(heuristic)
+			while True:
+				children = [node.getNextState(oldPos, direction, pegSol)
+					for (oldPos, direction) in node.validMoves()]
+				for child in children:
+					self.assertEqual(child.h, heuristic(child),
+						"%s delta after %s on %s" % (heuristic.__name__, child.trace, name))
+				if not children:
+					break
+				node = rng.choice(children)
+
+	def testDeltas(self):
+		for heuristic in self.HEURISTICS:
+			for name in ["gdiamond", "gcentral", "gpyramid"]:
+				self.checkPlayouts(heuristic, name)
+
+
+class depthLimitedSearchTest(unittest.TestCase):
+	"""StackDLS must expand exactly the nodes that RecursiveDLS does."""
+
+	def checkParity(self, name, **options):
+		"""Solve a board with each kind of IDDFS, comparing the results."""
+		results = []
+		for recursive in (False, True):
+			pegSol = newGame(name)
+			search.ItrDeepSearch(pegSol, recursive=recursive, **options)
+			results.append((pegSol.nodesExpanded, pegSol.nodesPruned, pegSol.trace))
+		self.assertEqual(results[0], results[1], name)
+
+	def testParity(self):
+		for name in SMALL_BOARDS:
+			self.checkParity(name)
+
+	def testParityPruned(self):
+		for name in SMALL_BOARDS:
+			self.checkParity(name, prune=True)
+
+
+class keySetTest(unittest.TestCase):
+	"""A keySet must hold the same keys as a Python set after the same changes."""
+
+	def checkRandomChanges(self, directory=None):
+		"""Add and discard random 33-bit keys, comparing against a set."""
+		rng = random.Random(14)
+		keys = keyset.keySet(directory=directory)
+		expected = set()
+		# Few enough distinct keys that discards often hit, and enough changes
+		# to resize the table several times
+		pool = [rng.randrange(1 << 33) for _ in xrange(3000)] + [0, (1 << 33) - 1]
+		for i in xrange(20000):
+			key = rng.choice(pool)
+			if rng.random() < 0.4:
+				keys.discard(key)
+				expected.discard(key)
+			else:
+				keys.add(key)
+				expected.add(key)
+			if i % 1000 == 0:
+				self.assertEqual(len(keys), len(expected))
+		self.assertEqual(len(keys), len(expected))
+		self.assertEqual(set(keys), expected)
+		for key in pool:
+			self.assertEqual(key in keys, key in expected)
+		copy = keys.copy()
+		keys.add(pool[0] + 1)
+		copy.discard(pool[1])
+		self.assertEqual(set(copy), expected - set([pool[1]]))
+		keys.resize(len(keys.slots) * 4)
+		self.assertEqual(set(keys), expected | set([pool[0] + 1]))
+		keys.close()
+		copy.close()
+
+	def testInMemory(self):
+		self.checkRandomChanges()
+
+	def testMapped(self):
+		directory = tempfile.mkdtemp()
+		try:
+			self.checkRandomChanges(directory)
+		finally:
+			shutil.rmtree(directory)
+
+	def testRemoveMissing(self):
+		keys = keyset.keySet([1, 2, 3])
+		self.assertRaises(KeyError, keys.remove, 4)
+
+
+class checkpointTest(unittest.TestCase):
+	"""A search resumed from checkpoints must end as if it had never stopped."""
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "checkpoint")
+		# Check the clock, and with an interval of 0 save, every few nodes
+		self.checkInterval = checkpoint.CHECK_INTERVAL
+		checkpoint.CHECK_INTERVAL = 50
+
+	def tearDown(self):
+		checkpoint.CHECK_INTERVAL = self.checkInterval
+		shutil.rmtree(self.directory)
+
+	def checkResume(self, name, solve, step):
+		"""
+		Run a search to the end, and again in runs of at most step more nodes
+		each, resuming each run from the checkpoint of the one before.
+		"""
+		pegSol = newGame(name)
+		solve(pegSol)
+		for i in xrange(1, 1000):
+			checkpointFile = checkpoint.checkpointFile(self.path, 0)
+			checkpointFile.due = 0
+			resumed = newGame(name, budget=budget.searchBudget(maxNodes=step * i),
+				checkpoint=checkpointFile)
+			result = solve(resumed)
+			if result is not search.LIMITED:
+				break
+			checkpointFile.close()
+		checkpointFile.finish()
+		# The search must have been stopped and resumed at least once
+		self.assertTrue(i > 1)
+		self.assertEqual(resumed.nodesExpanded, pegSol.nodesExpanded)
+		self.assertEqual(resumed.nodesPruned, pegSol.nodesPruned)
+		self.assertEqual(resumed.trace, pegSol.trace)
+
+	def testUniformCost(self):
+		self.checkResume("gdiamond",
+			lambda pegSol: search.UniformCostSearch(pegSol, search.heuristicTwo, False, True), 300)
+
+	def testIterativeDeepening(self):
+		self.checkResume("grandom_12", search.ItrDeepSearch, 200)
+
+	def testPackInts(self):
+		ints = [0, 1, checkpoint.NO_PARENT, (1 << 33) - 1, -(1 << 40)]
+		self.assertEqual(list(checkpoint.unpackInts(checkpoint.packInts(ints))), ints)
+
+
+class moveOrderingTest(depthLimitedSearchTest):
+	"""StackDLS and RecursiveDLS must agree under every move ordering too."""
+
+	def checkParity(self, name, **options):
+		for moveOrdering in ordering.ORDERINGS.values():
+			# Orderings can learn, so each search gets a new one
+			results = []
+			for recursive in (False, True):
+				pegSol = newGame(name)
+				search.ItrDeepSearch(pegSol, recursive=recursive, ordering=moveOrdering(), **options)
+				results.append((pegSol.nodesExpanded, pegSol.nodesPruned, pegSol.trace))
+			self.assertEqual(results[0], results[1], "%s with %s" % (name, moveOrdering.name))
+
+
+class countingTest(unittest.TestCase):
+	"""Solution counts must match counting every path without symmetry."""
+
+	def countPaths(self, bits, memo):
+		"""Return the number of jump sequences from a bitboard to a solution."""
+		if bits == bitboard.CENTER:
+			return 1
+		if bits not in memo:
+			memo[bits] = sum(self.countPaths(bits ^ fromMask ^ overMask ^ toMask, memo)
+				for (_, _, fromMask, overMask, toMask) in bitboard.JUMPS
+				if bits & fromMask and bits & overMask and not bits & toMask)
+		return memo[bits]
+
+	def testCounts(self):
+		for name in SMALL_BOARDS + ["grandom_0", "gpyramid"]:
+			pegSol = newGame(name)
+			counting.countSolutions(pegSol)
+			memo = {}
+			expected = self.countPaths(pegSol.rootNode().images[0], memo)
+			self.assertEqual(pegSol.solutionCount, expected, name)
+			self.assertEqual(sum(count for (_, count) in pegSol.firstMoves), expected, name)
+			self.assertEqual(isinstance(pegSol.trace, str), expected == 0, name)
+
+	def testBoundedMemo(self):
+		pegSol = newGame("grandom_0")
+		counting.countSolutions(pegSol)
+		bounded = newGame("grandom_0")
+		counter = counting.countSolutions(bounded, counting.solutionCounter(100))
+		self.assertTrue(counter.evicted > 0)
+		self.assertEqual(bounded.solutionCount, pegSol.solutionCount)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,79 @@
+import array
+import struct
+
+
+# Searches that must run in bounded memory cannot keep an unbounded set of
+# explored nodes. A transposition table instead stores a fixed number of
+# entries in flat arrays (about 13 bytes each), and when two keys compete for
+# the same place, it keeps the one that is more expensive to search again.
+# Keys take 33 bits, more than array.array('L') holds where a C long has 32,
+# so they are packed with struct into a bytearray instead.
+
+KEY = struct.Struct("=Q")
+# The keys of the pair of slots that a key hashes to
+PAIR = struct.Struct("=2Q")
+
+
+class transpositionTable(object):
+	"""
+	A fixed-size hash table from symmetric keys of game nodes to integer
+	values, such as bounds found by a search. Keys hash to a pair of adjacent
+	slots; a new key takes an empty slot if there is one, or else replaces the
+	entry with fewer pegs, since searching it again is cheaper.
+	"""
+
+	def __init__(self, size):
+		"""
+		Initialize an empty table with the given number of slots, which is
+		rounded up to a power of two.
+		"""
+		slots = 2
+		while slots < size:
+			slots *= 2
+		self.mask = slots - 1
+		# Keys are never 0 (which would mean an empty board), so 0 marks an
+		# empty slot
+		self.keys = bytearray(KEY.size * slots)
+		self.values = array.array('i', [0]) * slots
+		self.pegs = array.array('B', [0]) * slots
+		self.hits = 0
+		self.stores = 0
+		self.replacements = 0
+
+	def __len__(self):
+		"""Return the number of slots in the table."""
+		return self.mask + 1
+
+	def slot(self, key):
+		"""Return the first of the two slots that a key hashes to."""
+		# Multiplying by a large odd constant spreads the bits of similar keys
+		return ((key * 0x9E3779B97F4A7C15) >> 17) & self.mask & ~1
+
+	# Store PAIR's and KEY's methods locally to use LOAD_FAST instead of LOAD_GLOBAL instructions
+	def get(self, key, default=None, unpack=PAIR.unpack_from, size=KEY.size):
+		"""Return the value stored for a key, or default if it is not stored."""
+		i = self.slot(key)
+		(first, second) = unpack(self.keys, i * size)
+		if first == key:
+			self.hits += 1
+			return self.values[i]
+		if second == key:
+			self.hits += 1
+			return self.values[i + 1]
+		return default
+
+	def put(self, key, value, pegCount, unpack=PAIR.unpack_from, pack=KEY.pack_into, size=KEY.size):
+		"""Store a value for a key of a node with the given number of pegs."""
+		i = self.slot(key)
+		keys = self.keys
+		(first, second) = unpack(keys, i * size)
+		if first != key and (second == key or
+			first and (not second or self.pegs[i + 1] < self.pegs[i])):
+			i += 1
+			first = second
+		if first and first != key:
+			self.replacements += 1
+		pack(keys, i * size, key)
+		self.values[i] = value
+		self.pegs[i] = pegCount
+		self.stores += 1
@@ -0,0 +1,293 @@
+import numpy
+import bitboard
+import pruning
+import search
+import budget
+import checkpoint
+import pegSolitaireUtils
+
+
+# An A* search that expands nodes in batches with NumPy instead of one at a
+# time, for the large boards where the interpreter overhead of each node
+# (validMoves, getNextState, and a heuristic) dominates. Each step pops a
+# batch of nodes with the lowest f from the frontier as an array of
+# bitboards, and then, with array operations on the whole batch:
+# - finds every valid jump by masking the batch against the tables of jumps,
+#   pruned by symmetry like validMoves
+# - builds the children and their eight symmetric images from byte-wise
+#   lookup tables, like bitboard.symmetricImages, and takes their keys
+# - drops duplicate keys within the batch, and keys already seen
+# - drops children that pruning.isDead would reject, with its tables
+# - scores the rest with a heuristic, and pushes them to the frontier
+# Each valid jump counts as one node expanded, as getNextState counts it.
+# NumPy is an optional dependency, so only this module imports it.
+
+# Bitboards and keys are stored as 64-bit integers
+KEY = numpy.int64
+
+# Each search step expands at most this many nodes
+BATCH_SIZE = 4096
+
+
+def byteTables(tables):
+	"""
+	Return byte-wise lookup tables like bitboard.SYMMETRY_TABLES[k] or
+	pruning.PAGODA_TABLES[i][0] as a 2D array, with the table of the last
+	(partial) byte padded to 256 entries.
+	"""
+	return numpy.array([table + [0] * (256 - len(table)) for table in tables], dtype=KEY)
+
+
+def lookup(tables, bits):
+	"""
+	Return the sums of a 2D array of byte-wise lookup tables over each byte of
+	an array of bitboards. (Every table here either has disjoint bits, so the
+	sum is the bitwise OR, or holds weights to be summed.)
+	"""
+	total = tables[0][bits & 255]
+	for i in xrange(1, len(tables)):
+		total = total + tables[i][(bits >> (8 * i)) & 255]
+	return total
+
+
+SYMMETRY_TABLES = [byteTables(tables) for tables in bitboard.SYMMETRY_TABLES]
+POPCOUNT_TABLE = byteTables([[bitboard.popCount(value) for value in xrange(256)]] * 5)
+DIFFICULTY_TABLE = byteTables(pruning._pagodaTables(search.DIFFICULTIES))
+PAGODA_TABLES = [(byteTables(tables), goal) for (tables, goal) in pruning.PAGODA_TABLES]
+RESOURCE_MASKS = numpy.array(pruning.RESOURCE_MASKS, dtype=KEY)
+
+# The masks of each jump in bitboard.JUMPS, and whether validMoves skips it
+# for vertically or horizontally symmetric states
+FROM_MASKS = numpy.array([fromMask for (_, _, fromMask, _, _) in bitboard.JUMPS], dtype=KEY)
+OVER_MASKS = numpy.array([overMask for (_, _, _, overMask, _) in bitboard.JUMPS], dtype=KEY)
+TO_MASKS = numpy.array([toMask for (_, _, _, _, toMask) in bitboard.JUMPS], dtype=KEY)
+FLIP_MASKS = FROM_MASKS | OVER_MASKS | TO_MASKS
+NORTH = numpy.array([direction == -7 for (_, direction, _, _, _) in bitboard.JUMPS])
+WEST = numpy.array([direction == -1 for (_, direction, _, _, _) in bitboard.JUMPS])
+
+# The mask of each hole and the mask of its neighbors, for heuristicOne
+# (see search._danglingCells for why east and west neighbors wrap around)
+HOLE_MASKS = [bitboard.MASKS[pos] for pos in bitboard.HOLES]
+NEIGHBOR_MASKS = [sum(bitboard.MASKS[pos + d] for d in (7, 1, -7, -1) if 0 <= pos + d < 49)
+	for pos in bitboard.HOLES]
+
+
+def symmetricImages(bits):
+	"""
+	Return the images of an array of bitboards under all eight SYMMETRIES,
+	as a 2D array with one row per symmetry.
+	"""
+	return numpy.array([lookup(tables, bits) for tables in SYMMETRY_TABLES])
+
+
+def popCounts(bits):
+	"""Return the number of pegs on each of an array of bitboards."""
+	return lookup(POPCOUNT_TABLE, bits)
+
+
+def heuristicOne(bits):
+	"""Return search.heuristicOne of each of an array of bitboards."""
+	dangling = numpy.zeros(len(bits), dtype=KEY)
+	for (mask, neighbors) in zip(HOLE_MASKS, NEIGHBOR_MASKS):
+		dangling += ((bits & mask) != 0) & ((bits & neighbors) == 0)
+	return popCounts(bits) * 2 + dangling
+
+
+def heuristicTwo(bits):
+	"""Return search.heuristicTwo of each of an array of bitboards."""
+	return popCounts(bits) * 2 + lookup(DIFFICULTY_TABLE, bits)
+
+
+# The batched version of each heuristic that BatchedAStarSearch accepts
+HEURISTICS = {
+	search.heuristicOne: heuristicOne,
+	search.heuristicTwo: heuristicTwo,
+}
+
+
+def isDead(bits):
+	"""Return whether pruning.isDead rejects each of an array of bitboards."""
+	dead = numpy.zeros(len(bits), dtype=bool)
+	for mask in RESOURCE_MASKS:
+		dead |= (bits & mask) == 0
+	for (tables, goal) in PAGODA_TABLES:
+		dead |= lookup(tables, bits) < goal
+	return dead
+
+
+class keyRuns(object):
+	"""
+	A set of symmetric keys, each with the key of its parent, kept as sorted
+	arrays (runs) that are searched together. A new run of added keys is
+	merged with the last run while that is no larger, so there are O(log n)
+	runs and each key is merged O(log n) times.
+	"""
+
+	def __init__(self):
+		"""Initialize an empty set."""
+		# Each run is a pair of arrays: sorted keys, and their parents' keys
+		self.runs = []
+		self.size = 0
+
+	def __len__(self):
+		"""Return the number of keys in the set."""
+		return self.size
+
+	def contains(self, keys):
+		"""Return whether each of an array of keys is in the set."""
+		found = numpy.zeros(len(keys), dtype=bool)
+		for (run, _) in self.runs:
+			i = numpy.searchsorted(run, keys)
+			i[i == len(run)] = 0
+			found |= run[i] == keys
+		return found
+
+	def add(self, keys, parents):
+		"""Add an array of keys that are not in the set, with their parents' keys."""
+		if not len(keys):
+			return
+		order = numpy.argsort(keys, kind='mergesort')
+		(keys, parents) = (keys[order], parents[order])
+		runs = self.runs
+		while runs and len(runs[-1][0]) <= len(keys):
+			(oldKeys, oldParents) = runs.pop()
+			keys = numpy.concatenate((oldKeys, keys))
+			parents = numpy.concatenate((oldParents, parents))
+			order = numpy.argsort(keys, kind='mergesort')
+			(keys, parents) = (keys[order], parents[order])
+		runs.append((keys, parents))
+		self.size += len(order)
+
+	def parent(self, key):
+		"""Return the parent's key of a key in the set."""
+		for (run, parents) in self.runs:
+			i = numpy.searchsorted(run, key)
+			if i < len(run) and run[i] == key:
+				return int(parents[i])
+		raise KeyError(key)
+
+
+def pathNode(pegSol, seen, key):
+	"""
+	Return a node with the given symmetric key, and with parent nodes all the
+	way back to the root node, by following the parents' keys in seen.
+	"""
+	keys = [key]
+	while True:
+		key = seen.parent(key)
+		if key == checkpoint.NO_PARENT:
+			break
+		keys.append(key)
+	keys.reverse()
+	return pegSolitaireUtils.replayKeys(pegSol.rootNode(), keys[1:])
+
+
+def BatchedAStarSearch(pegSol, heuristic=search.heuristicTwo, batchSize=BATCH_SIZE, prune=False):
+	"""
+	Perform an A* search like UniformCostSearch with one of the HEURISTICS,
+	but expanding up to batchSize nodes with equal f values at a time with
+	array operations, and return either the updated game, FAILURE, or
+	LIMITED. The frontier pops batches last-in, first-out, so the nodes
+	expanded differ from those of UniformCostSearch, but are counted the
+	same way: once per valid jump. If prune is True, children that the
+	pruning module proves unsolvable are counted in the game's nodesPruned
+	and not pushed. The frontier's peak size is saved as the game's
+	peakFrontier. The game's budget is checked after each batch, so a node
+	limit may be overshot by up to one batch's children.
+
+	Every key pushed to the frontier is added to one set of seen keys, with
+	its parent's key for rebuilding the trace, so a child is dropped if it
+	has been either explored or pushed before, as in UniformCostSearch. The
+	game's stateStore, stats, and checkpoint file are not used.
+	"""
+	if heuristic not in HEURISTICS:
+		raise ValueError("No batched version of heuristic " + heuristic.__name__)
+	search.checkPlainBoard(pegSol, "Batched A*")
+	score = HEURISTICS[heuristic]
+	root = pegSol.rootNode()
+	if prune and search.isPrunedRoot(pegSol, root):
+		search.recordFailure(pegSol)
+		return search.FAILURE
+	seen = keyRuns()
+	seen.add(numpy.array([root.key], dtype=KEY), numpy.array([checkpoint.NO_PARENT], dtype=KEY))
+	# Each bucket of the frontier is a list of arrays of bitboards with the
+	# same f value (the index of the bucket)
+	rootBits = numpy.array([root.images[0]], dtype=KEY)
+	buckets = [[] for _ in xrange(int(score(rootBits)[0]))]
+	buckets.append([rootBits])
+	lowest = len(buckets) - 1
+	frontierSize = peak = 1
+	limits = pegSol.budget
+	try:
+		while frontierSize:
+			while not buckets[lowest]:
+				lowest += 1
+			bucket = buckets[lowest]
+			# Pop a batch from the last arrays pushed to the lowest bucket
+			batch = []
+			count = 0
+			while bucket and count < batchSize:
+				chunk = bucket.pop()
+				if count + len(chunk) > batchSize:
+					bucket.append(chunk[:count + len(chunk) - batchSize])
+					chunk = chunk[count + len(chunk) - batchSize:]
+				batch.append(chunk)
+				count += len(chunk)
+			bits = numpy.concatenate(batch)
+			frontierSize -= len(bits)
+			solved = numpy.flatnonzero(bits == bitboard.CENTER)
+			if len(solved):
+				pegSol.peakFrontier = peak
+				node = pathNode(pegSol, seen, min(bitboard.symmetricImages(int(bits[solved[0]]))))
+				# copySolution saves the move trace
+				node.copySolution(pegSol)
+				return node
+			images = symmetricImages(bits)
+			keys = images.min(axis=0)
+			if limits is not None:
+				pegs = popCounts(bits)
+				i = pegs.argmin()
+				if pegs[i] < limits.bestPegs:
+					limits.offer(pathNode(pegSol, seen, int(keys[i])))
+			# Valid jumps move a peg over a peg into a hole, and moves north or
+			# west are redundant if the state is vertically or horizontally
+			# symmetric
+			column = bits[:, None]
+			valid = ((column & FROM_MASKS) != 0) & ((column & OVER_MASKS) != 0) & ((column & TO_MASKS) == 0)
+			valid &= ~((images[bitboard.VFLIP] == bits)[:, None] & NORTH)
+			valid &= ~((images[bitboard.HFLIP] == bits)[:, None] & WEST)
+			(rows, jumps) = numpy.nonzero(valid)
+			pegSol.nodesExpanded += len(rows)
+			children = bits[rows] ^ FLIP_MASKS[jumps]
+			childKeys = symmetricImages(children).min(axis=0)
+			# Keep the first child with each key, and only if it is new
+			(childKeys, first) = numpy.unique(childKeys, return_index=True)
+			(children, parents) = (children[first], keys[rows[first]])
+			new = ~seen.contains(childKeys)
+			(children, childKeys, parents) = (children[new], childKeys[new], parents[new])
+			if prune:
+				dead = isDead(children)
+				pegSol.nodesPruned += int(dead.sum())
+				# Like isPrunedNode, dead keys are seen so they are not checked again
+				seen.add(childKeys[dead], parents[dead])
+				live = ~dead
+				(children, childKeys, parents) = (children[live], childKeys[live], parents[live])
+			seen.add(childKeys, parents)
+			scores = score(children)
+			for f in numpy.unique(scores):
+				f = int(f)
+				if f >= len(buckets):
+					buckets.extend([] for _ in xrange(f + 1 - len(buckets)))
+				buckets[f].append(children[scores == f])
+				if f < lowest:
+					lowest = f
+			frontierSize += len(children)
+			peak = max(peak, frontierSize)
+			if limits is not None and pegSol.nodesExpanded >= limits.due:
+				limits.check(pegSol.nodesExpanded)
+	except budget.BudgetExceeded as e:
+		pegSol.peakFrontier = peak
+		return search.recordBudget(pegSol, e.reason)
+	pegSol.peakFrontier = peak
+	search.recordFailure(pegSol)
+	return search.FAILURE